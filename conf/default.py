@@ -32,6 +32,25 @@ PROGRESS_BAR = False           # Enable progress bar
 RETRY_COUNT = 2
 CLEAR_CACHE_ON_START = True
 CHECK_ENTRYPOINT_GROUP = False
+F5_TRANSACTIONS = False        # Create F5 entrypoints within one iControl REST transaction
+A10_ASYNC_CLIENT = False       # Talk to A10 through the asyncio aXAPI client instead of acos_client
+A10_CONCURRENCY = 8            # Max parallel aXAPI requests per A10 device with A10_ASYNC_CLIENT
+F5_LEAN_CLIENT = False         # Talk to F5 through the lean httpx iControl REST client instead of f5-sdk
+F5_CONCURRENCY = 8             # Max parallel iControl REST requests per F5 device with F5_LEAN_CLIENT
+SIBLINGS_CONCURRENCY = 1       # Max model objects read / patched / deleted in parallel. 1 - one after another
+DEVICE_CONCURRENCY = 4         # Max model objects working on one balancer at the same time with SIBLINGS_CONCURRENCY
+ENTRYPOINTS_PER_DEVICE = 2     # Max entrypoints created / deleted on one balancer at the same time with --parallel
+INVENTORY_CONCURRENCY = 1      # Max entrypoints reserving IPs / writing DNS records at the same time with --parallel
+PREFETCH_STATE = False         # Read state of a whole entrypoint tree with one collection query per object type
+TOKEN_CACHE = False            # Reuse auth tokens between runs. A10 and F5 with F5_LEAN_CLIENT only, f5-sdk always logs in
+TOKEN_CACHE_FILE = '~/.cache/happyvip/tokens.json'  # Token cache file, readable by its owner only
+SNAPSHOT_MAX_AGE = 0           # Seconds balancer snapshots are used without refresh across runs. 0 - refresh every run
+DAEMON_SOCKET = '~/.cache/happyvip/happyvip.sock'  # Unix socket of the 'serve' job API, readable by its owner only
+DAEMON_TOKEN_FILE = '~/.cache/happyvip/daemon.token'  # Token of the 'serve' job API on a TCP port, readable by its owner only
+DAEMON_ENV_TTL = 300           # Seconds the daemon keeps an ADS environment and its entrypoint groups
+RECONCILE_INTERVAL = 300       # Seconds between two 'reconcile' cycles
+RECONCILE_RATE = 1             # Balancer requests per second and device 'reconcile' spends. 0 - no limit
+RECONCILE_BURST = 20           # Balancer requests per device 'reconcile' spends at once
 
 SEND_STATS_TO_REDIS = True
 REDIS_HOST = ""
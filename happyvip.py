@@ -1,13 +1,24 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from typing import Union
 
 import fire
 from api_libs.gitup import gitup_wrapper
 from api_libs.helper import arg_to_list
+from api_libs.helper import get_ff
 from api_libs.helper import stats_collector
 from api_libs.logger import Logger
 from beartype import beartype
 
+from libs import identity_map
+from libs import lazy
+from libs.device_limiter import limiter
 from libs.entrypoint_manager import EntrypointManager as EM
+from libs.reconciler import Reconciler
+from libs.session_registry import registry
 
 logger = Logger()
 
@@ -18,12 +29,18 @@ class CLI(object):
     Run 'happyvip.py COMMAND --help' for more information on a command.
     """
 
-    def _prepare_EM(self, env_name) -> None:
+    def __init__(self) -> None:
+        # Warm ADS environments of the daemon, see _get_em
+        self._managers = dict()
+        self._managers_lock = threading.Lock()
+        self._env_locks = dict()
+
+    def _prepare_EM(self, env_name, em: EM = None) -> None:
         if not env_name or not (isinstance(env_name, str)):
             raise ValueError("Incorrect env name given")
         self.env_name = env_name
 
-        self.em = EM(env_name=self.env_name)
+        self.em = em or EM(env_name=self.env_name)
         if not self.em.env:
             raise ValueError("Incorrect env name given")
 
@@ -54,11 +71,159 @@ class CLI(object):
         log_message = f"Entrypoints to process: {self.entrypoints} \n" if self.entrypoints else "No entrypoints to process."
         logger.log.info(log_message)
 
+    def _process_entrypoint(self, action: str, entrypoint: str) -> bool:
+        # Entrypoints of one balancer share its slots, ApplyEngine keeps its own per-object limit
+        device = ("ENTRYPOINTS", self.em.env.location, EM.get_balancer_by_entrypoint(entrypoint))
+        with limiter.slot(device, get_ff('ENTRYPOINTS_PER_DEVICE')):
+            status = getattr(self.em, f"{action}_entrypoint")(entrypoint)
+        field = 'patched' if action == 'create' else 'deleted'
+        logger.log.info(f"'{entrypoint}' - {action}d: {status['Entrypoint'][field]}\n")
+        return status['Entrypoint'][field]
+
+    def _process(self, action: str, parallel: int) -> None:
+        """Creates / deletes self.entrypoints, up to `parallel` at the same time.
+        In parallel the error of one entrypoint is logged and it is reported as failed, the others go on.
+        overall_status keeps the order of self.entrypoints whatever finishes first.
+        """
+        with identity_map.run_scope() as run:
+            if parallel > 1 and len(self.entrypoints) > 1:
+                self.em.prepare_groups(self.entrypoints)
+                with ThreadPoolExecutor(max_workers=min(parallel, len(self.entrypoints))) as executor:
+                    # Every entrypoint runs in a copy of our context to share the run scope
+                    futures = {
+                        entrypoint: executor.submit(copy_context().run, self._process_entrypoint, action, entrypoint)
+                        for entrypoint in self.entrypoints
+                    }
+                for entrypoint, future in futures.items():
+                    try:
+                        self.overall_status[entrypoint] = future.result()
+                    except Exception as e:
+                        logger.log.error(f"'{entrypoint}' - {action} failed: {e!r}")
+                        self.overall_status[entrypoint] = False
+            else:
+                for entrypoint in self.entrypoints:
+                    self.overall_status[entrypoint] = self._process_entrypoint(action, entrypoint)
+            logger.log.debug(f"Shared balancer objects: {run.stats()}")
+
+    @staticmethod
+    def _read_env_names(names: Union[str, tuple], file: str) -> list:
+        """Env names given as 'env1,env2' and / or a file with one env name per line, '#' starts a comment"""
+        env_names = arg_to_list(names, uniq=True)
+        if file:
+            with open(os.path.expanduser(file)) as f:
+                env_names += [line.split('#', 1)[0].strip() for line in f]
+        env_names = [name for name in dict.fromkeys(env_names) if name]
+        if not env_names:
+            raise ValueError('No env names given')
+        return env_names
+
+    @staticmethod
+    def _timed(summary: dict, function, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            summary['seconds'] += time.monotonic() - started
+
+    def _prepare_env(self, env_name: str) -> "CLI":
+        cli = CLI()
+        cli._prepare_EM(env_name)
+        return cli
+
+    def _process_env(self, cli: "CLI", action: str, parallel: int, **kwargs) -> dict:
+        cli._convert_to_entrypoints(**kwargs)
+        cli._process(action, parallel)
+        return cli.overall_status
+
+    def _process_many(self, action: str, names: Union[str, tuple], file: str, envs: int, parallel: int, **kwargs) -> dict:
+        """Processes several environments in one run, up to `envs` at the same time.
+        Balancer sessions and snapshots are shared by all of them, environments are started
+        grouped by balancer location. Every environment is processed as `happyvip.py <action>` would do it.
+
+        Returns:
+         {'lablemams': {'intapi': True, 'api': True}, 'labsomeenv': {}, ...}
+        """
+        env_names = self._read_env_names(names, file)
+        logger.log.info(f"Environments to process: {env_names}")
+        summary = {name: {'location': '', 'status': {}, 'error': None, 'seconds': 0.0} for name in env_names}
+        with identity_map.run_scope(), ThreadPoolExecutor(max_workers=max(min(envs, len(env_names)), 1)) as executor:
+            # ADS environments first, their location tells the balancers
+            prepared = {
+                name: executor.submit(copy_context().run, self._timed, summary[name], self._prepare_env, name)
+                for name in env_names
+            }
+            clis = {}
+            for name, future in prepared.items():
+                try:
+                    clis[name] = future.result()
+                    summary[name]['location'] = clis[name].em.env.location
+                except Exception as e:
+                    summary[name]['error'] = e
+            futures = {
+                name: executor.submit(
+                    copy_context().run, self._timed, summary[name], self._process_env, clis[name], action, parallel, **kwargs
+                )
+                for name in sorted(clis, key=lambda name: summary[name]['location'])
+            }
+            for name, future in futures.items():
+                try:
+                    summary[name]['status'] = future.result()
+                except Exception as e:
+                    summary[name]['error'] = e
+        for name, data in summary.items():
+            if data['error']:
+                logger.log.error(f"'{name}' - {action} failed: {data['error']!r}")
+        self._log_summary(summary)
+        self._log_sessions()
+        return {name: data['status'] for name, data in summary.items()}
+
+    @staticmethod
+    def _log_summary(summary: dict) -> None:
+        lines = [f"{'env':<24} {'location':<10} {'entrypoints':>11} {'failed':>6} {'seconds':>8}  error"]
+        for name, data in sorted(summary.items(), key=lambda item: (item[1]['location'], item[0])):
+            failed = [entrypoint for entrypoint, status in data['status'].items() if not status]
+            error = repr(data['error']) if data['error'] else ''
+            lines.append(f"{name:<24} {data['location']:<10} {len(data['status']):>11} {len(failed):>6} "
+                         f"{data['seconds']:>8.1f}  {error}")
+        logger.log.info("Summary:\n" + "\n".join(lines))
+
+    def _get_em(self, env_name: str) -> EM:
+        """EntrypointManager of the env with its ADS data and entrypoint groups, kept for DAEMON_ENV_TTL seconds"""
+        with self._managers_lock:
+            lock = self._env_locks.setdefault(env_name, threading.Lock())
+        with lock:
+            em, created = self._managers.get(env_name, (None, 0))
+            if not em or time.monotonic() - created > get_ff('DAEMON_ENV_TTL'):
+                cli = CLI()
+                cli._prepare_EM(env_name)
+                em = cli.em
+                self._managers[env_name] = (em, time.monotonic())
+            return em
+
+    def _run_job(self, action: str, params: dict) -> dict:
+        """Job of the daemon, returns the same status dict as create / delete, {service: global plan} for plan"""
+        cli = CLI()
+        cli._prepare_EM(params.get('name'), em=self._get_em(params.get('name')))
+        kwargs = {key: params.get(key, default) for key, default in (('entrypoints', ''), ('services', ''), ('all', False))}
+        if action == 'plan':
+            cli._convert_to_entrypoints(**kwargs)
+            services = sorted({EM.get_service_by_entrypoint(entrypoint) for entrypoint in cli.entrypoints} - {None})
+            return {service: cli.em.global_plan(service) for service in services}
+        cli._convert_to_entrypoints(**kwargs, mandatory=action == 'create')
+        cli._process(action, int(params.get('parallel', 1)))
+        return cli.overall_status
+
+    def _log_sessions(self) -> None:
+        stats = registry.stats()
+        logger.log.info(f"Balancer sessions: {stats['sessions']}, logins: {stats['logins']}, per device: {stats['devices']}")
+        logger.log.debug(f"Lazy attributes (hits / misses): {lazy.stats()}")
+
     @beartype
     def create(self, name: str,
                entrypoints: Union[str, tuple] = '',
                services: Union[str, tuple] = '',
-               all: bool = False) -> dict:
+               all: bool = False,
+               parallel: int = 1) -> dict:
         """
         Create LBR VIPS and related DNS records and ADS variables (sometimes) for given entrypoints
 
@@ -67,22 +232,21 @@ class CLI(object):
             entrypoints: One or more entrypoints, for example 'intapi' or 'intapi,api'
             services: One or more services, for example 'pwr,psr'
             all: Create all entrypoints related to given ADS environment name
+            parallel: Number of entrypoints created at the same time, 1 - one after another
         """
         self._prepare_EM(name)
         self._convert_to_entrypoints(entrypoints=entrypoints, services=services, all=all, mandatory=True)
+        self._process('create', parallel)
 
-        for entrypoint in self.entrypoints:
-            status = self.em.create_entrypoint(entrypoint)
-            logger.log.info(f"'{entrypoint}' - created: {status['Entrypoint']['patched']}\n")
-            self.overall_status[entrypoint] = status['Entrypoint']['patched']
-
+        self._log_sessions()
         return self.overall_status
 
     @beartype
     def delete(self, name: str,
                entrypoints: Union[str, tuple] = '',
                services: Union[str, tuple] = '',
-               all: bool = False) -> dict:
+               all: bool = False,
+               parallel: int = 1) -> dict:
         """
         Delete LBR VIPS and related DNS records for given entrypoints
 
@@ -91,17 +255,119 @@ class CLI(object):
             entrypoints: One or more entrypoints, for example 'intapi' or 'intapi,api'
             services: One or more services, for example 'pwr,psr'
             all: Delete all entrypoints related to given ADS environment name
+            parallel: Number of entrypoints deleted at the same time, 1 - one after another
         """
         self._prepare_EM(name)
         self._convert_to_entrypoints(entrypoints=entrypoints, services=services, all=all)
+        self._process('delete', parallel)
 
-        for entrypoint in self.entrypoints:
-            status = self.em.delete_entrypoint(entrypoint)
-            logger.log.info(f"'{entrypoint}' - deleted: {status['Entrypoint']['deleted']}\n")
-            self.overall_status[entrypoint] = status['Entrypoint']['deleted']
-
+        self._log_sessions()
         return self.overall_status
 
+    @beartype
+    def serve(self, socket: str = '', port: int = 0) -> None:
+        """
+        Run as a daemon which keeps balancer sessions, snapshots and ADS environments warm
+        and takes create / delete / plan jobs over a local HTTP API.
+        Jobs of one balancer location run one after another, see libs/job_server.py for the API.
+
+        Args:
+            socket: Unix socket of the job API, DAEMON_SOCKET by default
+            port: Serve the job API on 127.0.0.1:port instead of the Unix socket,
+                  clients send the token of DAEMON_TOKEN_FILE
+        """
+        # http.server is only needed by the daemon
+        from libs.job_server import JobQueues
+        from libs.job_server import load_token
+        from libs.job_server import make_server
+
+        queues = JobQueues(runner=self._run_job)
+        server = make_server(queues, resolve=lambda params: self._get_em(params.get('name')).env.location,
+                             socket_path=socket or get_ff('DAEMON_SOCKET'), port=port,
+                             token=load_token(get_ff('DAEMON_TOKEN_FILE')) if port else None)
+        logger.log.info(f"Serving jobs on {server.server_address}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self._log_sessions()
+
+    @beartype
+    def reconcile(self, names: Union[str, tuple] = '',
+                  file: str = '',
+                  interval: int = 0,
+                  cycles: int = 0,
+                  dry_run: bool = False) -> dict:
+        """
+        Keep ADS environments converged with their balancers: every cycle the balancer objects of their entrypoints
+        are diffed against freshly read balancer snapshots and only the drifted ones are patched.
+        Balancer requests are rate limited by RECONCILE_RATE / RECONCILE_BURST.
+
+        Args:
+            names: One or more ADS environments, for example 'lablemams,labsomeenv'
+            file: File with one ADS environment name per line
+            interval: Seconds between two cycles, RECONCILE_INTERVAL by default
+            cycles: Number of cycles to run, 0 - until interrupted
+            dry_run: Only report the drift
+        """
+        env_names = self._read_env_names(names, file)
+        logger.log.info(f"Environments to reconcile: {env_names}")
+        reconciler = Reconciler(get_em=self._get_em, dry_run=dry_run)
+        try:
+            return reconciler.run(env_names, interval or get_ff('RECONCILE_INTERVAL'), cycles)
+        except KeyboardInterrupt:
+            return {}
+        finally:
+            self._log_sessions()
+
+    @beartype
+    def create_many(self, names: Union[str, tuple] = '',
+                    file: str = '',
+                    entrypoints: Union[str, tuple] = '',
+                    services: Union[str, tuple] = '',
+                    all: bool = False,
+                    envs: int = 4,
+                    parallel: int = 1) -> dict:
+        """
+        Create given entrypoints in several ADS environments at once
+
+        Args:
+            names: One or more ADS environments, for example 'lablemams,labsomeenv'
+            file: File with one ADS environment name per line
+            entrypoints: One or more entrypoints, for example 'intapi' or 'intapi,api'
+            services: One or more services, for example 'pwr,psr'
+            all: Create all entrypoints related to every given ADS environment
+            envs: Number of environments processed at the same time
+            parallel: Number of entrypoints of one environment created at the same time
+        """
+        return self._process_many('create', names, file, envs, parallel, entrypoints=entrypoints, services=services,
+                                  all=all, mandatory=True)
+
+    @beartype
+    def delete_many(self, names: Union[str, tuple] = '',
+                    file: str = '',
+                    entrypoints: Union[str, tuple] = '',
+                    services: Union[str, tuple] = '',
+                    all: bool = False,
+                    envs: int = 4,
+                    parallel: int = 1) -> dict:
+        """
+        Delete given entrypoints in several ADS environments at once
+
+        Args:
+            names: One or more ADS environments, for example 'lablemams,labsomeenv'
+            file: File with one ADS environment name per line
+            entrypoints: One or more entrypoints, for example 'intapi' or 'intapi,api'
+            services: One or more services, for example 'pwr,psr'
+            all: Delete all entrypoints related to every given ADS environment
+            envs: Number of environments processed at the same time
+            parallel: Number of entrypoints of one environment deleted at the same time
+        """
+        return self._process_many('delete', names, file, envs, parallel, entrypoints=entrypoints, services=services,
+                                  all=all)
+
 
 @stats_collector
 @gitup_wrapper
@@ -0,0 +1,193 @@
+"""Indexed catalog of A10 partition objects"""
+import threading
+
+
+class A10Catalog:
+    """Servers, service groups and virtual servers of a partition with dict indexes
+
+    Every collection is fetched lazily, once, and then kept up to date by the writes A10Manager
+    makes itself. Changes made by anybody else are only seen after refresh().
+
+    Indexes:
+        server name -> server, server host -> server name, server name -> groups
+        group name -> group, group name -> {(virtual server, port number, protocol), ...}
+        virtual name -> virtual, virtual ip -> virtual name
+    """
+
+    def __init__(self, fetch_servers, fetch_groups, fetch_virtuals) -> None:
+        self._fetchers = {"server": fetch_servers, "group": fetch_groups, "virtual": fetch_virtuals}
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self, kind: str = None) -> None:
+        """Drops one ("server" / "group" / "virtual") or all collections, they are fetched again on next use"""
+        with self._lock:
+            if kind in (None, "server"):
+                self._servers = None
+                self._server_hosts = dict()
+            if kind in (None, "group"):
+                self._groups = None
+                self._server_groups = dict()
+            if kind in (None, "virtual"):
+                self._virtuals = None
+                self._virtual_ips = dict()
+                self._group_ports = dict()
+
+    def is_loaded(self, kind: str) -> bool:
+        return getattr(self, f"_{kind}s") is not None
+
+    # Lazy loading
+    def _load(self, kind: str) -> dict:
+        with self._lock:
+            if not self.is_loaded(kind):
+                setattr(self, f"_{kind}s", dict())
+                index = getattr(self, f"_index_{kind}")
+                for item in self._fetchers[kind]():
+                    index(item)
+            return getattr(self, f"_{kind}s")
+
+    @property
+    def servers(self) -> list[dict]:
+        return list(self._load("server").values())
+
+    @property
+    def groups(self) -> list[dict]:
+        return list(self._load("group").values())
+
+    @property
+    def virtuals(self) -> list[dict]:
+        return list(self._load("virtual").values())
+
+    # Indexing
+    def _index_server(self, server: dict) -> None:
+        self._servers[server["name"]] = server
+        if host := server.get("host"):
+            self._server_hosts[host] = server["name"]
+
+    def _index_group(self, group: dict) -> None:
+        self._groups[group["name"]] = group
+        for member in group.get("member-list", []):
+            self._server_groups.setdefault(member["name"], set()).add(group["name"])
+
+    def _index_virtual(self, virtual: dict) -> None:
+        self._virtuals[virtual["name"]] = virtual
+        if ip := virtual.get("ip-address"):
+            self._virtual_ips[ip] = virtual["name"]
+        for port in virtual.get("port-list", []):
+            self._index_virtual_port(virtual["name"], port)
+
+    def _index_virtual_port(self, virtual_server: str, port: dict) -> None:
+        if group := port.get("service-group"):
+            key = (virtual_server, port.get("port-number"), port.get("protocol"))
+            self._group_ports.setdefault(group, set()).add(key)
+
+    def _unindex_virtual_port(self, virtual_server: str, port: dict) -> None:
+        key = (virtual_server, port.get("port-number"), port.get("protocol"))
+        self._group_ports.get(port.get("service-group"), set()).discard(key)
+
+    # Lookups
+    def get_server(self, name: str) -> dict:
+        return self._load("server").get(name)
+
+    def get_server_by_ip(self, ip: str) -> dict:
+        with self._lock:
+            servers = self._load("server")
+            return servers.get(self._server_hosts.get(ip))
+
+    def get_server_references(self, name: str) -> set[str]:
+        with self._lock:
+            self._load("group")
+            return set(self._server_groups.get(name, set()))
+
+    def get_group(self, name: str) -> dict:
+        return self._load("group").get(name)
+
+    def get_group_ports(self, name: str) -> set[tuple]:
+        """Returns:
+        {('api-lablemams', 443, 'https'), ...}
+        """
+        with self._lock:
+            self._load("virtual")
+            return set(self._group_ports.get(name, set()))
+
+    def get_group_references(self, name: str) -> set[str]:
+        return {virtual_server for virtual_server, _, _ in self.get_group_ports(name)}
+
+    def get_virtual(self, name: str) -> dict:
+        return self._load("virtual").get(name)
+
+    def get_virtual_by_ip(self, ip: str) -> dict:
+        with self._lock:
+            virtuals = self._load("virtual")
+            return virtuals.get(self._virtual_ips.get(ip))
+
+    # In-place updates after our own writes, collections which are not loaded yet are left alone
+    def add_server(self, server: dict) -> None:
+        with self._lock:
+            if self.is_loaded("server"):
+                self.remove_server(server["name"])
+                self._index_server(server)
+
+    def remove_server(self, name: str) -> None:
+        with self._lock:
+            if self.is_loaded("server") and (server := self._servers.pop(name, None)):
+                self._server_hosts.pop(server.get("host"), None)
+
+    def add_group(self, group: dict) -> None:
+        with self._lock:
+            if self.is_loaded("group"):
+                self.remove_group(group["name"])
+                self._index_group(group)
+
+    def remove_group(self, name: str) -> None:
+        with self._lock:
+            if self.is_loaded("group") and (group := self._groups.pop(name, None)):
+                for member in group.get("member-list", []):
+                    self._server_groups.get(member["name"], set()).discard(name)
+
+    def add_group_members(self, name: str, members: list[dict]) -> None:
+        with self._lock:
+            if self.is_loaded("group") and (group := self._groups.get(name)):
+                self.add_group({**group, "member-list": [*group.get("member-list", []), *members]})
+
+    def remove_group_members(self, name: str, members: list[dict]) -> None:
+        with self._lock:
+            if self.is_loaded("group") and (group := self._groups.get(name)):
+                removed = {(member["name"], str(member["port"])) for member in members}
+                self.add_group({**group, "member-list": [
+                    member for member in group.get("member-list", [])
+                    if (member["name"], str(member["port"])) not in removed
+                ]})
+
+    def add_virtual(self, virtual: dict) -> None:
+        with self._lock:
+            if self.is_loaded("virtual"):
+                self.remove_virtual(virtual["name"])
+                self._index_virtual(virtual)
+
+    def remove_virtual(self, name: str) -> None:
+        with self._lock:
+            if self.is_loaded("virtual") and (virtual := self._virtuals.pop(name, None)):
+                self._virtual_ips.pop(virtual.get("ip-address"), None)
+                for port in virtual.get("port-list", []):
+                    self._unindex_virtual_port(name, port)
+
+    def add_virtual_port(self, virtual_server: str, port: dict) -> None:
+        with self._lock:
+            if self.is_loaded("virtual") and (virtual := self._virtuals.get(virtual_server)):
+                self.remove_virtual_port(virtual_server, port.get("port-number"), port.get("protocol"))
+                virtual = {**virtual, "port-list": [*virtual.get("port-list", []), port]}
+                self._virtuals[virtual_server] = virtual
+                self._index_virtual_port(virtual_server, port)
+
+    def remove_virtual_port(self, virtual_server: str, port: int, protocol: str) -> None:
+        with self._lock:
+            if not self.is_loaded("virtual") or not (virtual := self._virtuals.get(virtual_server)):
+                return
+            ports = []
+            for item in virtual.get("port-list", []):
+                if str(item.get("port-number")) == str(port) and item.get("protocol") == protocol:
+                    self._unindex_virtual_port(virtual_server, item)
+                else:
+                    ports.append(item)
+            self._virtuals[virtual_server] = {**virtual, "port-list": ports}
@@ -1,21 +1,100 @@
 """A10 acos client wrapper"""
+import threading
+
 import acos_client as acos
+from acos_client.errors import ACOSException
 from acos_client.errors import AddressSpecifiedIsInUse
+from acos_client.errors import Exists
+from acos_client.errors import InvalidSessionID
 from acos_client.errors import NotFound
 from acos_client.v30.responses import RESPONSE_CODES
+from acos_client.v30.session import Session as AcosSession
+
+from libs.a10_catalog import A10Catalog
+from libs.axapi_client import AxapiClient
+from libs.axapi_client import virtual_port_item
+from libs.token_cache import TokenCache
 
 
 class A10Manager:
+    # Device errors for callers which do not import this module, see SessionRegistry
+    Exists = Exists
+    AddressSpecifiedIsInUse = AddressSpecifiedIsInUse
+
     def __init__(
-        self, address: str, user: str, password: str, partition: str = None
+        self, address: str, user: str, password: str, partition: str = None,
+        async_client: bool = False, concurrency: int = 8, token_cache: TokenCache = None
     ) -> None:
-        self.mgmt = acos.Client(address, acos.AXAPI_30, user, password)
-        self._servers = None
-        self._groups = None
-        self._virtuals = None
+        self._mgmt = None
+        self._axapi = None
+        self.async_client = async_client
+        self.concurrency = concurrency
+        self.token_cache = token_cache
+        self.address = address
+        self.user = user
+        self.password = password
+        self._catalog = None
         self.partition = partition
+        self._lock = threading.Lock()
+        self.sessions = 0
+        self.logins = 0
         self._extend_responses()
 
+    @property
+    def mgmt(self):
+        with self._lock:
+            if not self._mgmt:
+                self._mgmt = acos.Client(self.address, acos.AXAPI_30, self.user, self.password)
+                self._mgmt.session = Session(self, self._mgmt, self.user, self.password)
+                self.sessions += 1
+        return self._mgmt
+
+    @property
+    def axapi(self) -> AxapiClient:
+        """Async client of the same device, None unless async_client is enabled"""
+        if not self.async_client:
+            return None
+        with self._lock:
+            if not self._axapi:
+                self._axapi = AxapiClient(
+                    self.address, self.user, self.password, partition=self.partition,
+                    concurrency=self.concurrency, on_login=self.count_login, token_cache=self.token_cache
+                )
+                self.sessions += 1
+        return self._axapi
+
+    def _call(self, async_method: str, sync_call, /, **kwargs):
+        """Runs async_method of the async client when it is enabled, sync_call of acos_client otherwise"""
+        if self.axapi:
+            return self.axapi.run(getattr(self.axapi, async_method)(**kwargs))
+        return sync_call()
+
+    def count_login(self) -> None:
+        with self._lock:
+            self.logins += 1
+
+    @property
+    def catalog(self) -> A10Catalog:
+        """Partition collections with indexes, kept in sync with our own writes"""
+        with self._lock:
+            if not self._catalog:
+                self._catalog = A10Catalog(
+                    fetch_servers=lambda: self._call(
+                        "get_servers", lambda: self.mgmt.slb.server.get_all()["server-list"]
+                    ),
+                    fetch_groups=lambda: self._call(
+                        "get_groups", lambda: self.mgmt.slb.service_group.all()["service-group-list"]
+                    ),
+                    fetch_virtuals=lambda: self._call(
+                        "get_virtual_servers", lambda: self.mgmt.slb.virtual_server.all()["virtual-server-list"]
+                    ),
+                )
+        return self._catalog
+
+    def refresh(self, kind: str = None) -> None:
+        """Re-read partition collections ("server" / "group" / "virtual" or all) on next use"""
+        self.catalog.refresh(kind=kind)
+
     @property
     def servers(self) -> list[dict]:
         """Returns:
@@ -25,9 +104,7 @@ class A10Manager:
             ...
         }, ...]
         """
-        if not self._servers:
-            self._servers = self.mgmt.slb.server.get_all()["server-list"]
-        return self._servers
+        return self.catalog.servers
 
     @property
     def groups(self) -> list[dict]:
@@ -38,9 +115,7 @@ class A10Manager:
             ...
         }, ...]
         """
-        if not self._groups:
-            self._groups = self.mgmt.slb.service_group.all()["service-group-list"]
-        return self._groups
+        return self.catalog.groups
 
     @property
     def virtuals(self) -> list[dict]:
@@ -51,29 +126,7 @@ class A10Manager:
             ...
         }, ...]
         """
-        if not self._virtuals:
-            self._virtuals = self.mgmt.slb.virtual_server.all()["virtual-server-list"]
-        return self._virtuals
-
-    @staticmethod
-    def refresh_on_change(data_type):
-        def decorator(method):
-            def wrapper(self, *args, **kwargs):
-                result = method(self, *args, **kwargs)
-                self._reset_data(data_type)
-                return result
-
-            return wrapper
-
-        return decorator
-
-    def _reset_data(self, data_type):
-        if data_type == "server":
-            self._servers = None
-        elif data_type == "group":
-            self._groups = None
-        elif data_type == "virtual":
-            self._virtuals = None
+        return self.catalog.virtuals
 
     # Servers
     def get_server(self, name: str) -> dict:
@@ -89,44 +142,38 @@ class A10Manager:
                         }, ...]
         }
         """
-        try:
-            return self.mgmt.slb.server.get(name=name)["server"]
-        except NotFound:
-            return {}
+        return self._call("get_server", lambda: self._get_or_empty(self.mgmt.slb.server.get, "server", name=name), name=name)
 
     def get_server_ip(self, name: str) -> str:
         return self.get_server(name=name).get("host")
 
     def get_server_by_ip(self, ip: str) -> dict:
-        for server in self.servers:
-            if server.get("host") == ip:
-                return server
+        return self.catalog.get_server_by_ip(ip=ip) or {}
 
     def get_server_references(self, name: str) -> set[str]:
-        used_in_groups = set()
-        for group in self.groups:
-            for member in group.get("member-list", []):
-                if member.get("name") == name:
-                    used_in_groups.add(group["name"])
-        return used_in_groups
-
-    @refresh_on_change(data_type="server")
+        return self.catalog.get_server_references(name=name)
+
     def create_server(self, name: str, ip: str, port_list: list[dict] = None) -> dict:
         """Args:
          port_list: [{"port-number": int / str, "protocol": "tcp" / "udp"}, ...]
         Returns:
          same as get_server
         """
-        return self.mgmt.slb.server.create(
-            name=name, ip_address=ip, port_list=port_list
-        )["server"]
+        server = self._call(
+            "create_server",
+            lambda: self.mgmt.slb.server.create(name=name, ip_address=ip, port_list=port_list)["server"],
+            name=name, ip=ip, port_list=port_list,
+        )
+        self.catalog.add_server(server)
+        return server
 
-    @refresh_on_change(data_type="server")
     def delete_server(self, name: str) -> dict:
         """Returns:
         {'status': 'OK'}
         """
-        return self.mgmt.slb.server.delete(name=name)["response"]
+        response = self._call("delete_server", lambda: self.mgmt.slb.server.delete(name=name)["response"], name=name)
+        self.catalog.remove_server(name)
+        return response
 
     # Service groups
     def get_group(self, name: str) -> dict:
@@ -142,24 +189,17 @@ class A10Manager:
                         }, ...]
         }
         """
-        try:
-            return self.mgmt.slb.service_group.get(name=name)["service-group"]
-        except NotFound:
-            return {}
+        return self._call(
+            "get_group", lambda: self._get_or_empty(self.mgmt.slb.service_group.get, "service-group", name=name), name=name
+        )
 
     def get_group_members_names(self, name: str) -> list[str]:
         members = self.get_group(name=name).get("member-list", [])
         return list({member["name"] for member in members})
 
     def get_group_references(self, name: str) -> set[str]:
-        used_in_virtuals = set()
-        for virtual in self.virtuals:
-            for port in virtual.get("port-list", []):
-                if port.get("service-group") == name:
-                    used_in_virtuals.add(virtual["name"])
-        return used_in_virtuals
-
-    @refresh_on_change(data_type="group")
+        return self.catalog.get_group_references(name=name)
+
     def create_group(
         self, name: str, members: list[dict] = None, health_check: str = "tcp"
     ) -> dict:
@@ -168,16 +208,21 @@ class A10Manager:
         Returns:
          same as get_group
         """
-        return self.mgmt.slb.service_group.create(
-            name=name, mem_list=members, hm_name=health_check
-        )["service-group"]
+        group = self._call(
+            "create_group",
+            lambda: self.mgmt.slb.service_group.create(name=name, mem_list=members, hm_name=health_check)["service-group"],
+            name=name, members=members, health_check=health_check,
+        )
+        self.catalog.add_group(group)
+        return group
 
-    @refresh_on_change(data_type="group")
     def delete_group(self, name: str) -> dict:
         """Returns:
         {'status': 'OK'}
         """
-        return self.mgmt.slb.service_group.delete(name=name)["response"]
+        response = self._call("delete_group", lambda: self.mgmt.slb.service_group.delete(name=name)["response"], name=name)
+        self.catalog.remove_group(name)
+        return response
 
     # Virtual Servers and ports
     def get_virtual_server(self, name: str) -> dict:
@@ -194,16 +239,14 @@ class A10Manager:
                         }, ...]
         }
         """
-        try:
-            return self.mgmt.slb.virtual_server.get(name=name)["virtual-server"]
-        except NotFound:
-            return {}
+        return self._call(
+            "get_virtual_server",
+            lambda: self._get_or_empty(self.mgmt.slb.virtual_server.get, "virtual-server", name=name),
+            name=name,
+        )
 
     def get_virtual_server_by_ip(self, ip: str) -> dict:
-        for virtual in self.virtuals:
-            if virtual.get("ip-address") == ip:
-                return virtual
-        return {}
+        return self.catalog.get_virtual_by_ip(ip=ip) or {}
 
     def get_virtual_server_ip(self, name: str) -> str:
         return self.get_virtual_server(name=name).get("ip-address")
@@ -237,17 +280,16 @@ class A10Manager:
             ...
         }
         """
-        return self.mgmt.slb.virtual_server.oper(name=name)["virtual-server"]
+        return self._call(
+            "get_virtual_server_oper", lambda: self.mgmt.slb.virtual_server.oper(name=name)["virtual-server"], name=name
+        )
 
     def get_virtual_server_state(self, name: str) -> str:
         """Returns:
         str: All Up / Functional Up / Partial Up / Down
         """
-        return self.mgmt.slb.virtual_server.oper(name=name)["virtual-server"]["oper"][
-            "state"
-        ]
+        return self.get_virtual_server_oper(name=name)["oper"]["state"]
 
-    @refresh_on_change(data_type="virtual")
     def create_virtual_server(
         self, name: str, ip: str, port_list: list[dict] = None
     ) -> dict:
@@ -258,16 +300,23 @@ class A10Manager:
         Returns:
          same as get_virtual_server
         """
-        return self.mgmt.slb.virtual_server.create(
-            name=name, ip_address=ip, port_list=port_list
-        )["virtual-server"]
+        virtual = self._call(
+            "create_virtual_server",
+            lambda: self.mgmt.slb.virtual_server.create(name=name, ip_address=ip, port_list=port_list)["virtual-server"],
+            name=name, ip=ip, port_list=port_list,
+        )
+        self.catalog.add_virtual(virtual)
+        return virtual
 
-    @refresh_on_change(data_type="virtual")
     def delete_virtual_server(self, name: str) -> dict:
         """Returns:
         {'status': 'OK' / 'fail', 'err': {'msg': 'Object slb virtual-server {gpr-lablemams} does not exist'}}
         """
-        return self.mgmt.slb.virtual_server.delete(name=name)["response"]
+        response = self._call(
+            "delete_virtual_server", lambda: self.mgmt.slb.virtual_server.delete(name=name)["response"], name=name
+        )
+        self.catalog.remove_virtual(name)
+        return response
 
     def get_virtual_port(self, virtual_server: str, port: str, protocol: str) -> dict:
         """Returns:
@@ -281,17 +330,15 @@ class A10Manager:
             ...
         }
         """
-        try:
-            return self.mgmt.slb.virtual_server.vport.get(
-                virtual_server_name=virtual_server,
-                port=port,
-                protocol=protocol,
-                name=None,
-            )["port"]
-        except NotFound:
-            return {}
+        return self._call(
+            "get_virtual_port",
+            lambda: self._get_or_empty(
+                self.mgmt.slb.virtual_server.vport.get, "port",
+                virtual_server_name=virtual_server, port=port, protocol=protocol, name=None,
+            ),
+            virtual_server=virtual_server, port=port, protocol=protocol,
+        )
 
-    @refresh_on_change(data_type="virtual")
     def create_virtual_port(
         self,
         virtual_server: str,
@@ -300,6 +347,18 @@ class A10Manager:
         group: str,
         template_http: str = None,
         client_ssl: str = None,
+    ) -> dict:
+        virtual_port = self._call(
+            "create_virtual_port",
+            lambda: self._create_virtual_port(virtual_server, port, protocol, group, template_http, client_ssl),
+            virtual_server=virtual_server, port=port, protocol=protocol, group=group,
+            template_http=template_http, client_ssl=client_ssl,
+        )
+        self.catalog.add_virtual_port(virtual_server, virtual_port)
+        return virtual_port
+
+    def _create_virtual_port(
+        self, virtual_server: str, port: str, protocol: str, group: str, template_http: str, client_ssl: str
     ) -> dict:
         autosnat = 1
         use_rcv_hop = 1
@@ -317,13 +376,221 @@ class A10Manager:
             template_client_ssl=client_ssl,
         )["port"]
 
-    @refresh_on_change(data_type="virtual")
+    def replace_virtual_port(
+        self,
+        virtual_server: str,
+        port: str,
+        protocol: str,
+        group: str,
+        template_http: str = None,
+        client_ssl: str = None,
+    ) -> dict:
+        """Replaces the port configuration with one PUT, the port keeps listening.
+        Port number and protocol identify the port and can not be changed.
+        """
+        virtual_port = self._call(
+            "replace_virtual_port",
+            lambda: self.mgmt.slb.virtual_server.vport.replace(
+                virtual_server_name=virtual_server,
+                name=f"{virtual_server}:{port}@{group}",
+                protocol=protocol,
+                protocol_port=port,
+                service_group_name=group,
+                autosnat=1,
+                use_rcv_hop=1,
+                virtual_port_templates={"template-http": template_http},
+                template_client_ssl=client_ssl,
+            )["port"],
+            virtual_server=virtual_server, port=port, protocol=protocol, group=group,
+            template_http=template_http, client_ssl=client_ssl,
+        )
+        self.catalog.add_virtual_port(virtual_server, virtual_port)
+        return virtual_port
+
     def delete_virtual_port(
         self, virtual_server: str, port: str, protocol: str
     ) -> dict:
-        return self.mgmt.slb.virtual_server.vport.delete(
-            virtual_server_name=virtual_server, port=port, protocol=protocol, name=None
-        )["response"]
+        response = self._call(
+            "delete_virtual_port",
+            lambda: self.mgmt.slb.virtual_server.vport.delete(
+                virtual_server_name=virtual_server, port=port, protocol=protocol, name=None
+            )["response"],
+            virtual_server=virtual_server, port=port, protocol=protocol,
+        )
+        self.catalog.remove_virtual_port(virtual_server, port, protocol)
+        return response
+
+    @staticmethod
+    def _get_or_empty(getter, key: str, **kwargs) -> dict:
+        try:
+            return getter(**kwargs)[key]
+        except NotFound:
+            return {}
+
+    # Bulk operations
+    def _bulk(self, url: str, list_key: str, items: list[dict], create_one, key=lambda item: item["name"]) -> dict:
+        """Posts all items with one aXAPI request. If the device rejects the list,
+        items are created one by one so every failure is mapped back to its item.
+
+        Returns:
+         {'lem01-t01-psr01': {created object} / Exists / AddressSpecifiedIsInUse / ..., ...}
+        """
+        if not items:
+            return {}
+        try:
+            payload = {list_key: items}
+            response = self._call(
+                "request", lambda: self.mgmt.session.request("POST", url, payload), method="POST", path=url, payload=payload
+            )
+            created = (response or {}).get(list_key) or items
+            return {key(item): item for item in created}
+        except ACOSException:
+            results = {}
+            for item in items:
+                try:
+                    results[key(item)] = create_one(item)
+                except ACOSException as e:
+                    results[key(item)] = e
+            return results
+
+    def create_servers(self, servers: list[dict]) -> dict:
+        """Args:
+         servers: [{"name": str, "ip": str, "port_list": [...] / None}, ...]
+        Returns:
+         {'lem01-t01-psr01': same as get_server / exception, ...}
+        """
+        items = [
+            {
+                "name": server["name"],
+                "host": server["ip"],
+                "action": "enable",
+                **({"port-list": server["port_list"]} if server.get("port_list") else {}),
+            }
+            for server in servers
+        ]
+        results = self._bulk(
+            "/slb/server/", "server-list", items,
+            lambda item: self.create_server(name=item["name"], ip=item["host"], port_list=item.get("port-list")),
+        )
+        for result in results.values():
+            if not isinstance(result, Exception):
+                self.catalog.add_server(result)
+        return results
+
+    def delete_servers(self, names: list[str]) -> dict:
+        """aXAPI has no list delete (a DELETE of the list removes every server of the partition),
+        servers are deleted one by one
+
+        Returns:
+         {'lem01-t01-psr01': {'status': 'OK'} / exception, ...}
+        """
+        results = {}
+        for name in names:
+            try:
+                results[name] = self.delete_server(name=name)
+            except ACOSException as e:
+                results[name] = e
+        return results
+
+    def create_groups(self, groups: list[dict]) -> dict:
+        """Args:
+         groups: [{"name": str, "members": [{"name": str, "port": int / str}, ...], "health_check": str}, ...]
+        Returns:
+         {'lem01-t01-psr_8082': same as get_group / exception, ...}
+        """
+        items = [
+            {
+                "name": group["name"],
+                "protocol": "tcp",
+                "health-check": group.get("health_check", "tcp"),
+                **({"member-list": group["members"]} if group.get("members") else {}),
+            }
+            for group in groups
+        ]
+        results = self._bulk(
+            "/slb/service-group/", "service-group-list", items,
+            lambda item: self.create_group(
+                name=item["name"], members=item.get("member-list"), health_check=item["health-check"]
+            ),
+        )
+        for result in results.values():
+            if not isinstance(result, Exception):
+                self.catalog.add_group(result)
+        return results
+
+    def add_group_members(self, name: str, members: list[dict]) -> dict:
+        """Args:
+         members: [{"name": str, "port": int / str}, ...]
+        Returns:
+         {'lem01-t01-psr01:8082': member / exception, ...}
+        """
+        items = [{"name": member["name"], "port": int(member["port"])} for member in members]
+        results = self._bulk(
+            f"/slb/service-group/{name}/member/", "member-list", items,
+            lambda item: self._call(
+                "create_group_member",
+                lambda: self.mgmt.slb.service_group.member.create(name, item["name"], item["port"])["member"],
+                name=name, member=item["name"], port=item["port"],
+            ),
+            key=lambda item: f"{item['name']}:{item['port']}",
+        )
+        added = [item for item in items if not isinstance(results.get(f"{item['name']}:{item['port']}"), Exception)]
+        self.catalog.add_group_members(name, added)
+        return results
+
+    def delete_group_members(self, name: str, members: list[dict]) -> dict:
+        """aXAPI has no list delete, members are deleted one by one
+
+        Args:
+         members: [{"name": str, "port": int / str}, ...]
+        Returns:
+         {'lem01-t01-psr01:8082': {'status': 'OK'} / exception, ...}
+        """
+        results, deleted = {}, []
+        for member in members:
+            member_name, port = member["name"], int(member["port"])
+            try:
+                results[f"{member_name}:{port}"] = self._call(
+                    "delete_group_member",
+                    lambda: self.mgmt.slb.service_group.member.delete(name, member_name, port)["response"],
+                    name=name, member=member_name, port=port,
+                )
+                deleted.append(member)
+            except ACOSException as e:
+                results[f"{member_name}:{port}"] = e
+        self.catalog.remove_group_members(name, deleted)
+        return results
+
+    def create_virtual_ports(self, virtual_server: str, ports: list[dict]) -> dict:
+        """Args:
+         ports: [{"port": int / str, "protocol": str, "group": str,
+                  "template_http": str / None, "client_ssl": str / None}, ...]
+        Returns:
+         {'443+https': same as get_virtual_port / exception, ...}
+        """
+        items = [
+            virtual_port_item(
+                virtual_server, port["port"], port["protocol"], port["group"],
+                template_http=port.get("template_http"), client_ssl=port.get("client_ssl"),
+            )
+            for port in ports
+        ]
+        results = self._bulk(
+            f"/slb/virtual-server/{virtual_server}/port/", "port-list", items,
+            lambda item: self.create_virtual_port(
+                virtual_server=virtual_server,
+                port=item["port-number"],
+                protocol=item["protocol"],
+                group=item["service-group"],
+                template_http=item.get("template-http"),
+                client_ssl=item.get("template-client-ssl"),
+            ),
+            key=lambda item: f"{item['port-number']}+{item['protocol']}",
+        )
+        for result in results.values():
+            if not isinstance(result, Exception):
+                self.catalog.add_virtual_port(virtual_server, result)
+        return results
 
     def _extend_responses(self):
         RESPONSE_CODES.update({
@@ -340,3 +607,44 @@ class A10Manager:
                 }
             },
         })
+
+
+class Session(AcosSession):
+    """acos session which reports every authentication to its A10Manager
+
+    With the manager's token_cache the session of a previous run is reused. acos_client closes
+    a session it got InvalidSessionID for before authenticating again, so a rejected session
+    is dropped from the cache in close().
+    """
+
+    def __init__(self, manager: A10Manager, client: acos.Client, username: str, password: str) -> None:
+        super().__init__(client, username, password)
+        self.manager = manager
+
+    def authenticate(self, username, password):
+        token_cache = self.manager.token_cache
+        if token_cache and (cached := token_cache.get(self.manager.address, username)):
+            self.session_id = cached[0]
+            return {"authresponse": {"signature": self.session_id}}
+        self.manager.count_login()
+        response = super().authenticate(username, password)
+        if token_cache and self.session_id:
+            token_cache.set(self.manager.address, username, self.session_id)
+        return response
+
+    def request(self, method: str, path: str, payload: dict = None) -> dict:
+        """aXAPI request with the session's signature, authenticates again once if the device rejects it
+
+        Args:
+         path: '/slb/server/', without the '/axapi/v3' prefix
+        """
+        try:
+            return self.http.request(method, f"/axapi/v3{path}", payload, {"Authorization": f"A10 {self.id}"})
+        except InvalidSessionID:
+            self.close()
+            return self.http.request(method, f"/axapi/v3{path}", payload, {"Authorization": f"A10 {self.id}"})
+
+    def close(self):
+        if self.manager.token_cache and self.session_id:
+            self.manager.token_cache.discard(self.manager.address, self.username, self.session_id)
+        return super().close()
@@ -0,0 +1,273 @@
+"""Dependency graph of model tree writes"""
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextvars import copy_context
+
+from api_libs.helper import get_ff
+from api_libs.logger import Logger
+
+from libs import identity_map
+from libs.device_limiter import limiter
+
+logger = Logger()
+
+# Order of an object and its siblings
+SIBLINGS_FIRST = "siblings_first"
+SELF_FIRST = "self_first"
+
+# Dependency types: a REQUIRES dependent is skipped when its prerequisite fails,
+# an AFTER dependent only waits for it. Both are skipped when the prerequisite raises.
+REQUIRES = "requires"
+AFTER = "after"
+
+# Operation statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+RESULT_FIELDS = {"patch": "patched", "delete": "deleted"}
+
+
+class Operation:
+    """One patch / delete of one model object"""
+
+    def __init__(self, obj, method: str, prepare: bool = False) -> None:
+        self.obj = obj
+        self.method = method
+        # _prepare_siblings of the object which runs before its siblings, its result does not matter
+        self.prepare = prepare
+        self.prerequisites = dict()
+        self.waiters = dict()
+        self.after = dict()
+        self.children = dict()
+        self.expanded = False
+        # Got a new prerequisite after it ran, see ApplyEngine._retry
+        self.retry = False
+        self.status = PENDING
+        self.result = False
+        self.error = None
+        self.seconds = None
+
+    @property
+    def name(self) -> str:
+        """Returns:
+        'patch PoolF5 lem01-t01-pwr_8082'
+        """
+        method = f"prepare {self.method}" if self.prepare else self.method
+        return f"{method} {self.obj.__class__.__name__} {getattr(self.obj, 'name', '')}".rstrip()
+
+    def depends_on(self, other: "Operation", kind: str) -> None:
+        if other is not self and self.prerequisites.get(other) != REQUIRES:
+            if other not in self.prerequisites and self.status in (RUNNING, FAILED):
+                self.retry = True
+            self.prerequisites[other] = kind
+
+    @property
+    def blocked(self) -> bool:
+        return any(other.status in (PENDING, RUNNING) for other in self.prerequisites)
+
+    @property
+    def upstream_error(self) -> Exception:
+        return next((other.error for other in self.prerequisites if other.error), None)
+
+    @property
+    def must_skip(self) -> bool:
+        return bool(self.upstream_error) or any(
+            kind == REQUIRES and other.status in (FAILED, SKIPPED) for other, kind in self.prerequisites.items()
+        )
+
+    def run(self) -> None:
+        run = identity_map.current()
+        if run is None or self.prepare:
+            return self._run()
+        with run.applying(self.obj, self.method) as applied:
+            if applied:
+                # Shared object already applied by another parent of the run
+                self.result, self.status, self.seconds = True, DONE, 0.0
+                return
+            self._run()
+            if self.status == DONE:
+                run.applied(self.obj, self.method)
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        try:
+            with limiter.slot(self.obj.device, get_ff('DEVICE_CONCURRENCY')):
+                if self.prepare:
+                    self.obj._prepare_siblings(self.method)
+                    self.result = True
+                else:
+                    try:
+                        self.result = getattr(self.obj, self.method)()
+                    finally:
+                        # Whatever was read before the write is outdated now
+                        self.obj.invalidate()
+            self.status = DONE if self.result else FAILED
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        finally:
+            self.seconds = time.monotonic() - started
+
+
+class ApplyEngine:
+    """Compiles a model tree into patch / delete operations with dependencies and runs them
+
+    Every class tells how it is ordered against its siblings with `<method>_dependency`,
+    e.g. (SIBLINGS_FIRST, REQUIRES): nodes are patched before their pool, and the pool is not
+    patched if any of them failed. Siblings of SELF_FIRST objects are compiled only once the
+    object itself is done, as they may depend on what it did (an entrypoint reserves its IP).
+
+    Objects with the same key are applied once. A shared SELF_FIRST object is compiled by the first
+    parent which is done, the others link to it when they are done: if it failed meanwhile (a pool
+    still used by another virtual can not be deleted), it runs again. Ready operations run in parallel,
+    up to SIBLINGS_CONCURRENCY in total and DEVICE_CONCURRENCY per balancer.
+    """
+
+    def __init__(self, root, method: str) -> None:
+        self.root = root
+        self.method = method
+        self.operations = dict()
+        self.errors = list()
+        self.root_operation = self._add(root, waiters={}, after={})
+
+    # Compilation
+    def _dependency(self, obj) -> tuple[str, str]:
+        return getattr(obj, f"{self.method}_dependency")
+
+    def _add(self, obj, waiters: dict, after: dict) -> Operation:
+        """waiters wait for the whole subtree of obj, the whole subtree waits for after"""
+        operation = self.operations.get(obj.key)
+        new = operation is None
+        if new:
+            operation = self.operations[obj.key] = Operation(obj, self.method)
+        self._link(operation, waiters, after)
+        if new and self._dependency(obj)[0] == SIBLINGS_FIRST:
+            self._expand(operation)
+        elif not new:
+            # Already compiled in another branch, its subtree gets our dependencies as well
+            for child in operation.children.values():
+                self._add(child.obj, waiters, after)
+        return operation
+
+    @staticmethod
+    def _link(operation: Operation, waiters: dict, after: dict) -> None:
+        for other, kind in after.items():
+            operation.depends_on(other, kind)
+        for other, kind in waiters.items():
+            other.depends_on(operation, kind)
+        operation.waiters.update(waiters)
+        operation.after.update(after)
+
+    def _expand(self, operation: Operation) -> None:
+        operation.expanded = True
+        obj = operation.obj
+        order, kind = self._dependency(obj)
+        waiters, after = dict(operation.waiters), dict(operation.after)
+        if order == SIBLINGS_FIRST:
+            waiters[operation] = kind
+        else:
+            after[operation] = kind
+        if not obj.siblings:
+            return
+        if obj.prepares_siblings:
+            prepare = self.operations[(obj.key, "prepare")] = Operation(obj, self.method, prepare=True)
+            self._link(prepare, waiters, after)
+            after = {**after, prepare: AFTER}
+        for name, sibling in obj.siblings.items():
+            operation.children[name] = self._add(sibling, waiters, after)
+
+    # Scheduling
+    def _next(self, select) -> Operation:
+        return next((
+            operation for operation in self.operations.values()
+            if operation.status == PENDING and select(operation) and not operation.blocked
+        ), None)
+
+    def _finish(self, operation: Operation) -> None:
+        if operation.error and operation.status != SKIPPED:
+            self.errors.append(operation.error)
+        logger.log.debug(f"ApplyEngine - {operation.name}: {operation.status} in {operation.seconds or 0:.2f}s")
+        if not (operation.expanded or operation.prepare or operation.error):
+            order, kind = self._dependency(operation.obj)
+            if order == SELF_FIRST and (operation.status == DONE or kind == AFTER and operation.status == FAILED):
+                self._expand(operation)
+        self._retry()
+
+    def _retry(self) -> None:
+        """Failed operations which got a new prerequisite run again once it is done"""
+        for operation in self.operations.values():
+            if not operation.retry or operation.status == RUNNING:
+                continue
+            operation.retry = False
+            if operation.status == FAILED and not operation.error:
+                logger.log.debug(f"ApplyEngine - {operation.name}: retried after its new prerequisites")
+                operation.status = PENDING
+                operation.result = False
+                operation.seconds = None
+
+    def run(self, select=None) -> dict:
+        """Runs pending operations (only the selected ones with select) and returns the nested result
+        the same way global_patch / global_delete always did.
+        The first exception raised by an operation is raised once the rest of the graph is done.
+        """
+        select = select or (lambda operation: True)
+        concurrency = max(get_ff('SIBLINGS_CONCURRENCY'), 1)
+        running = dict()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                operation = self._next(select)
+                if operation and operation.must_skip:
+                    operation.status = SKIPPED
+                    operation.error = operation.upstream_error
+                    self._finish(operation)
+                elif operation and concurrency == 1:
+                    operation.status = RUNNING
+                    operation.run()
+                    self._finish(operation)
+                elif operation and len(running) < concurrency:
+                    operation.status = RUNNING
+                    # Every operation runs in a copy of our context to stay within the same memo / transaction
+                    running[executor.submit(copy_context().run, operation.run)] = operation
+                elif running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(running.pop(future))
+                else:
+                    break
+        if self.errors:
+            raise self.errors[0]
+        return self.result()
+
+    def reset(self, select) -> None:
+        """Selected operations will run again on the next run()"""
+        run = identity_map.current()
+        for operation in self.operations.values():
+            if select(operation):
+                if run:
+                    run.forget(operation.obj, self.method)
+                operation.retry = False
+                operation.status = PENDING
+                operation.result = False
+                operation.error = None
+                operation.seconds = None
+        self.errors = list()
+
+    # Results
+    def succeeded(self, obj) -> bool:
+        return self.operations[obj.key].status == DONE
+
+    def result(self, operation: Operation = None) -> dict:
+        operation = operation or self.root_operation
+        siblings = {name: self.result(child) for name, child in operation.children.items()}
+        result = operation.result if operation.status in (DONE, FAILED) else False
+        return {
+            operation.obj.__class__.__name__: {
+                RESULT_FIELDS[self.method]: result,
+                'siblings': siblings
+            }
+        }
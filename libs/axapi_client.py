@@ -0,0 +1,233 @@
+"""Asyncio aXAPI v3 client"""
+import asyncio
+
+import httpx
+from acos_client.errors import InvalidSessionID
+from acos_client.errors import NotFound
+from acos_client.v30 import responses as acos_responses
+
+from libs.event_loop import EventLoopThread
+from libs.token_cache import TokenCache
+
+
+def virtual_port_item(
+    virtual_server: str, port: str, protocol: str, group: str, template_http: str = None, client_ssl: str = None
+) -> dict:
+    """aXAPI port object as A10Manager.create_virtual_port configures it"""
+    item = {
+        "name": f"{virtual_server}:{port}@{group}",
+        "port-number": int(port),
+        "protocol": protocol,
+        "service-group": group,
+        "auto": 1,
+        "use-rcv-hop-for-resp": 1,
+    }
+    if template_http and protocol in ("http", "https"):
+        item["template-http"] = template_http
+    if client_ssl:
+        item["template-client-ssl"] = client_ssl
+    return item
+
+
+class AxapiClient:
+    """Async aXAPI client for one A10 device with the get/create/delete surface of A10Manager
+
+    All requests share one keep-alive connection pool and at most `concurrency` of them are in flight.
+    Errors are raised as acos_client exceptions (Exists, NotFound, AddressSpecifiedIsInUse, ...),
+    missing objects are returned as {} like in A10Manager.
+
+    Sync code calls run(), which executes coroutines on the client's own event loop thread,
+    so the connection pool survives between calls.
+
+    With a token_cache the session of a previous run is reused, and not logged off at close().
+    """
+
+    def __init__(
+        self, address: str, user: str, password: str, partition: str = None, concurrency: int = 8,
+        timeout: int = 30, on_login=None, transport: httpx.AsyncBaseTransport = None, token_cache: TokenCache = None
+    ) -> None:
+        self.address = address
+        self.user = user
+        self.password = password
+        self.partition = partition
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.on_login = on_login
+        self.transport = transport
+        self.token_cache = token_cache
+        self._client = None
+        self._semaphore = None
+        self._auth_lock = None
+        self._signature = None
+        self._loop = EventLoopThread(name=f"axapi-{address}")
+
+    # Transport
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if not self._client:
+            self._client = httpx.AsyncClient(
+                base_url=f"https://{self.address}/axapi/v3",
+                verify=False,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._auth_lock = asyncio.Lock()
+        return self._client
+
+    async def authenticate(self) -> str:
+        signature = self._signature
+        async with self._auth_lock:
+            # Somebody else has already refreshed the signature while we were waiting
+            if self._signature and self._signature != signature:
+                return self._signature
+            if self.token_cache:
+                if signature:
+                    self.token_cache.discard(self.cache_device, self.user, signature)
+                if (cached := self.token_cache.get(self.cache_device, self.user)) and cached[0] != signature:
+                    self._signature = cached[0]
+                    return self._signature
+            payload = {"credentials": {"username": self.user, "password": self.password}}
+            response = self._parse("POST", "/auth", await self.client.post("/auth", json=payload))
+            self._signature = str(response["authresponse"]["signature"])
+            if self.on_login:
+                self.on_login()
+            if self.partition:
+                await self._send("POST", f"/active-partition/{self.partition}")
+            if self.token_cache:
+                self.token_cache.set(self.cache_device, self.user, self._signature)
+            return self._signature
+
+    @property
+    def cache_device(self) -> str:
+        """Active partition belongs to the session, so cached sessions are kept per partition"""
+        return f"{self.address}/{self.partition}" if self.partition else self.address
+
+    async def request(self, method: str, path: str, payload: dict = None) -> dict:
+        client = self.client
+        async with self._semaphore:
+            if not self._signature:
+                await self.authenticate()
+            try:
+                return await self._send(method, path, payload, client=client)
+            except InvalidSessionID:
+                await self.authenticate()
+                return await self._send(method, path, payload, client=client)
+
+    async def _send(self, method: str, path: str, payload: dict = None, client: httpx.AsyncClient = None) -> dict:
+        headers = {"Authorization": f"A10 {self._signature}"}
+        response = await (client or self.client).request(method, path, json=payload, headers=headers)
+        return self._parse(method, path, response, headers)
+
+    @staticmethod
+    def _parse(method: str, path: str, response: httpx.Response, headers: dict = None) -> dict:
+        data = response.json() if response.content else {"response": {"status": "OK"}}
+        if data.get("response", {}).get("status") == "fail":
+            acos_responses.raise_axapi_ex(data, method, f"/axapi/v3{path}")
+        acos_responses.raise_axapi_auth_error(data, method, f"/axapi/v3{path}", headers)
+        return data
+
+    async def _get_or_empty(self, path: str, key: str) -> dict:
+        try:
+            return (await self.request("GET", path))[key]
+        except NotFound:
+            return {}
+
+    async def close(self) -> None:
+        if self._client:
+            if self._signature and not self.token_cache:
+                try:
+                    await self._send("POST", "/logoff")
+                except Exception:
+                    pass
+            await self._client.aclose()
+            self._client = None
+            self._signature = None
+
+    # Sync bridge
+    def run(self, coro):
+        """Runs a coroutine on the client's event loop thread and waits for its result"""
+        return self._loop.run(coro)
+
+    async def gather(self, coros) -> list:
+        return await asyncio.gather(*coros)
+
+    # Servers
+    async def get_server(self, name: str) -> dict:
+        return await self._get_or_empty(f"/slb/server/{name}", "server")
+
+    async def get_servers(self) -> list[dict]:
+        return (await self.request("GET", "/slb/server/")).get("server-list", [])
+
+    async def create_server(self, name: str, ip: str, port_list: list[dict] = None) -> dict:
+        server = {"name": name, "host": ip, "action": "enable"}
+        if port_list:
+            server["port-list"] = port_list
+        return (await self.request("POST", "/slb/server/", {"server": server}))["server"]
+
+    async def delete_server(self, name: str) -> dict:
+        return (await self.request("DELETE", f"/slb/server/{name}"))["response"]
+
+    # Service groups
+    async def get_group(self, name: str) -> dict:
+        return await self._get_or_empty(f"/slb/service-group/{name}", "service-group")
+
+    async def get_groups(self) -> list[dict]:
+        return (await self.request("GET", "/slb/service-group/")).get("service-group-list", [])
+
+    async def create_group(self, name: str, members: list[dict] = None, health_check: str = "tcp") -> dict:
+        group = {"name": name, "protocol": "tcp", "health-check": health_check}
+        if members:
+            group["member-list"] = members
+        return (await self.request("POST", "/slb/service-group/", {"service-group": group}))["service-group"]
+
+    async def delete_group(self, name: str) -> dict:
+        return (await self.request("DELETE", f"/slb/service-group/{name}"))["response"]
+
+    async def create_group_member(self, name: str, member: str, port: int) -> dict:
+        payload = {"member": {"name": member, "port": port}}
+        return (await self.request("POST", f"/slb/service-group/{name}/member/", payload))["member"]
+
+    async def delete_group_member(self, name: str, member: str, port: int) -> dict:
+        return (await self.request("DELETE", f"/slb/service-group/{name}/member/{member}+{port}"))["response"]
+
+    # Virtual Servers and ports
+    async def get_virtual_server(self, name: str) -> dict:
+        return await self._get_or_empty(f"/slb/virtual-server/{name}", "virtual-server")
+
+    async def get_virtual_servers(self) -> list[dict]:
+        return (await self.request("GET", "/slb/virtual-server/")).get("virtual-server-list", [])
+
+    async def get_virtual_server_oper(self, name: str) -> dict:
+        return (await self.request("GET", f"/slb/virtual-server/{name}/oper"))["virtual-server"]
+
+    async def create_virtual_server(self, name: str, ip: str, port_list: list[dict] = None) -> dict:
+        virtual = {"name": name, "ip-address": ip}
+        if port_list:
+            virtual["port-list"] = port_list
+        return (await self.request("POST", "/slb/virtual-server/", {"virtual-server": virtual}))["virtual-server"]
+
+    async def delete_virtual_server(self, name: str) -> dict:
+        return (await self.request("DELETE", f"/slb/virtual-server/{name}"))["response"]
+
+    async def get_virtual_port(self, virtual_server: str, port: str, protocol: str) -> dict:
+        return await self._get_or_empty(f"/slb/virtual-server/{virtual_server}/port/{port}+{protocol}", "port")
+
+    async def create_virtual_port(
+        self, virtual_server: str, port: str, protocol: str, group: str, template_http: str = None,
+        client_ssl: str = None
+    ) -> dict:
+        item = virtual_port_item(virtual_server, port, protocol, group, template_http, client_ssl)
+        return (await self.request("POST", f"/slb/virtual-server/{virtual_server}/port/", {"port": item}))["port"]
+
+    async def replace_virtual_port(
+        self, virtual_server: str, port: str, protocol: str, group: str, template_http: str = None,
+        client_ssl: str = None
+    ) -> dict:
+        item = virtual_port_item(virtual_server, port, protocol, group, template_http, client_ssl)
+        path = f"/slb/virtual-server/{virtual_server}/port/{port}+{protocol}"
+        return (await self.request("PUT", path, {"port": item}))["port"]
+
+    async def delete_virtual_port(self, virtual_server: str, port: str, protocol: str) -> dict:
+        return (await self.request("DELETE", f"/slb/virtual-server/{virtual_server}/port/{port}+{protocol}"))["response"]
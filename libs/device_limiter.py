@@ -0,0 +1,74 @@
+"""Per-device cap of concurrent sibling work"""
+import threading
+from contextlib import contextmanager
+
+
+class DeviceLimiter:
+    """Bounded slots per device, shared by every thread of the run
+
+    A thread holds the slot of the device it works on. Slots are reentrant per thread and device:
+    a thread which works down a tree of one device takes the slot once, whatever the depth.
+    While it waits for its own siblings it gives the slot back (released()), so nested
+    traversals never deadlock on a device.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._slots = dict()
+        self._held = threading.local()
+
+    def _get_semaphore(self, device: tuple, size: int) -> threading.Semaphore:
+        with self._lock:
+            if device not in self._slots:
+                self._slots[device] = threading.BoundedSemaphore(size)
+            return self._slots[device]
+
+    def _thread_state(self) -> tuple[dict, list]:
+        """Slots the current thread holds per device, and the devices of its open slot() blocks"""
+        if not hasattr(self._held, "counts"):
+            self._held.counts = dict()
+            self._held.devices = list()
+        return self._held.counts, self._held.devices
+
+    @contextmanager
+    def slot(self, device: tuple, size: int):
+        """Holds one of `size` slots of device, objects which are not bound to a device (None) run freely"""
+        if device is None:
+            yield
+            return
+        counts, devices = self._thread_state()
+        semaphore = self._get_semaphore(device, size)
+        if not counts.get(device):
+            semaphore.acquire()
+        counts[device] = counts.get(device, 0) + 1
+        devices.append(device)
+        try:
+            yield
+        finally:
+            devices.pop()
+            counts[device] -= 1
+            if not counts[device]:
+                semaphore.release()
+
+    @contextmanager
+    def released(self):
+        """Gives the slot of the innermost device of the current thread back for the time of the block"""
+        counts, devices = self._thread_state()
+        device = devices[-1] if devices else None
+        held = counts.get(device, 0)
+        if held:
+            counts[device] = 0
+            self._slots[device].release()
+        try:
+            yield
+        finally:
+            if held:
+                self._slots[device].acquire()
+                counts[device] = held
+
+    def reset(self) -> None:
+        with self._lock:
+            self._slots = dict()
+
+
+limiter = DeviceLimiter()
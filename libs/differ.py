@@ -0,0 +1,92 @@
+"""Structural diff of plans and states"""
+from typing import NamedTuple
+
+# Change kinds
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+class Change(NamedTuple):
+    """Change of one field from state (old) to plan (new)
+
+    added / removed - items of list and set fields only one side has, order does not matter
+    fields - Diff of dict fields
+    """
+    kind: str
+    old: object = None
+    new: object = None
+    added: tuple = ()
+    removed: tuple = ()
+    fields: "Diff" = None
+
+    def to_dict(self) -> dict:
+        """Returns:
+        {'old': ['pwr01:8082'], 'new': ['pwr01:8082', 'pwr02:8082'], 'added': ['pwr02:8082']}
+        """
+        if self.fields is not None:
+            return self.fields.to_dict()
+        data = {'old': self.old, 'new': self.new}
+        if self.added:
+            data['added'] = list(self.added)
+        if self.removed:
+            data['removed'] = list(self.removed)
+        return data
+
+
+class Diff(dict):
+    """{field: Change}, empty if state and plan are equal"""
+
+    def to_dict(self) -> dict:
+        return {field: change.to_dict() for field, change in self.items()}
+
+
+def _freeze(value):
+    """Hashable form of plan / state values, e.g. A10 member-list items are dicts"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    return value
+
+
+def _collection_change(old, new) -> Change:
+    old_items = {_freeze(item): item for item in old}
+    new_items = {_freeze(item): item for item in new}
+    return Change(
+        kind=CHANGED, old=old, new=new,
+        added=tuple(item for key, item in new_items.items() if key not in old_items),
+        removed=tuple(item for key, item in old_items.items() if key not in new_items)
+    )
+
+
+def _change(old, new) -> Change:
+    if isinstance(old, dict) and isinstance(new, dict):
+        return Change(kind=CHANGED, old=old, new=new, fields=diff(old, new))
+    if isinstance(old, (list, tuple, set, frozenset)) and isinstance(new, (list, tuple, set, frozenset)):
+        return _collection_change(old, new)
+    return Change(kind=CHANGED, old=old, new=new)
+
+
+def diff(state: dict, plan: dict) -> Diff:
+    """Field level changes which turn state into plan
+
+    Returns:
+    {'ip': Change(kind='changed', old='1.1.1.1', new='1.1.1.2')}
+    """
+    result = Diff()
+    if state == plan:
+        return result
+    state = state or {}
+    plan = plan or {}
+    for field, new in plan.items():
+        if field not in state:
+            result[field] = Change(kind=ADDED, new=new)
+        elif state[field] != new:
+            result[field] = _change(state[field], new)
+    for field, old in state.items():
+        if field not in plan:
+            result[field] = Change(kind=REMOVED, old=old)
+    return result
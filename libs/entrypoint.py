@@ -1,3 +1,5 @@
+import functools
+
 import api_libs.ads_mini as ads
 import api_libs.dna as dna_wrapper
 import api_libs.ip_tools as ip_tools
@@ -11,6 +13,13 @@ from retrying import retry
 from conf.static import balancers
 from conf.static import entrypoints
 from conf.static import shared_entrypoints
+from libs.apply_engine import AFTER
+from libs.apply_engine import ApplyEngine
+from libs.apply_engine import REQUIRES
+from libs.apply_engine import SELF_FIRST
+from libs.apply_engine import SIBLINGS_FIRST
+from libs.device_limiter import limiter
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
 from libs.virtual_server import VirtualServerA10
@@ -19,8 +28,29 @@ from libs.virtual_server import VirtualServerF5
 
 logger = Logger()
 
+# Limiter key of IP reservations and DNS records, see inventory_slot
+INVENTORY = ("INVENTORY",)
+
+
+def inventory_slot(method):
+    """Entrypoints processed in parallel reserve IPs and write DNS records INVENTORY_CONCURRENCY at a time,
+    so two of them never take the same free IP
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with limiter.slot(INVENTORY, get_ff('INVENTORY_CONCURRENCY')):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class Entrypoint(Base):
+    # Virtual servers need the IP the entrypoint reserves, DNS is removed once they are gone
+    patch_dependency = (SELF_FIRST, REQUIRES)
+    delete_dependency = (SIBLINGS_FIRST, AFTER)
+    # DNS answers lag behind our writes, the state read before them stays (the reserved IP as well)
+    state_attributes = ()
+
     def __init__(self, name: str, env: ads.Env, endpoints: dict) -> None:
         super().__init__()
         self.env = env
@@ -28,13 +58,8 @@ class Entrypoint(Base):
         self.name = f'{name}-{self.env.suffix}'
         self.fqdn = f'{self.name}.{self.env.domain}'
         self.endpoints = endpoints
-        self._current_dns = None
-        self._planned_dns = None
-        self._current_nodes = None
-        self._shared_env_suffix = None
         self._lbr_wrp = None
         self.dna = dna_wrapper.DNA(url=f"{get_ff('DNA')['DNAURL']}/api/submit", token=get_ff('DNA')['DNATOKEN'])
-        self._ip = None
         self.inv = Inventory(mode=get_ff('INVENTORY_MODE'), netbox_api=get_ff('NETBOX_API'),
                              netbox_token=get_ff('NETBOX_TOKEN'), rt_api=get_ff('RT')['DOMAIN'])
 
@@ -51,98 +76,84 @@ class Entrypoint(Base):
                 if any(hostname in shared_servers for hostname in hostnames):
                     return env_suffix
 
-    @property
+    @lazy
     @log(logger)
     def ip(self):
-        if not self._ip:
-            self._ip = (self.plan['dns']['ips'].get('A', [None]) or [None])[0]
-            if self._ip == 'Need to reserve IP':
-                logger.log.info(f"There is no IP in inventory for entrypoint: {self.name}")
-                self._ip = None
-        return self._ip
-
-    @ip.setter
-    def ip(self, value):
-        self._ip = value
+        """Assigned once the IP is reserved"""
+        ip = (self.plan['dns']['ips'].get('A', [None]) or [None])[0]
+        if ip == 'Need to reserve IP':
+            logger.log.info(f"There is no IP in inventory for entrypoint: {self.name}")
+            return None
+        return ip
 
-    @property
+    @lazy
     @log(logger)
     def current_dns(self):
-        if not self._current_dns:
-            self._current_dns = self._get_current_dns()
-        return self._current_dns
+        return self._get_current_dns()
 
-    @property
+    @lazy
     @log(logger)
     def current_nodes(self):
-        if not self._current_nodes:
-            if self.shared_env_suffix:
-                nodes = ['Shared nodes']
-            else:
-                nodes = set()
-                # Get nodes assosiated with the IP
-                if self.current_dns['A']:
-                    for ip in self.current_dns['A']:
-                        interfaces = self.inv.get_interfaces(ip=ip)
-                        if interfaces:
-                            for item in interfaces:
-                                if item['name'] != 'nic0':
-                                    nodes.add(item['host_name'])
-
-                # Inventory may have node:interface links not assosiated with the IP which we can not just ignore
-                for node in self.endpoints.keys():
-                    interfaces = self.inv.get_interfaces(hostname=node)
+        if self.shared_env_suffix:
+            nodes = ['Shared nodes']
+        else:
+            nodes = set()
+            # Get nodes assosiated with the IP
+            if self.current_dns['A']:
+                for ip in self.current_dns['A']:
+                    interfaces = self.inv.get_interfaces(ip=ip)
                     if interfaces:
                         for item in interfaces:
-                            if item['name'] == self.interface_name:
+                            if item['name'] != 'nic0':
                                 nodes.add(item['host_name'])
-            self._current_nodes = sorted(list(nodes))
-        return self._current_nodes
 
-    @property
+            # Inventory may have node:interface links not assosiated with the IP which we can not just ignore
+            for node in self.endpoints.keys():
+                interfaces = self.inv.get_interfaces(hostname=node)
+                if interfaces:
+                    for item in interfaces:
+                        if item['name'] == self.interface_name:
+                            nodes.add(item['host_name'])
+        return sorted(list(nodes))
+
+    @lazy
     @log(logger)
     def planned_dns(self):
-        if not self._planned_dns:
-            self._planned_dns = self._get_planned_dns()
-        return self._planned_dns
+        return self._get_planned_dns()
 
-    @property
+    @lazy
     @log(logger)
     def state(self):
         """ State is based on DNS and Inventory information"""
-        if not self._state:
-            self._state = {
-                'name': self.name,
-                'dns': {
-                    'fqdn': self.fqdn,
-                    'ips': self.current_dns
-                },
-                'inventory': {
-                    'nodes': self.current_nodes
-                }
+        return {
+            'name': self.name,
+            'dns': {
+                'fqdn': self.fqdn,
+                'ips': self.current_dns
+            },
+            'inventory': {
+                'nodes': self.current_nodes
             }
-        return self._state
+        }
 
-    @property
+    @lazy
     @log(logger)
     def plan(self):
         """ Plan is based on endpoints structure """
-        if not self._plan:
-            if self.shared_env_suffix:
-                nodes = ['Shared nodes']
-            else:
-                nodes = sorted([node for node in self.endpoints.keys()])
-            self._plan = {
-                'name': self.name,
-                'dns': {
-                    'fqdn': self.fqdn,
-                    'ips': self.planned_dns
-                },
-                'inventory': {
-                    'nodes': nodes  # Nodes gathered from ADS and we plan to put them in inventory as interfaces
-                }
+        if self.shared_env_suffix:
+            nodes = ['Shared nodes']
+        else:
+            nodes = sorted([node for node in self.endpoints.keys()])
+        return {
+            'name': self.name,
+            'dns': {
+                'fqdn': self.fqdn,
+                'ips': self.planned_dns
+            },
+            'inventory': {
+                'nodes': nodes  # Nodes gathered from ADS and we plan to put them in inventory as interfaces
             }
-        return self._plan
+        }
 
     @property
     @log(logger)
@@ -177,13 +188,10 @@ class Entrypoint(Base):
     def _get_current_dns(self):
         return ip_tools.nslookup(qname=self.fqdn, resolve_cname=False)
 
-    @property
+    @lazy
     @log(logger)
     def shared_env_suffix(self):
-        if not self._shared_env_suffix:
-            self._shared_env_suffix = Entrypoint.get_shared_env_suffix(entrypoint=self.interface_name,
-                                                                       servers=list(self.endpoints.keys()))
-        return self._shared_env_suffix
+        return Entrypoint.get_shared_env_suffix(entrypoint=self.interface_name, servers=list(self.endpoints.keys()))
 
     def _get_planned_dns(self):
         if self.shared_env_suffix:
@@ -276,6 +284,7 @@ class Entrypoint(Base):
             return self.env.does_variable_match(ads_variable, planned_value)
 
     @log(logger)
+    @inventory_slot
     def create(self) -> bool:
         if not self.are_we_good():
             return False
@@ -293,6 +302,7 @@ class Entrypoint(Base):
             return self.ip and create_dns_status
 
     @log(logger)
+    @inventory_slot
     def delete(self) -> bool:
         if self.shared_env_suffix:
             value = f"{self.interface_name}-{self.shared_env_suffix}.{self.env.domain}"
@@ -316,26 +326,22 @@ class Entrypoint(Base):
 
     @log(logger)
     def global_patch(self):
-        self_patched = self.patch()
-        siblings_data = {} if not self_patched else self._get_siblings_data('patch')
-
-        return {
-            self.__class__.__name__: {
-                'patched': self_patched,
-                'siblings': siblings_data
-            }
-        }
-
-    def global_delete(self):
-        siblings_data = self._get_siblings_data('delete')
-        self_deleted = self.delete()
-
-        return {
-            self.__class__.__name__: {
-                'deleted': self_deleted,
-                'siblings': siblings_data
-            }
-        }
+        engine = ApplyEngine(self, 'patch')
+        if not get_ff('F5_TRANSACTIONS') or entrypoints[self.interface_name]['LB'] != 'F5':
+            return engine.run()
+        # DNS and inventory first, balancer objects within one transaction
+        result = engine.run(select=lambda operation: operation.obj is self)
+        if not engine.succeeded(self):
+            return result
+        # Reads do not see writes queued in the transaction, so the whole tree state is read before it
+        self.global_state
+        try:
+            with self.lbr_wrp.f5.transaction():
+                return engine.run()
+        except self.lbr_wrp.f5.Error as e:
+            logger.log.warning(f"F5.transaction - {self.name}: {e}, patching step by step")
+            engine.reset(select=lambda operation: operation.obj is not self)
+            return engine.run()
 
     @log(logger)
     def patch(self) -> bool:
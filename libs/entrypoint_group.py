@@ -5,6 +5,7 @@ from api_libs.inventory import Inventory
 from api_libs.logger import Logger
 
 from libs.entrypoint import Entrypoint
+from libs.lazy import lazy
 from libs.model_base import Base
 
 
@@ -18,21 +19,19 @@ class EntrypointGroup(Base):
         self.env_name = env_name
         self.env = env
         self.entrypoints = entrypoints
-        self._endpoints = dict()
         self.inv = Inventory(mode=get_ff('INVENTORY_MODE'), netbox_api=get_ff('NETBOX_API'),
                              netbox_token=get_ff('NETBOX_TOKEN'), rt_api=get_ff('RT')['DOMAIN'])
 
-    @property
+    @lazy
     def endpoints(self):
-        if not self._endpoints:
-            host_ips = self.get_endpoints_from_ads()
-            for item in host_ips:
-                interfaces = self.inv.get_interfaces(hostname=item['name'])
-                self._endpoints[item['name']] = {
-                    'ip': item['ip'],
-                    'interfaces': sorted([(interface['name'], interface['ip']) for interface in interfaces])
-                }
-        return self._endpoints
+        endpoints = dict()
+        for item in self.get_endpoints_from_ads():
+            interfaces = self.inv.get_interfaces(hostname=item['name'])
+            endpoints[item['name']] = {
+                'ip': item['ip'],
+                'interfaces': sorted([(interface['name'], interface['ip']) for interface in interfaces])
+            }
+        return endpoints
 
     @staticmethod
     def get_resolvable_servers(servers: list) -> list[dict]:
@@ -60,33 +59,29 @@ class EntrypointGroup(Base):
                                                         inventory=self.inv)
         return self._siblings
 
-    @property
+    @lazy
     def state(self):
-        if not self._state:
-            interfaces = list()
-            for hostname in self.endpoints.keys():
-                for item in self.endpoints[hostname]['interfaces']:
-                    if item[0] != 'nic0':
-                        interfaces.append(f'{hostname}:{item[0]}')
-
-            self._state = {
-                'name': self.name,
-                'interfaces': sorted(interfaces)
-            }
-        return self._state
-
-    @property
+        interfaces = list()
+        for hostname in self.endpoints.keys():
+            for item in self.endpoints[hostname]['interfaces']:
+                if item[0] != 'nic0':
+                    interfaces.append(f'{hostname}:{item[0]}')
+
+        return {
+            'name': self.name,
+            'interfaces': sorted(interfaces)
+        }
+
+    @lazy
     def plan(self):
-        if not self._plan:
-            interfaces = list()
-            for hostname in self.endpoints.keys():
-                for entrypoint in self.entrypoints:
-                    interfaces.append(f'{hostname}:{entrypoint}')
-            self._plan = {
-                'name': self.name,
-                'interfaces': sorted(interfaces)
-            }
-        return self._plan
+        interfaces = list()
+        for hostname in self.endpoints.keys():
+            for entrypoint in self.entrypoints:
+                interfaces.append(f'{hostname}:{entrypoint}')
+        return {
+            'name': self.name,
+            'interfaces': sorted(interfaces)
+        }
 
     def validate_state(self):
         # We consider having unknown interface unaccepatable
@@ -1,3 +1,5 @@
+import threading
+
 import api_libs.ads_mini as ads
 from api_libs.helper import get_ff
 from api_libs.logger import Logger
@@ -5,6 +7,7 @@ from api_libs.logger import Logger
 from conf import static
 from libs.entrypoint import Entrypoint
 from libs.entrypoint_group import EntrypointGroup
+from libs.state_loader import StateLoader
 
 logger = Logger()
 
@@ -15,6 +18,7 @@ class EntrypointManager:
         self._env = None
         self.entrypoint = None
         self.eg_store = dict()
+        self._lock = threading.Lock()
 
     @property
     def env(self):
@@ -28,11 +32,23 @@ class EntrypointManager:
 
     def get_eg(self, service: str) -> EntrypointGroup:
         """ To avoid recreating EG for every entrypoint we store it in self.eg_store """
-        if service not in self.eg_store:
-            service_entrypoints = sorted(EntrypointManager.get_entrypoints(services=[service]))
-            self.eg_store[service] = EntrypointGroup(service_name=service, env_name=self.env_name, env=self.env,
-                                                     entrypoints=service_entrypoints)
-        return self.eg_store[service]
+        with self._lock:
+            if service not in self.eg_store:
+                service_entrypoints = sorted(EntrypointManager.get_entrypoints(services=[service]))
+                self.eg_store[service] = EntrypointGroup(service_name=service, env_name=self.env_name, env=self.env,
+                                                         entrypoints=service_entrypoints)
+            return self.eg_store[service]
+
+    def forget_groups(self) -> None:
+        """EGs are built again on next use, with the hosts ADS has then"""
+        with self._lock:
+            self.eg_store = dict()
+
+    def prepare_groups(self, entrypoints: list) -> None:
+        """Reads endpoints of every EG once, before entrypoints sharing it are processed in parallel"""
+        for service in sorted({EntrypointManager.get_service_by_entrypoint(entrypoint) for entrypoint in entrypoints}):
+            if service:
+                self.get_eg(service).endpoints
 
     def global_plan(self, service: str):
         eg = self.get_eg(service)
@@ -40,12 +56,20 @@ class EntrypointManager:
 
     def global_state(self, service: str):
         eg = self.get_eg(service)
+        self.prefetch_state(eg)
         return eg.global_state
 
     def global_diff(self, service: str):
         eg = self.get_eg(service)
+        self.prefetch_state(eg)
         return eg.global_diff
 
+    @staticmethod
+    def prefetch_state(root) -> None:
+        """Reads the state of the whole tree with a few collection queries instead of a GET per object"""
+        if get_ff('PREFETCH_STATE'):
+            StateLoader(root).load()
+
     def create_entrypoint(self, entrypoint: str) -> dict:
         self.entrypoint = entrypoint
 
@@ -58,6 +82,7 @@ class EntrypointManager:
             raise Exception(f'No hosts for {eg.name} service found')
         ep = Entrypoint(name=entrypoint, env=eg.env, endpoints=eg.endpoints)
         logger.log.info(f"'{entrypoint}' - create entrypoint with endpoints: {list(eg.endpoints.keys())}")
+        self.prefetch_state(ep)
         return ep.global_patch()
 
     def delete_entrypoint(self, entrypoint: str) -> dict:
@@ -70,6 +95,7 @@ class EntrypointManager:
 
         ep = Entrypoint(name=entrypoint, env=eg.env, endpoints=eg.endpoints)
         logger.log.info(f"'{entrypoint}' - delete entrypoint with endpoints: {list(eg.endpoints.keys())}")
+        self.prefetch_state(ep)
         return ep.global_delete()
 
     @staticmethod
@@ -101,6 +127,14 @@ class EntrypointManager:
         else:
             return None
 
+    @staticmethod
+    def get_balancer_by_entrypoint(entrypoint: str) -> str:
+        data = static.entrypoints.get(entrypoint, None)
+        if data and 'LB' in data:
+            return data['LB']
+        else:
+            return None
+
     @staticmethod
     def have_balancers(location: str) -> bool:
         return location in static.balancers
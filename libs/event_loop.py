@@ -0,0 +1,24 @@
+"""Background event loop for calling async clients from sync code"""
+import asyncio
+import threading
+
+
+class EventLoopThread:
+    """Event loop running forever in a daemon thread
+
+    Async clients keep their connection pools bound to one loop, so every sync call
+    of a client has to run on the same loop instead of a new asyncio.run().
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def run(self, coro):
+        """Runs a coroutine on the loop and waits for its result"""
+        with self._lock:
+            if not self._loop:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
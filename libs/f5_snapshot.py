@@ -0,0 +1,217 @@
+"""Indexed snapshot of F5 partition objects"""
+import threading
+
+
+def clean_value(value: str) -> str:
+    if value:
+        return value.rsplit("/", 1)[-1].rsplit("%", 1)[0].rsplit(":", 1)[0]
+
+
+def get_attrs(item) -> dict:
+    """f5-sdk resources keep their data in .attrs, raw REST items are dicts already"""
+    return item.attrs if hasattr(item, "attrs") else item
+
+
+class F5Snapshot:
+    """Nodes, pools and virtual servers of a partition with dict indexes
+
+    Every collection is fetched lazily, once, and then kept up to date by the writes F5Manager
+    makes itself. Changes made by anybody else are only seen after refresh().
+
+    Indexes:
+        node name -> node, node address -> node name, node name -> pools
+        pool name -> pool, pool name -> {member name: member address}, pool name -> virtuals
+        virtual name -> virtual, virtual ip -> virtuals
+    """
+
+    def __init__(self, fetch_nodes, fetch_pools, fetch_virtuals) -> None:
+        self._fetchers = {"node": fetch_nodes, "pool": fetch_pools, "virtual": fetch_virtuals}
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self, kind: str = None) -> None:
+        """Drops one ("node" / "pool" / "virtual") or all collections, they are fetched again on next use"""
+        with self._lock:
+            if kind in (None, "node"):
+                self._nodes = None
+                self._node_addresses = dict()
+            if kind in (None, "pool"):
+                self._pools = None
+                self._pool_members = dict()
+                self._node_pools = dict()
+            if kind in (None, "virtual"):
+                self._virtuals = None
+                self._virtual_ips = dict()
+                self._pool_virtuals = dict()
+
+    def is_loaded(self, kind: str) -> bool:
+        return getattr(self, f"_{kind}s") is not None
+
+    # Lazy loading
+    def _load(self, kind: str) -> dict:
+        with self._lock:
+            if not self.is_loaded(kind):
+                setattr(self, f"_{kind}s", dict())
+                for item in self._fetchers[kind]():
+                    attrs = get_attrs(item)
+                    if kind == "node":
+                        self._index_node(attrs["name"], attrs.get("address"), item)
+                    elif kind == "pool":
+                        members = {
+                            member["name"]: clean_value(member.get("address"))
+                            for member in attrs.get("membersReference", {}).get("items", [])
+                        }
+                        self._index_pool(attrs["name"], members, item)
+                    elif kind == "virtual":
+                        self._index_virtual(attrs["name"], attrs.get("destination"), attrs.get("pool"), item)
+            return getattr(self, f"_{kind}s")
+
+    @property
+    def nodes(self) -> list:
+        return list(self._load("node").values())
+
+    @property
+    def pools(self) -> list:
+        return list(self._load("pool").values())
+
+    @property
+    def virtuals(self) -> list:
+        return list(self._load("virtual").values())
+
+    # Indexing
+    def _index_node(self, name: str, address: str, item) -> None:
+        self._nodes[name] = item
+        if address := clean_value(address):
+            self._node_addresses[address] = name
+
+    def _index_pool(self, name: str, members: dict, item) -> None:
+        self._pools[name] = item
+        self._pool_members[name] = dict()
+        self._index_pool_members(name, members)
+
+    def _index_pool_members(self, name: str, members: dict) -> None:
+        for member, address in members.items():
+            self._pool_members[name][member] = address
+            self._node_pools.setdefault(clean_value(member), set()).add(name)
+
+    def _index_virtual(self, name: str, destination: str, pool: str, item) -> None:
+        self._virtuals[name] = item
+        if ip := clean_value(destination):
+            self._virtual_ips.setdefault(ip, set()).add(name)
+        if pool := clean_value(pool):
+            self._pool_virtuals.setdefault(pool, set()).add(name)
+
+    # Lookups
+    def get_node(self, name: str):
+        return self._load("node").get(name)
+
+    def get_node_by_address(self, address: str):
+        with self._lock:
+            nodes = self._load("node")
+            return nodes.get(self._node_addresses.get(address))
+
+    def get_node_references(self, name: str) -> set[str]:
+        with self._lock:
+            self._load("pool")
+            return set(self._node_pools.get(name, set()))
+
+    def get_node_members(self, name: str) -> dict:
+        """Pool members of the node found with the node -> pools index
+
+        Returns:
+        {'api-lablemams_8082': ['lem01-t01-pwr01:8082'], ...}
+        """
+        with self._lock:
+            self._load("pool")
+            return {
+                pool: sorted(member for member in self._pool_members.get(pool, {}) if clean_value(member) == name)
+                for pool in sorted(self._node_pools.get(name, set()))
+            }
+
+    def get_pool(self, name: str):
+        return self._load("pool").get(name)
+
+    def get_pool_members(self, name: str) -> dict:
+        """Returns:
+        {'lem01-t01-pwr01:8082': '10.61.101.133', ...}
+        """
+        with self._lock:
+            self._load("pool")
+            members = dict(self._pool_members.get(name, {}))
+        # members we added ourselves have no address yet, it is taken from their node
+        nodes = self._load("node") if None in members.values() else {}
+        for member, address in members.items():
+            if not address and (node := nodes.get(clean_value(member))):
+                members[member] = clean_value(get_attrs(node).get("address"))
+        return members
+
+    def get_pool_member_names(self, name: str) -> list[str]:
+        """Members kept up to date by our own writes, pool items keep the members they were fetched with"""
+        with self._lock:
+            self._load("pool")
+            return list(self._pool_members.get(name, {}))
+
+    def get_pool_references(self, name: str) -> set[str]:
+        with self._lock:
+            self._load("virtual")
+            return set(self._pool_virtuals.get(name, set()))
+
+    def get_virtual(self, name: str):
+        return self._load("virtual").get(name)
+
+    def get_virtual_servers_by_ip(self, ip: str) -> list:
+        with self._lock:
+            virtuals = self._load("virtual")
+            return [virtuals[name] for name in sorted(self._virtual_ips.get(ip, set()))]
+
+    # In-place updates after our own writes, collections which are not loaded yet are left alone
+    def add_node(self, name: str, address: str, item=None) -> None:
+        with self._lock:
+            if self.is_loaded("node"):
+                self._index_node(name, address, item or {"name": name, "address": address})
+
+    def remove_node(self, name: str) -> None:
+        with self._lock:
+            if self.is_loaded("node") and (node := self._nodes.pop(name, None)):
+                self._node_addresses.pop(clean_value(get_attrs(node).get("address")), None)
+
+    def add_pool(self, name: str, members: list[str] = None, item=None) -> None:
+        with self._lock:
+            if self.is_loaded("pool"):
+                self._index_pool(name, {member: None for member in members or []}, item or {"name": name})
+
+    def remove_pool(self, name: str) -> None:
+        with self._lock:
+            if self.is_loaded("pool") and name in self._pools:
+                self.remove_pool_members(name, list(self._pool_members.get(name, {})))
+                self._pools.pop(name)
+                self._pool_members.pop(name, None)
+
+    def add_pool_members(self, name: str, members: list[str]) -> None:
+        with self._lock:
+            if self.is_loaded("pool") and name in self._pools:
+                self._index_pool_members(name, {member: None for member in members})
+
+    def remove_pool_members(self, name: str, members: list[str]) -> None:
+        with self._lock:
+            if not self.is_loaded("pool") or name not in self._pools:
+                return
+            for member in members:
+                self._pool_members[name].pop(member, None)
+                node = clean_value(member)
+                if not any(clean_value(other) == node for other in self._pool_members[name]):
+                    self._node_pools.get(node, set()).discard(name)
+
+    def add_virtual(self, name: str, destination: str, pool: str = None, item=None) -> None:
+        with self._lock:
+            if self.is_loaded("virtual"):
+                self.remove_virtual(name)
+                item = item or {"name": name, "destination": destination, "pool": pool}
+                self._index_virtual(name, destination, pool, item)
+
+    def remove_virtual(self, name: str) -> None:
+        with self._lock:
+            if self.is_loaded("virtual") and (virtual := self._virtuals.pop(name, None)):
+                attrs = get_attrs(virtual)
+                self._virtual_ips.get(clean_value(attrs.get("destination")), set()).discard(name)
+                self._pool_virtuals.get(clean_value(attrs.get("pool")), set()).discard(name)
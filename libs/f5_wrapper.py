@@ -1,88 +1,310 @@
 """f5-sdk wrapper"""
-from f5.bigip import ManagementRoot
-from f5.bigip.tm.ltm.node import Node
-from f5.bigip.tm.ltm.pool import Members
-from f5.bigip.tm.ltm.pool import Pool
-from f5.bigip.tm.ltm.virtual import Virtual
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from contextlib import suppress
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
 from icontrol.exceptions import iControlUnexpectedHTTPError
 
+from libs.f5_snapshot import clean_value
+from libs.f5_snapshot import F5Snapshot
+from libs.f5_snapshot import get_attrs
+from libs.icontrol_client import IControlClient
+from libs.icontrol_client import object_path
+from libs.token_cache import TokenCache
+
+if TYPE_CHECKING:
+    from f5.bigip.tm.ltm.node import Node
+    from f5.bigip.tm.ltm.pool import Members
+    from f5.bigip.tm.ltm.pool import Pool
+    from f5.bigip.tm.ltm.virtual import Virtual
+
+# Objects read inside F5Manager.memoized(), see F5Manager._load
+_read_memo = ContextVar("f5_read_memo", default=None)
+# Open transaction ids by manager, see F5Manager.transaction
+_transactions = ContextVar("f5_transactions", default={})
+
+NODES = "/mgmt/tm/ltm/node"
+POOLS = "/mgmt/tm/ltm/pool"
+VIRTUALS = "/mgmt/tm/ltm/virtual"
+TRANSACTIONS = "/mgmt/tm/transaction"
+# Pool member settings a members PATCH resets unless they are sent again, see F5Manager.readdress_node
+MEMBER_SETTINGS = ("ratio", "priorityGroup", "connectionLimit", "dynamicRatio", "rateLimit", "monitor", "description")
+
+
+class Exists(iControlUnexpectedHTTPError):
+    pass
+
+
+class AddressSpecifiedIsInUse(iControlUnexpectedHTTPError):
+    pass
+
 
 class F5Manager:
-    def __init__(self, address: str, user: str, password: str, partition: str) -> None:
+    # Device errors for callers which do not import this module, see SessionRegistry
+    Error = iControlUnexpectedHTTPError
+    Exists = Exists
+    AddressSpecifiedIsInUse = AddressSpecifiedIsInUse
+
+    def __init__(
+        self, address: str, user: str, password: str, partition: str, lean_client: bool = False, concurrency: int = 8,
+        token_cache: TokenCache = None
+    ) -> None:
         self._mgmt = None
+        self._icr = None
+        self.lean_client = lean_client
+        self.concurrency = concurrency
+        self.token_cache = token_cache
         self.address = address
         self.user = user
         self.password = password
         self.partition = partition
-        self._nodes = None
-        self._pools = None
-        self._virtuals = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.sessions = 0
+        self.logins = 0
 
     @property
     def mgmt(self):
-        if not self._mgmt:
-            self._mgmt = ManagementRoot(self.address, self.user, self.password)
+        with self._lock:
+            if not self._mgmt:
+                # f5-sdk takes a third of a second to import, lean_client runs never load it
+                from f5.bigip import ManagementRoot
+
+                # ManagementRoot authenticates while discovering the device version
+                self._mgmt = ManagementRoot(self.address, self.user, self.password)
+                self.sessions += 1
+                self.logins += 1
         return self._mgmt
 
-    @staticmethod
-    def clean_value(value: str) -> str:
-        if value:
-            return value.rsplit("/", 1)[-1].rsplit("%", 1)[0].rsplit(":", 1)[0]
+    @property
+    def icr(self) -> IControlClient:
+        """Lean iControl REST client used instead of f5-sdk with lean_client
+
+        Only this client reuses tokens from token_cache, ManagementRoot always logs in while discovering the device.
+        """
+        with self._lock:
+            if not self._icr:
+                self._icr = IControlClient(
+                    self.address, self.user, self.password, concurrency=self.concurrency, on_login=self.count_login,
+                    token_cache=self.token_cache
+                )
+                self.sessions += 1
+        return self._icr
+
+    def count_login(self) -> None:
+        with self._lock:
+            self.logins += 1
+
+    clean_value = staticmethod(clean_value)
+
+    @property
+    def snapshot(self) -> F5Snapshot:
+        """Partition collections with indexes, kept in sync with our own writes"""
+        with self._lock:
+            if not self._snapshot:
+                self._snapshot = F5Snapshot(
+                    fetch_nodes=self._fetch_nodes,
+                    fetch_pools=self._fetch_pools,
+                    fetch_virtuals=self._fetch_virtuals,
+                )
+        return self._snapshot
+
+    def refresh(self, kind: str = None) -> None:
+        """Re-read partition collections ("node" / "pool" / "virtual" or all) on next use"""
+        self.snapshot.refresh(kind=kind)
+
+    @property
+    def _partition_filter(self) -> dict:
+        return {"params": f"$filter=partition+eq+{self.partition}"}
+
+    def _fetch_nodes(self) -> list[Node]:
+        if self.lean_client:
+            return self.icr.collection(NODES, filter=f"partition eq {self.partition}")
+        return self.mgmt.tm.ltm.nodes.get_collection(requests_params=self._partition_filter)
+
+    def _fetch_pools(self) -> list[Pool]:
+        if self.lean_client:
+            return self.icr.collection(POOLS, filter=f"partition eq {self.partition}", expand=True)
+        requests_params = {
+            "suffix": "/?&expandSubcollections=true",
+            "uri_as_parts": True,
+            **self._partition_filter,
+        }
+        return self.mgmt.tm.ltm.pools.get_collection(requests_params=requests_params)
+
+    def _fetch_virtuals(self) -> list[Virtual]:
+        # Profiles are expanded, so virtuals of the snapshot carry everything get_virtual_server does
+        if self.lean_client:
+            return self.icr.collection(VIRTUALS, filter=f"partition eq {self.partition}", expand=True)
+        requests_params = {
+            "suffix": "/?&expandSubcollections=true",
+            "uri_as_parts": True,
+            **self._partition_filter,
+        }
+        return self.mgmt.tm.ltm.virtuals.get_collection(requests_params=requests_params)
 
     @property
     def nodes(self) -> list[Node]:
-        if not self._nodes:
-            self._nodes = self.mgmt.tm.ltm.nodes.get_collection()
-        return self._nodes
+        return self.snapshot.nodes
 
     @property
     def pools(self) -> list[Pool]:
-        if not self._pools:
-            requests_params = {
-                "suffix": "/?&expandSubcollections=true",
-                "uri_as_parts": True,
-            }
-            self._pools = self.mgmt.tm.ltm.pools.get_collection(
-                requests_params=requests_params
-            )
-        return self._pools
+        return self.snapshot.pools
 
     @property
     def virtuals(self) -> list[Virtual]:
-        if not self._virtuals:
-            self._virtuals = self.mgmt.tm.ltm.virtuals.get_collection()
-        return self._virtuals
+        return self.snapshot.virtuals
 
     @staticmethod
-    def refresh_on_change(data_type):
-        def decorator(method):
-            def wrapper(self, *args, **kwargs):
-                result = method(self, *args, **kwargs)
-                self._reset_data(data_type)
-                return result
+    def forget_reads(method):
+        """Drops memoized reads after a write, the snapshot is updated by the write itself"""
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                if (memo := _read_memo.get()) is not None:
+                    memo.clear()
+
+        return wrapper
+
+    @contextmanager
+    def memoized(self):
+        """Within the block every object is read from the device at most once.
+        Any write made through the manager drops the memo.
+        """
+        token = _read_memo.set({}) if _read_memo.get() is None else None
+        try:
+            yield self
+        finally:
+            if token:
+                _read_memo.reset(token)
+
+    def _load(self, kind: str, loader, **kwargs):
+        """Loads an object with a single GET, returns None if it does not exist"""
+        memo = _read_memo.get()
+        key = (id(self), kind, tuple(sorted(kwargs.items())))
+        if memo is not None and key in memo:
+            return memo[key]
+        try:
+            item = loader(**kwargs)
+        except iControlUnexpectedHTTPError as e:
+            if e.response.status_code != 404:
+                raise
+            item = None
+        if memo is not None:
+            memo[key] = item
+        return item
+
+    @contextmanager
+    def transaction(self, enabled: bool = True):
+        """Writes made within the block are queued in one iControl REST transaction
+        and committed together on exit, nothing is applied if any of them fails.
+
+        Reads are not part of the transaction and do not see queued writes,
+        so everything the writes depend on has to be read before the block.
+        Nested blocks join the outer transaction.
+        """
+        if not enabled or self.in_transaction:
+            yield self
+            return
+        if self.lean_client:
+            transaction = self.icr.create(TRANSACTIONS, {})
+        else:
+            transaction = self.mgmt.tm.transactions.transaction.create()
+        token = _transactions.set({**_transactions.get(), id(self): str(transaction.transId)})
+        try:
+            yield self
+        except Exception:
+            _transactions.reset(token)
+            self._end_transaction(transaction, commit=False)
+            self.refresh()
+            raise
+        _transactions.reset(token)
+        try:
+            self._end_transaction(transaction, commit=True)
+        except Exception:
+            # Snapshot was updated by queued writes which are rolled back now
+            self.refresh()
+            # The device may have dropped the failed transaction already
+            with suppress(iControlUnexpectedHTTPError):
+                self._end_transaction(transaction, commit=False)
+            raise
+
+    def _end_transaction(self, transaction, commit: bool) -> None:
+        if self.lean_client:
+            path = f"{TRANSACTIONS}/{transaction.transId}"
+            if commit:
+                self.icr.modify(path, {"state": "VALIDATING", "validateOnly": False})
+            else:
+                self.icr.delete(path)
+        elif commit:
+            transaction.modify(state="VALIDATING", validateOnly=False)
+        else:
+            transaction.delete()
 
-            return wrapper
+    @property
+    def in_transaction(self) -> bool:
+        return id(self) in _transactions.get()
 
-        return decorator
+    @property
+    def _transaction_headers(self) -> dict:
+        if transaction_id := _transactions.get().get(id(self)):
+            return {"X-F5-REST-Coordination-Id": transaction_id}
+        return {}
 
-    def _reset_data(self, data_type):
-        if data_type == "node":
-            self._nodes = None
-        elif data_type == "pool":
-            self._pools = None
-        elif data_type == "virtual":
-            self._virtuals = None
+    @property
+    def _write_params(self) -> dict:
+        """Extra kwargs of f5-sdk create/delete calls which put them into the open transaction"""
+        if headers := self._transaction_headers:
+            return {"requests_params": {"headers": headers}}
+        return {}
+
+    def _create(self, collection, path: str, **payload):
+        """POST to path with the lean client, collection().create() of f5-sdk otherwise"""
+        if self.lean_client:
+            payload = {key: value for key, value in payload.items() if value is not None}
+            return self.icr.create(path, payload, headers=self._transaction_headers)
+        return collection().create(**payload, **self._write_params)
+
+    def _delete(self, item, path: str) -> None:
+        if self.lean_client:
+            self.icr.delete(path, headers=self._transaction_headers)
+        else:
+            item.delete(**self._write_params)
+
+    def _modify(self, item, path: str, **payload) -> None:
+        """PATCH of the given fields only"""
+        if self.lean_client:
+            self.icr.modify(path, payload, headers=self._transaction_headers)
+        else:
+            item.modify(**payload, **self._write_params)
+
+    def _path(self, collection: str, name: str) -> str:
+        return object_path(collection, self.partition, name)
+
+    def _written(self, item):
+        """Objects returned by writes inside a transaction describe the queued command, not the object"""
+        return None if self.in_transaction else item
 
     # Nodes
     def node_exists(self, name: str) -> bool:
+        if self.lean_client:
+            return self.get_node(name=name) is not None
         return self.mgmt.tm.ltm.nodes.node.exists(name=name, partition=self.partition)
 
-    @refresh_on_change(data_type="node")
+    @forget_reads
     def create_node(self, name: str, address: str, monitor: str = "icmp") -> Node:
         try:
-            return self.mgmt.tm.ltm.nodes.node.create(
-                name=name, address=address, partition=self.partition, monitor=monitor
+            node = self._create(
+                lambda: self.mgmt.tm.ltm.nodes.node, NODES,
+                name=name, address=address, partition=self.partition, monitor=monitor,
             )
+            self.snapshot.add_node(name=name, address=address, item=self._written(node))
+            return node
         except iControlUnexpectedHTTPError as e:
             if e.response.status_code == 409 and "01020066:3" in e.response.json().get("message"):
                 raise Exists(e)
@@ -92,8 +314,9 @@ class F5Manager:
                 raise
 
     def get_node(self, name: str) -> Node:
-        if self.node_exists(name=name):
-            return self.mgmt.tm.ltm.nodes.node.load(name=name, partition=self.partition)
+        if self.lean_client:
+            return self._load("node", self.icr.get, path=self._path(NODES, name))
+        return self._load("node", self.mgmt.tm.ltm.nodes.node.load, name=name, partition=self.partition)
 
     # Using collection
     # def get_node(self, name: str) -> Node:
@@ -102,48 +325,96 @@ class F5Manager:
     #             return node
 
     def get_node_by_address(self, address: str) -> Node:
-        for node in self.nodes:
-            if self.clean_value(node.address) == address:
-                return node
+        return self.snapshot.get_node_by_address(address=address)
 
     def get_node_address(self, name: str) -> str:
         if node := self.get_node(name=name):
             return self.clean_value(node.address)
 
     def get_node_references(self, name: str) -> set[str]:
-        used_in_pools = set()
-        for pool in self.pools:
-            for member in pool.membersReference.get("items", []):
-                if self.clean_value(member["name"]) == name:
-                    used_in_pools.add(pool.name)
-        return used_in_pools
-
-    @refresh_on_change(data_type="node")
+        return self.snapshot.get_node_references(name=name)
+
+    @forget_reads
     def delete_node(self, name: str) -> bool:
         if node := self.get_node(name=name):
-            node.delete()
+            self._delete(node, self._path(NODES, name))
+            self.snapshot.remove_node(name=name)
             return True
         return False
 
-    @refresh_on_change(data_type="node")
+    @forget_reads
+    def readdress_node(self, name: str, address: str) -> dict:
+        """Re-creates the node with a new address within one transaction.
+        Pool memberships are taken from the pool collection read right before it, every pool gets one PATCH
+        without the node's members before the node is deleted and one PATCH with them once it is created again.
+        The PATCHes replace the member list, so every member is sent with the settings it has.
+
+        Returns:
+         {'api-lablemams_8082': ['lem01-t01-pwr01:8082'], ...}
+        """
+        # Reads do not see writes queued in the transaction, everything is read before it.
+        # Members added since the snapshot was taken would be dropped by the PATCHes
+        self.snapshot.refresh("pool")
+        memberships = self.snapshot.get_node_members(name=name)
+        current = dict()
+        for pool in memberships:
+            items = get_attrs(self.snapshot.get_pool(name=pool)).get("membersReference", {}).get("items", [])
+            current[pool] = [self._member_payload(member) for member in items]
+        # The lean client PATCHes by path, only f5-sdk needs the pool items
+        pools = {pool: None if self.lean_client else self.get_pool(name=pool) for pool in memberships}
+        with self.transaction():
+            for pool, members in memberships.items():
+                self._modify(pools[pool], self._path(POOLS, pool), members=[
+                    member for member in current[pool] if member["name"] not in members
+                ])
+            self.delete_node(name=name)
+            self.create_node(name=name, address=address)
+            for pool in memberships:
+                self._modify(pools[pool], self._path(POOLS, pool), members=current[pool])
+        for pool, members in memberships.items():
+            # Members take the new address from their node
+            self.snapshot.remove_pool_members(name=pool, members=members)
+            self.snapshot.add_pool_members(name=pool, members=members)
+        return memberships
+
+    def _member_payload(self, member: dict) -> dict:
+        """Pool member as read for a members PATCH, session and state only when a user set them
+
+        Returns:
+        {'name': 'lem01-t01-pwr01:8082', 'partition': 'ams-up', 'ratio': 1, ..., 'session': 'user-disabled'}
+        """
+        payload = {"name": member["name"], "partition": member.get("partition", self.partition)}
+        payload.update({setting: member[setting] for setting in MEMBER_SETTINGS if setting in member})
+        if member.get("session") == "user-disabled":
+            payload["session"] = "user-disabled"
+        if member.get("state") == "user-down":
+            payload["state"] = "user-down"
+        return payload
+
     def delete_node_by_address(self, address: str) -> bool:
         if node := self.get_node_by_address(address=address):
-            node.delete()
-            return True
+            return self.delete_node(name=get_attrs(node)["name"])
         return False
 
     # Pools and Members
     def pool_exists(self, name: str) -> bool:
+        if self.lean_client:
+            return self.get_pool(name=name) is not None
         return self.mgmt.tm.ltm.pools.pool.exists(name=name, partition=self.partition)
 
-    @refresh_on_change(data_type="pool")
+    @forget_reads
     def create_pool(
         self, name: str, members: list[str] = None, monitor: str = "tcp"
     ) -> Pool:
         try:
-            return self.mgmt.tm.ltm.pools.pool.create(
-                name=name, members=members, partition=self.partition, monitor=monitor
+            pool = self._create(
+                lambda: self.mgmt.tm.ltm.pools.pool, POOLS,
+                name=name, members=members, partition=self.partition, monitor=monitor,
             )
+            self.snapshot.add_pool(
+                name=name, members=members, item=self._written(pool) or {"name": name, "monitor": monitor}
+            )
+            return pool
         except iControlUnexpectedHTTPError as e:
             if e.response.status_code == 409 and "01020066:3" in e.response.json().get("message"):
                 raise Exists(e)
@@ -157,24 +428,24 @@ class F5Manager:
     #             return pool
 
     def get_pool(self, name: str) -> Pool:
-        if self.pool_exists(name=name):
-            return self.mgmt.tm.ltm.pools.pool.load(
-                name=name,
-                partition=self.partition,
-                suffix="/?&expandSubcollections=true",
-            )
+        if self.lean_client:
+            return self._load("pool", self.icr.get, path=self._path(POOLS, name), expand=True)
+        return self._load(
+            "pool",
+            self.mgmt.tm.ltm.pools.pool.load,
+            name=name,
+            partition=self.partition,
+            suffix="/?&expandSubcollections=true",
+        )
 
     def get_pool_references(self, name: str) -> set[str]:
-        used_in_virtuals = set()
-        for virtual in self.virtuals:
-            if self.clean_value(virtual.attrs.get("pool")) == name:
-                used_in_virtuals.add(virtual.name)
-        return used_in_virtuals
+        return self.snapshot.get_pool_references(name=name)
 
-    @refresh_on_change(data_type="pool")
+    @forget_reads
     def delete_pool(self, name: str) -> bool:
         if pool := self.get_pool(name=name):
-            pool.delete()
+            self._delete(pool, self._path(POOLS, name))
+            self.snapshot.remove_pool(name=name)
             return True
         return False
 
@@ -205,56 +476,93 @@ class F5Manager:
         return list({member["name"] for member in self.get_pool_members(name=name)})
 
     def pool_member_exists(self, pool_name: str, member_name: str) -> bool:
-        if pool := self.get_pool(name=pool_name):
-            return pool.members_s.members.exists(
-                name=member_name, partition=self.partition
-            )
+        return self.get_pool_member(pool_name=pool_name, member_name=member_name) is not None
 
     def get_pool_member(self, pool_name: str, member_name: str) -> Members:
-        if pool := self.get_pool(name=pool_name):
-            return pool.members_s.members.load(
-                name=member_name, partition=self.partition
+        if self.lean_client:
+            if self.get_pool(name=pool_name):
+                path = self._path(f"{self._path(POOLS, pool_name)}/members", member_name)
+                return self._load(f"pool/{pool_name}/member", self.icr.get, path=path)
+        elif pool := self.get_pool(name=pool_name):
+            return self._load(
+                f"pool/{pool_name}/member",
+                pool.members_s.members.load,
+                name=member_name,
+                partition=self.partition,
             )
 
     def collect_pool_members(self, name: str) -> list[Members]:
         if pool := self.get_pool(name=name):
+            if self.lean_client:
+                return self.icr.collection(f"{self._path(POOLS, name)}/members")
             return pool.members_s.get_collection()
 
-    @refresh_on_change(data_type="pool")
+    @forget_reads
     def add_pool_members(self, name: str, members: list[str]) -> list[str]:
         added_members = []
         if pool := self.get_pool(name=name):
             for member in members:
-                pool.members_s.members.create(name=member, partition=self.partition)
+                self._create(
+                    lambda: pool.members_s.members, f"{self._path(POOLS, name)}/members",
+                    name=member, partition=self.partition,
+                )
                 added_members.append(member)
+            self.snapshot.add_pool_members(name=name, members=added_members)
         return added_members
 
-    @refresh_on_change(data_type="pool")
+    @forget_reads
+    def set_pool_members(self, name: str, members: list[str]) -> dict:
+        """Replaces the pool members with one PATCH of the member list.
+        Members which stay are not touched and the pool is never empty in between.
+
+        Returns:
+         {'added': ['lem01-t01-pwr03:8082'], 'removed': ['lem01-t01-pwr01:8082']}
+        """
+        if not (pool := self.get_pool(name=name)):
+            return {'added': [], 'removed': []}
+        current = [member["name"] for member in get_attrs(pool).get("membersReference", {}).get("items", [])]
+        self._modify(
+            pool, self._path(POOLS, name),
+            members=[{"name": member, "partition": self.partition} for member in members],
+        )
+        changes = {
+            'added': [member for member in members if member not in current],
+            'removed': [member for member in current if member not in members],
+        }
+        self.snapshot.remove_pool_members(name=name, members=changes['removed'])
+        self.snapshot.add_pool_members(name=name, members=changes['added'])
+        return changes
+
+    @forget_reads
     def delete_pool_members_by_nodes(self, name: str, nodes: list[str]) -> list[str]:
         deleted_members = []
         current_members = self.collect_pool_members(name=name)
         for member in current_members:
             if member.name.split(':')[0] in nodes:
                 deleted_members.append(member.name)
-                member.delete()
+                self._delete(member, self._path(f"{self._path(POOLS, name)}/members", member.name))
+        self.snapshot.remove_pool_members(name=name, members=deleted_members)
         return deleted_members
 
-    @refresh_on_change(data_type="pool")
+    @forget_reads
     def delete_all_pool_members(self, name: str) -> list[str]:
         deleted_members = []
         members = self.collect_pool_members(name=name)
         for member in members:
             deleted_members.append(member.name)
-            member.delete()
+            self._delete(member, self._path(f"{self._path(POOLS, name)}/members", member.name))
+        self.snapshot.remove_pool_members(name=name, members=deleted_members)
         return deleted_members
 
     # Virtual Servers and profiles
     def virtual_server_exists(self, name: str) -> bool:
+        if self.lean_client:
+            return self.get_virtual_server(name=name) is not None
         return self.mgmt.tm.ltm.virtuals.virtual.exists(
             name=name, partition=self.partition
         )
 
-    @refresh_on_change(data_type="virtual")
+    @forget_reads
     def create_virtual_server(
         self,
         name: str,
@@ -278,7 +586,17 @@ class F5Manager:
                 "snat": "automap",
                 "partition": self.partition,
             }
-            return self.mgmt.tm.ltm.virtuals.virtual.create(**virtual_server_config)
+            virtual = self._create(lambda: self.mgmt.tm.ltm.virtuals.virtual, VIRTUALS, **virtual_server_config)
+            # The POST response has no profiles, the snapshot keeps the virtual server as it was written
+            item = {
+                "name": name,
+                "partition": self.partition,
+                "destination": f"/{self.partition}/{virtual_server_config['destination']}",
+                "pool": f"/{self.partition}/{pool}" if pool else None,
+                "profilesReference": {"items": profiles},
+            }
+            self.snapshot.add_virtual(name=name, destination=item["destination"], pool=item["pool"], item=item)
+            return virtual
         except iControlUnexpectedHTTPError as e:
             if e.response.status_code == 409 and "01020066:3" in e.response.json().get("message"):
                 raise Exists(e)
@@ -288,17 +606,18 @@ class F5Manager:
                 raise
 
     def get_virtual_server(self, name: str) -> Virtual:
-        if self.virtual_server_exists(name=name):
-            return self.mgmt.tm.ltm.virtuals.virtual.load(
-                name=name, partition=self.partition, suffix="/?&expandSubcollections=true"
-            )
+        if self.lean_client:
+            return self._load("virtual", self.icr.get, path=self._path(VIRTUALS, name), expand=True)
+        return self._load(
+            "virtual",
+            self.mgmt.tm.ltm.virtuals.virtual.load,
+            name=name,
+            partition=self.partition,
+            suffix="/?&expandSubcollections=true",
+        )
 
     def get_virtual_servers_by_ip(self, ip: str) -> list[Virtual]:
-        virtuals = []
-        for virtual in self.virtuals:
-            if self.clean_value(virtual.attrs.get("destination")) == ip:
-                virtuals.append(virtual)
-        return virtuals
+        return self.snapshot.get_virtual_servers_by_ip(ip=ip)
 
     def get_virtual_server_ip(self, name: str) -> str:
         virtual = self.get_virtual_server(name=name)
@@ -316,25 +635,56 @@ class F5Manager:
     #         if virtual.name == name:
     #             return virtual
 
-    @refresh_on_change(data_type="virtual")
+    @forget_reads
     def delete_virtual_server(self, name: str) -> bool:
         if virtual := self.get_virtual_server(name=name):
-            virtual.delete()
+            self._delete(virtual, self._path(VIRTUALS, name))
+            self.snapshot.remove_virtual(name=name)
             return True
         return False
 
+    @forget_reads
+    def modify_virtual_server(
+        self,
+        name: str,
+        destination: str = None,
+        port: str = None,
+        pool: str = None,
+        profiles: list[str] = None,
+    ) -> bool:
+        """Updates the given fields with one PATCH, the virtual server keeps its connections.
+        profiles replace the client profiles, the protocol profile (tcp / fastL4) is kept.
+        """
+        if not (virtual := self.get_virtual_server(name=name)):
+            return False
+        attrs = dict(get_attrs(virtual))
+        payload = {}
+        if destination:
+            payload["destination"] = f"{destination}:{port}"
+            attrs["destination"] = f"/{self.partition}/{payload['destination']}"
+        if pool:
+            payload["pool"] = pool
+            attrs["pool"] = f"/{self.partition}/{pool}"
+        if profiles is not None:
+            kept = [
+                {"name": profile["name"], "partition": profile.get("partition", "Common")}
+                for profile in attrs.get("profilesReference", {}).get("items", [])
+                if profile["name"] in ["fastL4", "tcp"]
+            ]
+            payload["profiles"] = kept + [{"name": profile} for profile in profiles]
+            attrs["profilesReference"] = {"items": payload["profiles"]}
+        if not payload:
+            return True
+        self._modify(virtual, self._path(VIRTUALS, name), **payload)
+        self.snapshot.add_virtual(name=name, destination=attrs.get("destination"), pool=attrs.get("pool"), item=attrs)
+        return True
+
     def virtual_profile_exists(
         self, virtual_name: str, profile_name: str, partition: str = "Common"
     ) -> bool:
+        # Virtual server is loaded with expanded subcollections, profiles are already there
         if virtual := self.get_virtual_server(name=virtual_name):
-            return virtual.profiles_s.profiles.exists(
-                name=profile_name, partition=partition
+            return any(
+                profile["name"] == profile_name and profile.get("partition") == partition
+                for profile in virtual.attrs.get("profilesReference", {}).get("items", [])
             )
-
-
-class Exists(iControlUnexpectedHTTPError):
-    pass
-
-
-class AddressSpecifiedIsInUse(iControlUnexpectedHTTPError):
-    pass
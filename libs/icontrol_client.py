@@ -0,0 +1,193 @@
+"""Lean iControl REST client"""
+import asyncio
+import time
+
+import httpx
+from icontrol.exceptions import iControlUnexpectedHTTPError
+
+from libs.event_loop import EventLoopThread
+from libs.token_cache import TokenCache
+
+# Token is refreshed this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 60
+
+
+class Record(dict):
+    """iControl REST object as a dict with attribute access, .attrs mirrors f5-sdk resources"""
+
+    @property
+    def attrs(self) -> dict:
+        return self
+
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def object_path(collection: str, partition: str, name: str) -> str:
+    """Returns:
+    /mgmt/tm/ltm/node/~ams-up~lem01-t01-pwr01
+    """
+    return f"{collection}/~{partition}~{name}"
+
+
+def query_params(select: list[str] = None, filter: str = None, expand: bool = False) -> dict:
+    params = {}
+    if select:
+        params["$select"] = ",".join(select)
+    if filter:
+        params["$filter"] = filter
+    if expand:
+        params["expandSubcollections"] = "true"
+    return params
+
+
+class AsyncIControlClient:
+    """Async iControl REST client for one F5 device
+
+    Token based auth which is refreshed before expiry and on 401, one keep-alive connection pool,
+    at most `concurrency` requests in flight. Objects are returned as Record dicts,
+    errors are raised as iControlUnexpectedHTTPError like f5-sdk does.
+    With a token_cache the token of a previous run is reused until it expires or is rejected.
+    """
+
+    def __init__(
+        self, address: str, user: str, password: str, concurrency: int = 8, timeout: int = 30,
+        on_login=None, transport: httpx.AsyncBaseTransport = None, token_cache: TokenCache = None
+    ) -> None:
+        self.address = address
+        self.user = user
+        self.password = password
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.on_login = on_login
+        self.transport = transport
+        self.token_cache = token_cache
+        self._client = None
+        self._semaphore = None
+        self._login_lock = None
+        self._token = None
+        self._token_expires = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if not self._client:
+            self._client = httpx.AsyncClient(
+                base_url=f"https://{self.address}",
+                verify=False,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._login_lock = asyncio.Lock()
+        return self._client
+
+    @property
+    def token_valid(self) -> bool:
+        return bool(self._token) and time.time() < self._token_expires - TOKEN_REFRESH_MARGIN
+
+    async def login(self, stale_token: str = None) -> str:
+        client = self.client
+        async with self._login_lock:
+            # Somebody else has already refreshed the token while we were waiting
+            if self.token_valid and self._token != stale_token:
+                return self._token
+            if self.token_cache:
+                if stale_token:
+                    self.token_cache.discard(self.address, self.user, stale_token)
+                if (cached := self.token_cache.get(self.address, self.user)) and cached[0] != stale_token:
+                    self._token, self._token_expires = cached
+                    return self._token
+            payload = {"username": self.user, "password": self.password, "loginProviderName": "tmos"}
+            data = self._parse(await client.post("/mgmt/shared/authn/login", json=payload))
+            self._token = data["token"]["token"]
+            self._token_expires = time.time() + int(data["token"].get("timeout", 1200))
+            if self.token_cache:
+                self.token_cache.set(self.address, self.user, self._token, self._token_expires)
+            if self.on_login:
+                self.on_login()
+            return self._token
+
+    async def request(
+        self, method: str, path: str, params: dict = None, json: dict = None, headers: dict = None
+    ) -> Record:
+        client = self.client
+        async with self._semaphore:
+            if not self.token_valid:
+                await self.login()
+            response = await self._send(method, path, params, json, headers, client=client)
+            if response.status_code == 401:
+                await self.login(stale_token=self._token)
+                response = await self._send(method, path, params, json, headers, client=client)
+        return self._parse(response)
+
+    async def _send(
+        self, method: str, path: str, params: dict, json: dict, headers: dict, client: httpx.AsyncClient = None
+    ) -> httpx.Response:
+        headers = {**(headers or {}), "X-F5-Auth-Token": self._token}
+        return await (client or self.client).request(method, path, params=params, json=json, headers=headers)
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Record:
+        if not response.is_success:
+            raise iControlUnexpectedHTTPError(
+                f"{response.status_code} Unexpected Error: {response.reason_phrase} for uri: {response.url}\n"
+                f"Text: {response.text!r}",
+                response=response,
+            )
+        return Record(response.json()) if response.content else Record()
+
+    async def get(self, path: str, select: list[str] = None, expand: bool = False) -> Record:
+        return await self.request("GET", path, params=query_params(select=select, expand=expand))
+
+    async def collection(
+        self, path: str, select: list[str] = None, filter: str = None, expand: bool = False
+    ) -> list[Record]:
+        data = await self.request("GET", path, params=query_params(select=select, filter=filter, expand=expand))
+        return [Record(item) for item in data.get("items", [])]
+
+    async def create(self, path: str, payload: dict, headers: dict = None) -> Record:
+        return await self.request("POST", path, json=payload, headers=headers)
+
+    async def modify(self, path: str, payload: dict, headers: dict = None) -> Record:
+        return await self.request("PATCH", path, json=payload, headers=headers)
+
+    async def delete(self, path: str, headers: dict = None) -> Record:
+        return await self.request("DELETE", path, headers=headers)
+
+    async def gather(self, coros) -> list:
+        return await asyncio.gather(*coros)
+
+    async def close(self) -> None:
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+class IControlClient:
+    """Sync face of AsyncIControlClient, every call runs on the client's own event loop thread"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.aio = AsyncIControlClient(*args, **kwargs)
+        self._loop = EventLoopThread(name=f"icontrol-{self.aio.address}")
+
+    def run(self, coro):
+        return self._loop.run(coro)
+
+    def get(self, path: str, select: list[str] = None, expand: bool = False) -> Record:
+        return self.run(self.aio.get(path, select=select, expand=expand))
+
+    def collection(self, path: str, select: list[str] = None, filter: str = None, expand: bool = False) -> list[Record]:
+        return self.run(self.aio.collection(path, select=select, filter=filter, expand=expand))
+
+    def create(self, path: str, payload: dict, headers: dict = None) -> Record:
+        return self.run(self.aio.create(path, payload, headers=headers))
+
+    def modify(self, path: str, payload: dict, headers: dict = None) -> Record:
+        return self.run(self.aio.modify(path, payload, headers=headers))
+
+    def delete(self, path: str, headers: dict = None) -> Record:
+        return self.run(self.aio.delete(path, headers=headers))
@@ -0,0 +1,103 @@
+"""Run-scoped identity map of balancer objects"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Identity map of the current run, see run_scope
+_current = ContextVar("identity_map", default=None)
+
+
+class IdentityMap:
+    """One model object per balancer object within a run
+
+    Ports of an entrypoint often share a target port (both intapi ports use the pool lem01-t01-pwr_8082)
+    and pools / service groups share their nodes / servers. Siblings are taken from the map, so such
+    objects are read, diffed and patched once per run instead of once per parent.
+    Keys are the ones of Base.key: (class, location, name), the class tells the vendor.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._objects = dict()
+        self._applied = set()
+        self._applying = dict()
+        self._refreshed = set()
+        self.hits = 0
+
+    @staticmethod
+    def get_key(cls, location: str, name: str) -> tuple:
+        return cls.__name__, location.upper(), name
+
+    def get(self, cls, **kwargs):
+        """The object built first for the key, kwargs of later calls are ignored"""
+        key = self.get_key(cls, kwargs['location'], kwargs['name'])
+        with self._lock:
+            if key in self._objects:
+                self.hits += 1
+            else:
+                self._objects[key] = cls(**kwargs)
+            return self._objects[key]
+
+    # Operations which succeeded in the run, see ApplyEngine
+    def was_applied(self, obj, method: str) -> bool:
+        with self._lock:
+            return (obj.key, method) in self._applied
+
+    def applied(self, obj, method: str) -> None:
+        with self._lock:
+            self._applied.add((obj.key, method))
+
+    @contextmanager
+    def applying(self, obj, method: str):
+        """Holds the object while it is applied, parents running in parallel wait for the first one.
+        Yields True if the object was applied already.
+        """
+        with self._lock:
+            lock = self._applying.setdefault((obj.key, method), threading.Lock())
+        with lock:
+            yield self.was_applied(obj, method)
+
+    def forget(self, obj, method: str) -> None:
+        with self._lock:
+            self._applied.discard((obj.key, method))
+
+    def needs_refresh(self, manager) -> bool:
+        """True the first time a balancer manager asks, later its snapshot is kept in sync by our own writes"""
+        with self._lock:
+            if id(manager) in self._refreshed:
+                return False
+            self._refreshed.add(id(manager))
+            return True
+
+    def stats(self) -> dict:
+        """Returns:
+        {'objects': 12, 'hits': 9, 'applied': 12}
+        """
+        with self._lock:
+            return {'objects': len(self._objects), 'hits': self.hits, 'applied': len(self._applied)}
+
+
+@contextmanager
+def run_scope():
+    """Within the block siblings are shared and every object is patched / deleted once.
+    A nested scope joins the outer one.
+    """
+    token = _current.set(IdentityMap()) if _current.get() is None else None
+    try:
+        yield _current.get()
+    finally:
+        if token:
+            _current.reset(token)
+
+
+def current() -> IdentityMap:
+    """Identity map of the current run, None outside run_scope"""
+    return _current.get()
+
+
+def shared(cls, **kwargs):
+    """Object of the current run, a new one outside run_scope"""
+    identity_map = _current.get()
+    if identity_map is None:
+        return cls(**kwargs)
+    return identity_map.get(cls, **kwargs)
@@ -0,0 +1,238 @@
+"""Local job API of the happyvip daemon"""
+import hmac
+import json
+import os
+import queue
+import secrets
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from api_libs.logger import Logger
+
+logger = Logger()
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+ACTIONS = ("create", "delete", "plan")
+
+
+class Job:
+    def __init__(self, action: str, params: dict, key: str) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.params = params
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.seconds = None
+        self.finished = threading.Event()
+
+    def to_dict(self) -> dict:
+        """Returns:
+        {'id': '4f0c2a9e1b7d', 'action': 'create', 'params': {'name': 'lablemams', 'entrypoints': 'intapi'},
+         'queue': 'AMS02', 'status': 'done', 'result': {'intapi': True}, 'error': None, 'seconds': 1.2}
+        """
+        return {
+            "id": self.id,
+            "action": self.action,
+            "params": self.params,
+            "queue": self.key,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "seconds": self.seconds,
+        }
+
+
+class JobQueues:
+    """FIFO job queues with one worker thread per key, the balancer location of the job
+
+    Jobs of one location run one after another, jobs of different locations in parallel.
+    runner(action, params) does the work and returns the job result.
+    """
+
+    def __init__(self, runner, history: int = 1000) -> None:
+        self.runner = runner
+        self.history = history
+        self._lock = threading.Lock()
+        self._queues = dict()
+        self._jobs = OrderedDict()
+
+    def submit(self, action: str, params: dict, key: str) -> Job:
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        job = Job(action, params, key)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+            if key not in self._queues:
+                self._queues[key] = queue.Queue()
+                threading.Thread(target=self._work, args=(self._queues[key],), name=f"jobs-{key}", daemon=True).start()
+            self._queues[key].put(job)
+        logger.log.info(f"Job {job.id} queued on {key}: {action} {params}")
+        return job
+
+    def _work(self, jobs: queue.Queue) -> None:
+        while True:
+            job = jobs.get()
+            self.run(job)
+            jobs.task_done()
+
+    def run(self, job: Job) -> None:
+        job.status = RUNNING
+        started = time.monotonic()
+        try:
+            job.result = self.runner(job.action, job.params)
+            job.status = DONE
+        except Exception as e:
+            logger.log.error(f"Job {job.id} failed: {e!r}")
+            job.error = repr(e)
+            job.status = FAILED
+        finally:
+            job.seconds = time.monotonic() - started
+            job.finished.set()
+        logger.log.info(f"Job {job.id} {job.status} in {job.seconds:.2f}s")
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        """Returns:
+        {'queues': {'AMS02': 1}, 'jobs': {'done': 10, 'running': 1}}
+        """
+        with self._lock:
+            statuses = dict()
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {"queues": {key: jobs.qsize() for key, jobs in self._queues.items()}, "jobs": statuses}
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """POST /jobs                 {"action": "create", "name": "lablemams", "entrypoints": "intapi"}
+       POST /jobs?wait=1          same, answers once the job is finished
+       GET  /jobs/<id>[?wait=1]   job status and result
+       GET  /health               queue sizes and job counts
+
+    On a TCP port every request needs an "Authorization: Bearer <token>" header, see load_token.
+    """
+
+    def _send(self, code: int, data: dict) -> None:
+        body = json.dumps(data, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        """The Unix socket is protected by its permissions, a TCP port by the server token"""
+        if not self.server.token:
+            return True
+        expected = f"Bearer {self.server.token}".encode()
+        return hmac.compare_digest(self.headers.get("Authorization", "").encode(), expected)
+
+    def _answer(self, job: Job, code: int, wait: bool) -> None:
+        if wait:
+            job.finished.wait()
+        self._send(code, job.to_dict())
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        # The body is read whatever the answer, the client may still be sending it
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self._authorized():
+            return self._send(401, {"error": "Unauthorized"})
+        if url.path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "Not found"})
+        try:
+            params = json.loads(body or b"{}")
+            action = params.pop("action", None)
+            job = self.server.queues.submit(action, params, self.server.resolve(params))
+        except Exception as e:
+            return self._send(400, {"error": repr(e)})
+        self._answer(job, 202, bool(parse_qs(url.query).get("wait")))
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if not self._authorized():
+            return self._send(401, {"error": "Unauthorized"})
+        if url.path == "/health":
+            return self._send(200, self.server.queues.stats())
+        if url.path.startswith("/jobs/") and (job := self.server.queues.get(url.path.split("/")[2])):
+            return self._answer(job, 200, bool(parse_qs(url.query).get("wait")))
+        self._send(404, {"error": "Not found"})
+
+    def log_message(self, format: str, *args) -> None:
+        logger.log.debug(f"JobHandler - {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects an (address, port) client
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+    def server_bind(self) -> None:
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        os.makedirs(os.path.dirname(self.server_address) or ".", exist_ok=True)
+        # The socket is created readable by its owner only, there is no moment anybody else could connect
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+
+def load_token(path: str) -> str:
+    """Token of the job API on a TCP port from path, a new one is written there if it has none.
+    The file is readable by its owner only, clients read the token from it.
+    """
+    path = os.path.expanduser(path)
+    if os.path.exists(path):
+        with open(path) as file:
+            if token := file.read().strip():
+                return token
+    os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as file:
+        os.fchmod(file.fileno(), 0o600)
+        file.write(token)
+    return token
+
+
+def make_server(queues: JobQueues, resolve, socket_path: str = None, port: int = 0, token: str = None):
+    """HTTP server of the job API on a Unix socket readable by its owner only,
+    or on localhost:port for clients which send the token.
+
+    resolve(params) returns the queue key of a job and raises on invalid params.
+    """
+    if port:
+        if not token:
+            raise ValueError("The job API on a TCP port requires a token")
+        server = ThreadingHTTPServer(("127.0.0.1", port), JobHandler)
+        server.token = token
+    else:
+        server = UnixHTTPServer(os.path.expanduser(socket_path), JobHandler)
+        server.token = None
+    server.queues = queues
+    server.resolve = resolve
+    return server
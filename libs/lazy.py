@@ -0,0 +1,72 @@
+"""Lazily computed attributes with explicit invalidation"""
+import threading
+from collections import defaultdict
+
+# Value of an attribute which was not computed yet. None, {} and False are computed values
+NOT_COMPUTED = object()
+PREFIX = '_lazy_'
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+class lazy:
+    """Like property, but computed once per object and kept even if the value is empty
+
+    An absent balancer object ({}) or an empty diff is not read / computed again on every access.
+    Assigning sets the value, `invalidate` forgets it and the next access computes it again.
+    """
+
+    def __init__(self, func) -> None:
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(PREFIX + self.name, NOT_COMPUTED)
+        if value is NOT_COMPUTED:
+            _count(f'{type(obj).__name__}.{self.name}', 'misses')
+            value = obj.__dict__[PREFIX + self.name] = self.func(obj)
+        else:
+            _count(f'{type(obj).__name__}.{self.name}', 'hits')
+        return value
+
+    def __set__(self, obj, value) -> None:
+        obj.__dict__[PREFIX + self.name] = value
+
+    def __delete__(self, obj) -> None:
+        obj.__dict__.pop(PREFIX + self.name, None)
+
+
+def _count(key: str, field: str) -> None:
+    with _lock:
+        _stats[key][field] += 1
+
+
+def is_computed(obj, name: str) -> bool:
+    return obj.__dict__.get(PREFIX + name, NOT_COMPUTED) is not NOT_COMPUTED
+
+
+def invalidate(obj, *names: str) -> None:
+    """Forgets the lazy attributes `names` of obj, all of them if no names are given"""
+    names = names or [key[len(PREFIX):] for key in list(obj.__dict__) if key.startswith(PREFIX)]
+    for name in names:
+        obj.__dict__.pop(PREFIX + name, None)
+
+
+def stats() -> dict:
+    """Returns:
+    {'NodeF5.state': {'hits': 3, 'misses': 1}, ...}
+    """
+    with _lock:
+        return {key: dict(value) for key, value in sorted(_stats.items())}
+
+
+def reset_stats() -> None:
+    with _lock:
+        _stats.clear()
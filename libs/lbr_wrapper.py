@@ -1,16 +1,13 @@
-from acos_client.errors import AddressSpecifiedIsInUse as A10AddressSpecifiedIsInUse
-from acos_client.errors import Exists as A10Exists
+from contextlib import nullcontext
+
 from api_libs.helper import get_ff
 from api_libs.logger import log
 from api_libs.logger import Logger
 
-import libs.a10_wrapper as a10_wrapper
-import libs.f5_wrapper as f5_wrapper
-from conf.static import balancers
 from conf.static import entrypoints
 from conf.static import healthchecks
-from libs.f5_wrapper import AddressSpecifiedIsInUse as F5AddressSpecifiedIsInUse
-from libs.f5_wrapper import Exists as F5Exists
+from libs.f5_snapshot import get_attrs
+from libs.session_registry import registry
 
 
 logger = Logger()
@@ -23,82 +20,116 @@ class LBR:
         self._f5 = None
         self.healthchecks = healthchecks
         self.entrypoints = entrypoints
+        # Managers are shared by the whole run, so per-VIP progress is tracked here
+        self._created_virtuals = set()
+        self._deleted_virtuals = set()
 
     @property
     def a10(self):
         if not self._a10:
-            self._a10 = a10_wrapper.A10Manager(
-                address=balancers[self.location]["A10"]["address"],
-                user=get_ff("BALANCERS")[self.location]["A10"]["user"],
-                password=get_ff("BALANCERS")[self.location]["A10"]["password"],
-            )
+            self._a10 = registry.a10(location=self.location)
         return self._a10
 
     @property
     def f5(self):
         if not self._f5:
-            self._f5 = f5_wrapper.F5Manager(
-                address=balancers[self.location]["F5"]["address"],
-                user=get_ff("BALANCERS")[self.location]["F5"]["user"],
-                password=get_ff("BALANCERS")[self.location]["F5"]["password"],
-                partition=balancers[self.location]["F5"]["partition"],
-            )
+            self._f5 = registry.f5(location=self.location)
         return self._f5
 
     @log(logger)
     def get_vip(self, entrypoint: str, env_suffix: str) -> list:
+        """Returns:
+        [{
+            'name': 'api-lablemams',
+            'address': '10.62.9.123',
+            'ports': [{
+                'port_number': 443,
+                'pool': {'name': 'lem01-t01-pas_8082',
+                         'members': [{'name': 'lem01-t01-pas01', 'address': '10.61.101.133', 'port': 8082}, ...]}
+            }, ...]
+        }]
+        """
         lbr_type = self.get_lbr_type(entrypoint)
-        vips = []
         if lbr_type == "A10":
-            vip_name = self.get_vip_name(lbr_type, entrypoint, env_suffix, {})
-            virtual = self.a10.get_virtual_server(name=vip_name)
+            return self._get_vip_a10(entrypoint, env_suffix)
+        elif lbr_type == "F5":
+            return self._get_vip_f5(entrypoint, env_suffix)
+        return []
+
+    @log(logger)
+    def get_vips(self, entrypoints: list[str], env_suffix: str, refresh: bool = False) -> dict:
+        """Same as get_vip for many entrypoints, built from one read of every device collection
+
+        Returns:
+        {'api': [...], 'intapi': [...]}
+        """
+        if refresh:
+            self.refresh({self.get_lbr_type(entrypoint) for entrypoint in entrypoints})
+        return {entrypoint: self.get_vip(entrypoint, env_suffix) for entrypoint in entrypoints}
+
+    def refresh(self, lbr_types: set[str] = ("A10", "F5")) -> None:
+        """Re-read device collections on next use"""
+        if "A10" in lbr_types:
+            self.a10.refresh()
+        if "F5" in lbr_types:
+            self.f5.refresh()
+
+    def _get_vip_a10(self, entrypoint: str, env_suffix: str) -> list:
+        catalog = self.a10.catalog
+        vip_name = self.get_vip_name("A10", entrypoint, env_suffix, {})
+        virtual = catalog.get_virtual(vip_name)
+        if not virtual:
+            return []
+        vip = {"name": vip_name, "address": virtual.get("ip-address"), "ports": []}
+        for p in virtual.get("port-list", []):
+            pool = p.get("service-group")
+            port = {
+                "port_number": p.get("port-number"),
+                "pool": {"name": pool} if pool else None,
+            }
+            if pool:
+                members = (catalog.get_group(pool) or {}).get("member-list", [])
+                port["pool"]["members"] = [
+                    {
+                        "name": m["name"],
+                        "address": (catalog.get_server(m["name"]) or {}).get("host"),
+                        "port": m["port"],
+                    }
+                    for m in members
+                ]
+            vip["ports"].append(port)
+        return [vip]
+
+    def _get_vip_f5(self, entrypoint: str, env_suffix: str) -> list:
+        snapshot = self.f5.snapshot
+        vips = []
+        for p in self.get_ports_config(entrypoint):
+            vip_name = self.get_vip_name("F5", entrypoint, env_suffix, p)
+            virtual = snapshot.get_virtual(vip_name)
             if not virtual:
-                return vips
-            vip = {"name": vip_name, "address": virtual.get("ip-address"), "ports": []}
-            for p in virtual.get("port-list", []):
-                port_number = p.get("port-number")
-                pool = p.get("service-group")
-                port = {
-                    "port_number": port_number,
-                    "pool": {"name": pool} if pool else None,
-                }
-                if pool:
-                    members = self.a10.get_group(name=pool).get("member-list", [])
-                    port["pool"]["members"] = [
-                        {
-                            "name": m["name"],
-                            "address": self.a10.get_server(name=m["name"])["host"],
-                            "port": m["port"],
-                        }
-                        for m in members
-                    ]
-                vip["ports"].append(port)
+                continue
+            destination = get_attrs(virtual).get("destination")
+            pool = self.f5.clean_value(get_attrs(virtual).get("pool"))
+            vip = {
+                "name": vip_name,
+                "address": self.f5.clean_value(destination),
+                "ports": [
+                    {
+                        "port_number": int(destination.rsplit(":", 1)[-1]),
+                        "pool": {"name": pool} if pool else None,
+                    }
+                ],
+            }
+            if pool:
+                vip["ports"][0]["pool"]["members"] = [
+                    {
+                        "name": member.split(":")[0],
+                        "address": address,
+                        "port": int(member.rsplit(":")[-1]),
+                    }
+                    for member, address in snapshot.get_pool_members(pool).items()
+                ]
             vips.append(vip)
-        elif lbr_type == "F5":
-            ports = self.get_ports_config(entrypoint)
-            for p in ports:
-                vip_name = self.get_vip_name(lbr_type, entrypoint, env_suffix, p)
-                virtual = self.f5.get_virtual_server(name=vip_name)
-                if not virtual:
-                    continue
-                destination = virtual.attrs.get("destination")
-                port_number = int(destination.rsplit(":", 1)[-1])
-                pool = self.f5.clean_value(virtual.attrs.get("pool"))
-                vip = {
-                    "name": vip_name,
-                    "address": self.f5.clean_value(destination),
-                    "ports": [
-                        {
-                            "port_number": port_number,
-                            "pool": {"name": pool} if pool else None,
-                        }
-                    ],
-                }
-                if pool:
-                    vip["ports"][0]["pool"]["members"] = self.f5.get_pool_members(
-                        name=pool
-                    )
-                vips.append(vip)
         return vips
 
     @log(logger)
@@ -111,35 +142,106 @@ class LBR:
         env_domain: str,
     ) -> bool:
         lbr_type = self.get_lbr_type(entrypoint=entrypoint)
-        self.create_nodes(lbr_type, nodes)
-        # exit()
+        if lbr_type == "F5" and get_ff("F5_TRANSACTIONS"):
+            new_nodes = self.get_new_f5_nodes(nodes)
+            if new_nodes is not None:
+                try:
+                    with self.f5.transaction():
+                        self._create_vip(lbr_type, entrypoint, ip, nodes, env_suffix, env_domain, new_nodes)
+                    return True
+                except self.f5.Error as e:
+                    logger.log.warning(f"{lbr_type}.transaction - {entrypoint}: {e}, creating step by step")
+        return self._create_vip(lbr_type, entrypoint, ip, nodes, env_suffix, env_domain, nodes)
+
+    def _create_vip(
+        self,
+        lbr_type: str,
+        entrypoint: str,
+        ip: str,
+        nodes: list[dict],
+        env_suffix: str,
+        env_domain: str,
+        new_nodes: list[dict],
+    ) -> bool:
+        self.create_nodes(lbr_type, new_nodes)
         ports = self.get_ports_config(entrypoint)
+        if lbr_type == "A10":
+            return self._create_vip_a10(entrypoint, ip, nodes, env_suffix, env_domain, ports)
         processed_pools = []
         for port in ports:
             pool_name, target_port = self.get_pool_name_with_port(nodes, port)
             if pool_name not in processed_pools:
-                self.create_pool_with_members(lbr_type, pool_name, nodes, target_port)
+                # Existing pool is only a warning, inside a transaction it would fail the whole commit
+                if not (lbr_type == "F5" and self.f5.in_transaction and self.f5.snapshot.get_pool(pool_name)):
+                    self.create_pool_with_members(lbr_type, pool_name, nodes, target_port)
                 processed_pools.append(pool_name)
             vip_name = self.get_vip_name(lbr_type, entrypoint, env_suffix, port)
             self.create_virtual(lbr_type, vip_name, ip, port, pool_name, env_domain)
         return True
 
+    def _create_vip_a10(
+        self, entrypoint: str, ip: str, nodes: list[dict], env_suffix: str, env_domain: str, ports: list[dict]
+    ) -> bool:
+        """Service groups and ports of the virtual server are created with one request each"""
+        groups = dict()
+        for port in ports:
+            pool_name, target_port = self.get_pool_name_with_port(nodes, port)
+            groups[pool_name] = {
+                "name": pool_name, "members": [{"name": node["name"], "port": target_port} for node in nodes]
+            }
+        for pool_name, result in self.a10.create_groups(list(groups.values())).items():
+            if isinstance(result, self.a10.Exists):
+                logger.log.warning(f"A10.pool.create - {pool_name}: {result}")
+            elif isinstance(result, Exception):
+                raise result
+        vip_name = self.get_vip_name("A10", entrypoint, env_suffix, {})
+        if vip_name not in self._created_virtuals:
+            self.a10.create_virtual_server(name=vip_name, ip=ip)
+            self._created_virtuals.add(vip_name)
+        results = self.a10.create_virtual_ports(vip_name, [{
+            "port": port["port"],
+            "protocol": port["protocol"],
+            "group": self.get_pool_name_with_port(nodes, port)[0],
+            "template_http": port["template_http"],
+            "client_ssl": f"star.{env_domain}" if port["protocol"] == "https" else None,
+        } for port in ports])
+        logger.log.debug(f"A10.virtual_port.create - {vip_name}: {results}")
+        if errors := [result for result in results.values() if isinstance(result, Exception)]:
+            raise errors[0]
+        return True
+
+    @log(logger)
+    def get_new_f5_nodes(self, nodes: list[dict]) -> list[dict]:
+        """Nodes which are not on F5 yet, None if a node name or address is taken by a different node.
+        Conflicts need the step by step create_node, which replaces the conflicting node.
+        """
+        new_nodes = []
+        for node in nodes:
+            existing = self.f5.snapshot.get_node(node["name"])
+            if existing and self.f5.clean_value(get_attrs(existing).get("address")) == node["ip"]:
+                continue
+            if existing or self.f5.snapshot.get_node_by_address(node["ip"]):
+                return None
+            new_nodes.append(node)
+        return new_nodes
+
     @log(logger)
     def delete_vip(self, entrypoint: str, env_suffix: str) -> bool:
         lbr_type = self.get_lbr_type(entrypoint=entrypoint)
         ports = self.get_ports_config(entrypoint)
-        pools = self.get_virtual_server_pools(lbr_type, entrypoint, ports, env_suffix)
-        nodes = self.get_pool_members_names(lbr_type, pools[0]) if pools else []
-        for port in ports:
-            vip_name = self.get_vip_name(lbr_type, entrypoint, env_suffix, port)
-            self.delete_virtual(lbr_type, vip_name)
-        deleted_pools = []
-        for pool in pools:
-            if self.delete_pool(lbr_type, pool):
-                deleted_pools.append(pool)
-        # no need to delete nodes if no pools were deleted
-        if deleted_pools:
-            self.delete_nodes(lbr_type, nodes)
+        with self.memoized(lbr_type):
+            pools = self.get_virtual_server_pools(lbr_type, entrypoint, ports, env_suffix)
+            nodes = self.get_pool_members_names(lbr_type, pools[0]) if pools else []
+            for port in ports:
+                vip_name = self.get_vip_name(lbr_type, entrypoint, env_suffix, port)
+                self.delete_virtual(lbr_type, vip_name)
+            deleted_pools = []
+            for pool in pools:
+                if self.delete_pool(lbr_type, pool):
+                    deleted_pools.append(pool)
+            # no need to delete nodes if no pools were deleted
+            if deleted_pools:
+                self.delete_nodes(lbr_type, nodes)
         return True
 
     @log(logger)
@@ -153,6 +255,10 @@ class LBR:
             ip = self.f5.get_virtual_server_ip(name=vip_name)
         return ip
 
+    def memoized(self, lbr_type: str):
+        """Repeated reads of the same F5 object within one operation cost one GET"""
+        return self.f5.memoized() if lbr_type == "F5" else nullcontext()
+
     @log(logger)
     def get_pool_members_names(self, lbr_type: str, name: str) -> list:
         if lbr_type == "A10":
@@ -178,8 +284,15 @@ class LBR:
     def get_lbr_type(self, entrypoint: str) -> str:
         return entrypoints[entrypoint]["LB"].upper()
 
+    def get_manager(self, lbr_type: str):
+        return self.a10 if lbr_type == "A10" else self.f5
+
     @log(logger)
     def create_nodes(self, lbr_type: str, nodes: list[dict]):
+        if lbr_type == "A10" and len(nodes) > 1:
+            results = self.a10.create_servers([{"name": node["name"], "ip": node["ip"]} for node in nodes])
+            # Name and address conflicts are resolved by create_node one by one
+            nodes = [node for node in nodes if isinstance(results.get(node["name"]), Exception)]
         for node in nodes:
             self.create_node(lbr_type=lbr_type, node=node)
 
@@ -189,7 +302,7 @@ class LBR:
         if lbr_type == "A10":
             try:
                 created = self.a10.create_server(name=node["name"], ip=node["ip"])
-            except A10Exists as e:
+            except self.a10.Exists as e:
                 logger.log.warning(f"{lbr_type}.node.create - {node}: {e}")
                 ip = self.a10.get_server_ip(name=node["name"])
                 logger.log.info(f"{lbr_type}.node.create - {node}: name already exists with ip: {ip}")
@@ -198,7 +311,7 @@ class LBR:
                         self.create_node(lbr_type=lbr_type, node=node)
                 else:
                     created = True
-            except A10AddressSpecifiedIsInUse as e:
+            except self.a10.AddressSpecifiedIsInUse as e:
                 logger.log.warning(f"{lbr_type}.node.create - {node}: {e}")
                 if conflict_node := self.a10.get_server_by_ip(ip=node["ip"]).get("name"):
                     logger.log.info(f"{lbr_type}.node.create - {node}: ip already exists with node: {conflict_node}")
@@ -207,7 +320,7 @@ class LBR:
         elif lbr_type == "F5":
             try:
                 created = self.f5.create_node(name=node["name"], address=node["ip"])
-            except F5Exists as e:
+            except self.f5.Exists as e:
                 logger.log.warning(f"{lbr_type}.node.create - {node}: {e}")
                 ip = self.f5.get_node_address(name=node["name"])
                 logger.log.info(f"{lbr_type}.node.create - {node}: name already exists with ip: {ip}")
@@ -216,9 +329,9 @@ class LBR:
                         self.create_node(lbr_type=lbr_type, node=node)
                 else:
                     created = True
-            except F5AddressSpecifiedIsInUse as e:
+            except self.f5.AddressSpecifiedIsInUse as e:
                 logger.log.warning(f"{lbr_type}.node.create - {node}: {e}")
-                if conflict_node := self.f5.get_node_by_address(address=node["ip"]).attrs.get("name"):
+                if conflict_node := get_attrs(self.f5.get_node_by_address(address=node["ip"]) or {}).get("name"):
                     logger.log.info(f"{lbr_type}.node.create - {node}: ip already exists with node: {conflict_node}")
                     if self.delete_node(lbr_type=lbr_type, node=conflict_node):
                         self.create_node(lbr_type=lbr_type, node=node)
@@ -272,7 +385,7 @@ class LBR:
                 members = [f"{node['name']}:{target_port}" for node in nodes]
                 created = self.f5.create_pool(name=pool_name, members=members)
             return created
-        except (A10Exists, F5Exists) as e:
+        except self.get_manager(lbr_type).Exists as e:
             logger.log.warning(f"{lbr_type}.pool.create - {pool_name}: {e}")
 
     @log(logger)
@@ -291,9 +404,9 @@ class LBR:
         vip_port = port["port"]
         created = False
         if lbr_type == "A10":
-            if not hasattr(self.a10, "virtual_server_created"):
+            if vip_name not in self._created_virtuals:
                 created = self.a10.create_virtual_server(name=vip_name, ip=ip)
-                self.a10.virtual_server_created = True
+                self._created_virtuals.add(vip_name)
             port_created = self.a10.create_virtual_port(
                 virtual_server=vip_name,
                 port=vip_port,
@@ -320,9 +433,9 @@ class LBR:
     def delete_virtual(self, lbr_type: str, vip_name: str):
         deleted = False
         if lbr_type == "A10":
-            if not hasattr(self.a10, "virtual_server_deleted"):
+            if vip_name not in self._deleted_virtuals:
                 deleted = self.a10.delete_virtual_server(name=vip_name)
-                self.a10.virtual_server_deleted = True
+                self._deleted_virtuals.add(vip_name)
         elif lbr_type == "F5":
             deleted = self.f5.delete_virtual_server(name=vip_name)
         return deleted
@@ -350,6 +463,17 @@ class LBR:
 
     @log(logger)
     def delete_nodes(self, lbr_type: str, nodes: list[str]):
+        if lbr_type == "A10":
+            unused = []
+            for node in nodes:
+                if used_in_groups := self.a10.get_server_references(name=node):
+                    logger.log.warning(f"{lbr_type}.node.delete - {node}: used in {used_in_groups}")
+                else:
+                    unused.append(node)
+            results = self.a10.delete_servers(unused)
+            if errors := [result for result in results.values() if isinstance(result, Exception)]:
+                raise errors[0]
+            return
         for node in nodes:
             self.delete_node(lbr_type=lbr_type, node=node)
 
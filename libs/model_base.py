@@ -1,58 +1,122 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 
+from api_libs.helper import get_ff
 from api_libs.helper import write_cache
 from api_libs.logger import log
 from api_libs.logger import Logger
-from jsondiff import diff
+
+from libs.apply_engine import ApplyEngine
+from libs.apply_engine import REQUIRES
+from libs.apply_engine import SELF_FIRST
+from libs.apply_engine import SIBLINGS_FIRST
+from libs.device_limiter import limiter
+from libs.differ import diff
+from libs.lazy import invalidate
+from libs.lazy import lazy
+from libs.normalize import normalize
 
 logger = Logger()
 
+# Lazy attributes derived from the state read of an object, see Base.invalidate
+DERIVED_ATTRIBUTES = ('state', 'diff', 'is_good')
+
 
 class Base:
+    # Balancer vendor of the object, set on F5 / A10 classes
+    vendor = None
+    # Order against siblings in global_patch / global_delete, see ApplyEngine
+    patch_dependency = (SIBLINGS_FIRST, REQUIRES)
+    delete_dependency = (SELF_FIRST, REQUIRES)
+    # Lazy attributes read from balancers / DNS / inventory, forgotten after every write
+    state_attributes = DERIVED_ATTRIBUTES
+    # Normalizers of plan / state fields applied before diffing, see libs.normalize
+    schema = {}
+    # Fields the balancer changes in place with update(), a diff of other fields recreates the object
+    mutable_fields = ()
+
     def __init__(self) -> None:
         self._global_state = dict()
         self._global_plan = dict()
         self._siblings = dict()
-        self._state = None
-        self._plan = None
-        self._diff = None
         self._global_diff = None
 
-    @property
+    @lazy
     @log(logger)
     def diff(self):
-        if not self._diff:
-            self._diff = diff(self.state, self.plan, syntax='symmetric')
-        return self._diff
+        """Field level changes from state to plan, see differ.Diff"""
+        return diff(normalize(self.state, self.schema), normalize(self.plan, self.schema))
+
+    def invalidate(self) -> None:
+        """The next access reads the state again, called after the object was written"""
+        invalidate(self, *self.state_attributes)
+
+    @property
+    def key(self) -> tuple:
+        """Objects with the same key stand for the same balancer object and are patched / deleted once"""
+        return self.__class__.__name__, getattr(self, 'location', None), getattr(self, 'name', None) or id(self)
+
+    def _prepare_siblings(self, name: str):
+        # Could be implemented on higher levels to run one bulk request for several siblings
+        pass
+
+    @property
+    def prepares_siblings(self) -> bool:
+        return type(self)._prepare_siblings is not Base._prepare_siblings
+
+    @property
+    def device(self) -> tuple:
+        """(location, vendor) of the balancer the object lives on, None for objects above the balancers"""
+        return (self.location, self.vendor) if self.vendor else None
+
+    @staticmethod
+    def _get_sibling_data(sibling, name: str):
+        with limiter.slot(sibling.device, get_ff('DEVICE_CONCURRENCY')):
+            attribute = getattr(sibling, f'global_{name}')
+            return attribute() if callable(attribute) else attribute
 
     def _get_siblings_data(self, name: str):
         siblings_data = {}
         if self.siblings:
-            for k, v in self.siblings.items():
-                attribute = getattr(v, f'global_{name}')
-                siblings_data[k] = attribute() if callable(attribute) else attribute
+            self._prepare_siblings(name)
+            concurrency = get_ff('SIBLINGS_CONCURRENCY')
+            if concurrency > 1 and len(self.siblings) > 1:
+                # Every sibling runs in a copy of our context to stay within the same memo / transaction
+                with ThreadPoolExecutor(max_workers=min(concurrency, len(self.siblings))) as executor:
+                    futures = {
+                        k: executor.submit(copy_context().run, self._get_sibling_data, v, name)
+                        for k, v in self.siblings.items()
+                    }
+                    with limiter.released():
+                        siblings_data = {k: future.result() for k, future in futures.items()}
+            else:
+                for k, v in self.siblings.items():
+                    siblings_data[k] = self._get_sibling_data(v, name)
         return siblings_data
 
-    def _is_siblings_data_success(self, data: dict, method: str):
-        if isinstance(data, dict):
-            if method in data and not data[method]:
-                return False
-            # Recursively check 'siblings' values
-            return all(self._is_siblings_data_success(value, method) for value in data.values())
-        else:
-            return data
-
     @property
     def global_diff(self):
         if not self._global_diff:
             self._global_diff = {
                 self.__class__.__name__: {
-                    'diff': self.diff(),
+                    'diff': self.diff.to_dict(),
                     'siblings': self._get_siblings_data('diff')
                 }
             }
         return self._global_diff
 
+    def hydrate(self) -> bool:
+        """Takes the state from device collections read once for the whole tree, see StateLoader.
+        Implemented by balancer objects, returns False if the object reads its state alone.
+        """
+        return False
+
+    def _hydrated_state(self) -> bool:
+        # The state is derived from the hydrated attribute on the next access
+        invalidate(self, *DERIVED_ATTRIBUTES)
+        return True
+
     def validate_state(self):
         # Should be implemented on higher levels
         return False
@@ -69,11 +133,23 @@ class Base:
         # Should be implemented on higher levels
         return False
 
+    def update(self):
+        # Should be implemented on higher levels with mutable_fields
+        return False
+
+    @property
+    def updates_in_place(self) -> bool:
+        """The object exists and only its mutable fields changed"""
+        return bool(self.state and self.diff) and set(self.diff) <= set(self.mutable_fields)
+
     @log(logger)
     def patch(self) -> bool:
         if not self.are_we_good():
             return False
 
+        if self.updates_in_place:
+            logger.log.info(f"{self.__class__.__name__} - update in place: {self.diff.to_dict()}")
+            return self.update()
         if self.diff:
             self.delete() if self.state else None
             self.create()
@@ -84,27 +160,11 @@ class Base:
 
     @log(logger)
     def global_patch(self):
-        siblings_data = self._get_siblings_data('patch')
-        self_patched = self.patch() if self._is_siblings_data_success(siblings_data, 'patched') else False
-
-        return {
-            self.__class__.__name__: {
-                'patched': self_patched,
-                'siblings': siblings_data
-            }
-        }
+        return ApplyEngine(self, 'patch').run()
 
     @log(logger)
     def global_delete(self):
-        self_deleted = self.delete()
-        siblings_data = {} if not self_deleted else self._get_siblings_data('delete')
-
-        return {
-            self.__class__.__name__: {
-                'deleted': self_deleted,
-                'siblings': siblings_data
-            }
-        }
+        return ApplyEngine(self, 'delete').run()
 
     @property
     @log(logger)
@@ -143,6 +203,10 @@ class Base:
         write_cache(cache_dir='data', cache_filename=f'State_{prefix}.json', data=self.state)
         write_cache(cache_dir='data', cache_filename=f'Plan_{prefix}.json', data=self.plan)
 
-    @log(logger)
     def are_we_good(self):
+        return self.is_good
+
+    @lazy
+    @log(logger)
+    def is_good(self) -> bool:
         return all([self.validate_plan(), self.validate_state()])
@@ -1,7 +1,9 @@
 from api_libs.logger import log
 from api_libs.logger import Logger
 
-from libs.f5_wrapper import Exists
+from libs import normalize
+from libs.f5_snapshot import get_attrs
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
 
@@ -17,7 +19,6 @@ class Node(Base):
         self.location = location.upper()
         self._lbr = None
         self._lbr_wrp = None
-        self._node = dict()
 
     @property
     def lbr_wrp(self):
@@ -27,6 +28,9 @@ class Node(Base):
 
 
 class NodeF5(Node):
+    vendor = "F5"
+    state_attributes = Node.state_attributes + ('node',)
+    schema = {'name': normalize.name, 'ip': normalize.address}
 
     @property
     def lbr(self):
@@ -34,17 +38,24 @@ class NodeF5(Node):
             self._lbr = self.lbr_wrp.f5
         return self._lbr
 
-    @property
+    @lazy
     @log(logger)
     def node(self):
-        if not self._node:
-            item = self.lbr.get_node(name=self.name)
-            if item:
-                self._node = {
-                    'name': item.attrs['name'],
-                    'ip': item.attrs['address'].split('%')[0]
-                }
-        return self._node
+        return self._parse_node(self.lbr.get_node(name=self.name))
+
+    @staticmethod
+    def _parse_node(item) -> dict:
+        if not item:
+            return dict()
+        attrs = get_attrs(item)
+        return {
+            'name': attrs['name'],
+            'ip': attrs['address'].split('%')[0]
+        }
+
+    def hydrate(self) -> bool:
+        self.node = self._parse_node(self.lbr.snapshot.get_node(name=self.name))
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['ip']:
@@ -59,7 +70,7 @@ class NodeF5(Node):
         logger.log.info(f"Create node: {self.plan}")
         try:
             return bool(self.lbr.create_node(name=self.plan['name'], address=self.plan['ip']))
-        except Exists:
+        except self.lbr.Exists:
             return False
 
     @log(logger)
@@ -69,18 +80,9 @@ class NodeF5(Node):
 
         if self.diff:
             if self.state and 'ip' in self.diff:
-                logger.log.info(f"Found diff in node {self.name} ip: {self.diff}")
-                processed_pools = {}
-                node_references = self.lbr.get_node_references(name=self.state['name'])
-                logger.log.info(f"Got node references: {node_references}")
-                for pool in node_references:
-                    logger.log.info(f"Delete members by node in pool: {pool}")
-                    processed_pools[pool] = self.lbr.delete_pool_members_by_nodes(name=pool, nodes=[self.state['name']])
-                self.delete()
-                self.create()
-                for pool, members in processed_pools.items():
-                    logger.log.info(f"Add pool '{pool}' members: {members}")
-                    self.lbr.add_pool_members(name=pool, members=members)
+                logger.log.info(f"Found diff in node {self.name} ip: {self.diff.to_dict()}")
+                memberships = self.lbr.readdress_node(name=self.state['name'], address=self.plan['ip'])
+                logger.log.info(f"Node {self.name} re-created with {self.plan['ip']}, pool members kept: {memberships}")
             elif not self.state:
                 self.create()
         else:
@@ -97,17 +99,13 @@ class NodeF5(Node):
             logger.log.warn(f'Cannot delete node {self.name}: used in {node_references}')
             return False
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            self._plan = {
-                'name': self.name,
-                'ip': self.ip
-            }
-        return self._plan
+        return {
+            'name': self.name,
+            'ip': self.ip
+        }
 
-    @property
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.node
-        return self._state
+        return self.node
@@ -0,0 +1,52 @@
+"""Canonical form of plans and states, so only real changes make a diff
+
+Every balancer class describes its fields with a schema {field: normalizer}, see Base.schema.
+Fields without a normalizer are compared as they are.
+"""
+
+
+def name(value):
+    """Object name without partition / folder: '/Common/tcp' > 'tcp'"""
+    return value.rsplit('/', 1)[-1] if isinstance(value, str) else value
+
+
+def address(value):
+    """IP without route domain: '10.62.9.123%2' > '10.62.9.123'"""
+    return value.split('%', 1)[0] if isinstance(value, str) else value
+
+
+def port(value):
+    """'8082' > 8082"""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+def ordered(values) -> list:
+    """Ordered set: duplicates and order of device answers do not matter"""
+    return sorted(set(values or []), key=str)
+
+
+def ports(values) -> list:
+    return ordered(port(value) for value in values or [])
+
+
+def names(values) -> list:
+    return ordered(name(value) for value in values or [])
+
+
+def members(values) -> list:
+    """F5 pool members: ['/Common/lem01-t01-pwr01:8082'] > ['lem01-t01-pwr01:8082']"""
+    return names(values)
+
+
+def member_list(values) -> list:
+    """A10 service group members: [{'name': 'pwr01', 'port': '8082'}] > [{'name': 'pwr01', 'port': 8082}]"""
+    unique = {(name(member['name']), port(member['port'])) for member in values or []}
+    return [{'name': member, 'port': member_port} for member, member_port in sorted(unique, key=str)]
+
+
+def normalize(data: dict, schema: dict) -> dict:
+    if not data or not schema:
+        return data
+    return {field: schema[field](value) if field in schema else value for field, value in data.items()}
@@ -1,10 +1,13 @@
 from api_libs.logger import log
 from api_libs.logger import Logger
 
+from libs import normalize
+from libs.f5_snapshot import get_attrs
+from libs.identity_map import shared
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
 from libs.node import NodeF5
-from libs.f5_wrapper import Exists
 
 logger = Logger()
 
@@ -19,7 +22,6 @@ class Pool(Base):
         self.port_config = port_config
         self._lbr = None
         self._lbr_wrp = None
-        self._pool = dict()
 
     @property
     def lbr_wrp(self):
@@ -29,6 +31,9 @@ class Pool(Base):
 
 
 class PoolF5(Pool):
+    vendor = "F5"
+    state_attributes = Pool.state_attributes + ('pool',)
+    schema = {'name': normalize.name, 'monitor': normalize.name, 'members': normalize.members}
 
     @property
     def lbr(self):
@@ -36,18 +41,29 @@ class PoolF5(Pool):
             self._lbr = self.lbr_wrp.f5
         return self._lbr
 
-    @property
+    @lazy
     @log(logger)
     def pool(self):
-        if not self._pool:
-            item = self.lbr.get_pool(name=self.name)
-            if item:
-                self._pool = {
-                    'name': item.attrs['name'],
-                    'monitor': item.attrs.get('monitor', '').split('/')[-1],
-                    'members': [member['name'] for member in item.attrs.get('membersReference', {}).get('items', [])]
-                }
-        return self._pool
+        return self._parse_pool(self.lbr.get_pool(name=self.name))
+
+    @staticmethod
+    def _parse_pool(item) -> dict:
+        if not item:
+            return dict()
+        attrs = get_attrs(item)
+        return {
+            'name': attrs['name'],
+            'monitor': attrs.get('monitor', '').split('/')[-1],
+            'members': [member['name'] for member in attrs.get('membersReference', {}).get('items', [])]
+        }
+
+    def hydrate(self) -> bool:
+        snapshot = self.lbr.snapshot
+        if pool := self._parse_pool(snapshot.get_pool(name=self.name)):
+            # Members of the pool item are the fetched ones, the index has our own writes as well
+            pool['members'] = snapshot.get_pool_member_names(name=self.name)
+        self.pool = pool
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['name']:
@@ -64,22 +80,20 @@ class PoolF5(Pool):
             members.append(f'{endpoint}:{self.port_config["target_port"]}')
         return members
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            self._plan = {
-                'name': self.name,
-                'monitor': self.monitor,
-                'members': self.get_members()
-            }
-        return self._plan
+        return {
+            'name': self.name,
+            'monitor': self.monitor,
+            'members': self.get_members()
+        }
 
     def create(self) -> bool:
         logger.log.info(f"Create pool: {self.plan}")
         try:
             return bool(self.lbr.create_pool(name=self.plan['name'], members=self.plan['members'],
                                              monitor=self.plan['monitor']))
-        except Exists:
+        except self.lbr.Exists:
             return False
 
     @log(logger)
@@ -89,11 +103,9 @@ class PoolF5(Pool):
 
         if self.diff:
             if self.state and 'members' in self.diff:
-                logger.log.info(f"Found diff in pool {self.name} members: {self.diff}")
-                logger.log.info("Delete current pool members")
-                self.lbr.delete_all_pool_members(name=self.state['name'])
-                logger.log.info(f"Add new pool members: {self.plan['members']}")
-                self.lbr.add_pool_members(name=self.plan['name'], members=self.plan['members'])
+                members = self.diff['members']
+                logger.log.info(f"Update pool {self.name} members, add: {list(members.added)}, remove: {list(members.removed)}")
+                self.lbr.set_pool_members(name=self.state['name'], members=members.new)
             elif not self.state:
                 self.create()
         else:
@@ -110,18 +122,16 @@ class PoolF5(Pool):
             logger.log.warn(f'Cannot delete pool {self.name}: used in {pool_references}')
             return False
 
-    @property
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.pool
-        return self._state
+        return self.pool
 
     @property
     def siblings(self):
         if not self._siblings and self.validate_plan():
             for endpoint, value in self.endpoints.items():
-                self._siblings[endpoint] = NodeF5(
-                    name=endpoint, ip=value['ip'],
+                self._siblings[endpoint] = shared(
+                    NodeF5, name=endpoint, ip=value['ip'],
                     location=self.location
                 )
         return self._siblings
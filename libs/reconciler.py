@@ -0,0 +1,159 @@
+"""Continuous reconciliation of environments with their balancers"""
+import threading
+import time
+
+from api_libs.helper import get_ff
+from api_libs.logger import Logger
+
+from libs import identity_map
+from libs.apply_engine import ApplyEngine
+from libs.entrypoint import Entrypoint
+from libs.entrypoint_manager import EntrypointManager
+from libs.state_loader import StateLoader
+
+logger = Logger()
+
+# Collection queries of a balancer snapshot refresh, one per object type
+REFRESH_COST = 3
+
+
+class TokenBucket:
+    """`rate` tokens a second, up to `burst` at once. A rate of 0 does not limit anything."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, tokens: int = 1) -> float:
+        """Takes tokens, waits until the bucket has them. Returns the seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens taken ahead are paid back by waiting, so concurrent callers queue up in order
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class Reconciler:
+    """Brings the balancer objects of environments back to their plan, cycle after cycle
+
+    A cycle runs within one identity_map.run_scope: every balancer snapshot is refreshed once for all
+    environments, so drift is found with a few collection queries per balancer whatever the number of
+    environments. Only the topmost balancer objects with a diff are patched, together with their subtree.
+    Drift out of the balancers (DNS, inventory) is reported only, 'happyvip.py create' fixes it.
+    Device traffic of the loop goes through a TokenBucket per balancer.
+    """
+
+    def __init__(self, get_em, dry_run: bool = False) -> None:
+        self.get_em = get_em
+        self.dry_run = dry_run
+        self._lock = threading.Lock()
+        self._buckets = dict()
+        self.waited = 0.0
+
+    def throttle(self, device: tuple, tokens: int = 1) -> None:
+        with self._lock:
+            if device not in self._buckets:
+                self._buckets[device] = TokenBucket(get_ff('RECONCILE_RATE'), get_ff('RECONCILE_BURST'))
+            bucket = self._buckets[device]
+        waited = bucket.take(tokens)
+        with self._lock:
+            self.waited += waited
+
+    @staticmethod
+    def drifted(root) -> list:
+        """Topmost balancer objects of the tree with a diff, every object once"""
+        drifted, seen, queue = [], set(), [root]
+        while queue:
+            obj = queue.pop(0)
+            if obj.key in seen:
+                continue
+            seen.add(obj.key)
+            if obj.vendor and obj.diff:
+                drifted.append(obj)
+            else:
+                queue.extend((obj.siblings or {}).values())
+        return drifted
+
+    def reconcile_entrypoint(self, entrypoint) -> dict:
+        """Patches the drifted balancer subtrees of the entrypoint, nothing with dry_run
+
+        Returns:
+         {'PoolF5 lem01-t01-pwr_8082': {'diff': {'members': {...}}, 'patched': True}}, patched is None with dry_run
+        """
+        if not entrypoint.ip:
+            logger.log.debug(f"'{entrypoint.name}' - not created, nothing to reconcile")
+            return dict()
+        StateLoader(entrypoint, throttle=lambda device: self.throttle(device, REFRESH_COST)).load()
+        if entrypoint.diff:
+            logger.log.warning(f"'{entrypoint.name}' - drift out of balancers is not reconciled: {entrypoint.diff.to_dict()}")
+        report = dict()
+        for obj in self.drifted(entrypoint):
+            name = f"{obj.__class__.__name__} {getattr(obj, 'name', '')}".rstrip()
+            report[name] = {'diff': obj.diff.to_dict(), 'patched': None}
+            logger.log.info(f"'{entrypoint.name}' - {name} drifted: {report[name]['diff']}")
+            if self.dry_run:
+                continue
+            # A write or two per drifted object of the subtree
+            changes = [sibling for sibling in StateLoader(obj).objects() if sibling.vendor and sibling.diff]
+            self.throttle(obj.device, len(changes))
+            try:
+                report[name]['patched'] = ApplyEngine(obj, 'patch').run()[obj.__class__.__name__]['patched']
+            except Exception as e:
+                logger.log.error(f"'{entrypoint.name}' - {name} patch failed: {e!r}")
+                report[name]['patched'] = False
+        return report
+
+    def reconcile_env(self, env_name: str) -> dict:
+        """Returns:
+         {'intapi': {'PoolF5 lem01-t01-pwr_8082': {'diff': {...}, 'patched': True}}, 'api': {}}
+        """
+        em = self.get_em(env_name)
+        # Hosts of the services are read from ADS again every cycle
+        em.forget_groups()
+        report = dict()
+        for name in EntrypointManager.get_entrypoints(services=em.env.get_all_services()):
+            eg = em.get_eg(EntrypointManager.get_service_by_entrypoint(name))
+            report[name] = self.reconcile_entrypoint(Entrypoint(name=name, env=eg.env, endpoints=eg.endpoints))
+        return report
+
+    def cycle(self, env_names: list) -> dict:
+        """One pass over the environments, the error of one environment does not stop the others
+
+        Returns:
+         {'lablemams': {'intapi': {'PoolF5 lem01-t01-pwr_8082': {'diff': {...}, 'patched': True}}}, 'labsomeenv': {}}
+        """
+        started, waited = time.monotonic(), self.waited
+        report = dict()
+        with identity_map.run_scope() as run:
+            for env_name in env_names:
+                try:
+                    report[env_name] = self.reconcile_env(env_name)
+                except Exception as e:
+                    logger.log.error(f"'{env_name}' - reconcile failed: {e!r}")
+                    report[env_name] = dict()
+            logger.log.debug(f"Shared balancer objects: {run.stats()}")
+        drifted = sum(len(objects) for env in report.values() for objects in env.values())
+        logger.log.info(f"Reconcile cycle - {len(env_names)} environments, {drifted} drifted objects in "
+                        f"{time.monotonic() - started:.1f}s, {self.waited - waited:.1f}s rate limited")
+        return report
+
+    def run(self, env_names: list, interval: int, cycles: int = 0) -> dict:
+        """Starts a cycle every `interval` seconds, `cycles` times or forever with 0. Returns the last report"""
+        done = 0
+        while True:
+            started = time.monotonic()
+            report = self.cycle(env_names)
+            done += 1
+            if cycles and done >= cycles:
+                return report
+            time.sleep(max(interval - (time.monotonic() - started), 0))
@@ -1,9 +1,12 @@
-from acos_client.errors import Exists as A10Exists
 from api_libs.logger import log
 from api_libs.logger import Logger
 
+from libs import normalize
+from libs.lazy import invalidate
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
+from libs.model_base import DERIVED_ATTRIBUTES
 
 
 logger = Logger()
@@ -17,7 +20,6 @@ class Server(Base):
         self.location = location.upper()
         self._lbr = None
         self._lbr_wrp = None
-        self._server = dict()
 
     @property
     def lbr_wrp(self):
@@ -27,6 +29,9 @@ class Server(Base):
 
 
 class ServerA10(Server):
+    vendor = "A10"
+    state_attributes = Server.state_attributes + ('server',)
+    schema = {'name': normalize.name, 'ip': normalize.address}
 
     @property
     def lbr(self):
@@ -34,17 +39,28 @@ class ServerA10(Server):
             self._lbr = self.lbr_wrp.a10
         return self._lbr
 
-    @property
+    @lazy
     @log(logger)
     def server(self):
-        if not self._server:
-            item = self.lbr.get_server(name=self.name)
-            if item:
-                self._server = {
-                    'name': item['name'],
-                    'ip': item['host']
-                }
-        return self._server
+        return self._parse_server(self.lbr.get_server(name=self.name))
+
+    @staticmethod
+    def _parse_server(item: dict) -> dict:
+        if not item:
+            return dict()
+        return {
+            'name': item['name'],
+            'ip': item['host']
+        }
+
+    def set_server(self, item: dict):
+        """Takes the server from an aXAPI response instead of reading it again"""
+        self.server = self._parse_server(item)
+        invalidate(self, *DERIVED_ATTRIBUTES)
+
+    def hydrate(self) -> bool:
+        self.server = self._parse_server(self.lbr.catalog.get_server(name=self.name))
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['ip']:
@@ -59,7 +75,7 @@ class ServerA10(Server):
         logger.log.info(f"Create server: {self.plan}")
         try:
             return bool(self.lbr.create_server(name=self.plan['name'], ip=self.plan['ip']))
-        except A10Exists:
+        except self.lbr.Exists:
             return False
 
     def delete(self) -> bool:
@@ -67,17 +83,13 @@ class ServerA10(Server):
         response = self.lbr.delete_server(name=self.name)
         return True if response['status'] == "OK" else False
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            self._plan = {
-                'name': self.name,
-                'ip': self.ip
-            }
-        return self._plan
+        return {
+            'name': self.name,
+            'ip': self.ip
+        }
 
-    @property
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.server
-        return self._state
+        return self.server
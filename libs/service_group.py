@@ -1,15 +1,29 @@
-from acos_client.errors import Exists as A10Exists
 from api_libs.logger import log
 from api_libs.logger import Logger
 
+from libs import normalize
+from libs.identity_map import shared
+from libs.lazy import invalidate
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
+from libs.model_base import DERIVED_ATTRIBUTES
 from libs.server import ServerA10
 
 
 logger = Logger()
 
 
+def create_servers(lbr, servers: list, copies: list = None) -> None:
+    """Creates the servers with one request, every created one (and its copies) takes its state from the response"""
+    logger.log.info(f"Create servers: {[server.plan for server in servers]}")
+    results = lbr.create_servers([{'name': server.plan['name'], 'ip': server.plan['ip']} for server in servers])
+    for server in copies or servers:
+        result = results.get(server.name)
+        if result and not isinstance(result, Exception):
+            server.set_server(result)
+
+
 class ServiceGroup(Base):
     def __init__(self, name: str, port_config: dict, location: str, endpoints: dict, healthcheck: str) -> None:
         super().__init__()
@@ -20,7 +34,6 @@ class ServiceGroup(Base):
         self.healthcheck = healthcheck
         self._lbr = None
         self._lbr_wrp = None
-        self._service_group = dict()
 
     @property
     def lbr_wrp(self):
@@ -30,6 +43,11 @@ class ServiceGroup(Base):
 
 
 class ServiceGroupA10(ServiceGroup):
+    vendor = "A10"
+    state_attributes = ServiceGroup.state_attributes + ('service_group',)
+    schema = {'name': normalize.name, 'health-check': normalize.name, 'member-list': normalize.member_list}
+    # Only the changed members are added / removed, other changes recreate the group
+    mutable_fields = ('member-list',)
 
     @property
     def lbr(self):
@@ -37,21 +55,32 @@ class ServiceGroupA10(ServiceGroup):
             self._lbr = self.lbr_wrp.a10
         return self._lbr
 
-    @property
+    @lazy
     @log(logger)
     def service_group(self):
-        if not self._service_group:
-            item = self.lbr.get_group(name=self.name)
-            if item:
-                self._service_group = {
-                    'name': item['name'],
-                    'health-check': item['health-check'],
-                    'member-list': [{
-                        'name': member['name'],
-                        'port': member['port']
-                    } for member in item.get('member-list', [])]
-                }
-        return self._service_group
+        return self._parse_service_group(self.lbr.get_group(name=self.name))
+
+    @staticmethod
+    def _parse_service_group(item: dict) -> dict:
+        if not item:
+            return dict()
+        return {
+            'name': item['name'],
+            'health-check': item['health-check'],
+            'member-list': [{
+                'name': member['name'],
+                'port': member['port']
+            } for member in item.get('member-list', [])]
+        }
+
+    def set_service_group(self, item: dict):
+        """Takes the group from an aXAPI response instead of reading it again"""
+        self.service_group = self._parse_service_group(item)
+        invalidate(self, *DERIVED_ATTRIBUTES)
+
+    def hydrate(self) -> bool:
+        self.service_group = self._parse_service_group(self.lbr.catalog.get_group(name=self.name))
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['name']:
@@ -67,39 +96,57 @@ class ServiceGroupA10(ServiceGroup):
         try:
             return bool(self.lbr.create_group(name=self.plan['name'], members=self.plan['member-list'],
                                               health_check=self.plan['health-check']))
-        except A10Exists:
+        except self.lbr.Exists:
             return False
 
+    def update(self) -> bool:
+        members = self.diff['member-list']
+        logger.log.info(f"Update service group {self.name} members, add: {list(members.added)}, "
+                        f"remove: {list(members.removed)}")
+        # New members first, the group keeps serving while old ones go
+        results = {
+            **self.lbr.add_group_members(name=self.name, members=list(members.added)),
+            **self.lbr.delete_group_members(name=self.name, members=list(members.removed)),
+        }
+        failed = {member: result for member, result in results.items() if isinstance(result, Exception)}
+        if failed:
+            logger.log.error(f"Failed to update service group {self.name} members: {failed}")
+        return not failed
+
     def delete(self) -> bool:
         logger.log.info(f"Delete service group: {self.name}")
         response = self.lbr.delete_group(name=self.name)
         return True if response['status'] == "OK" else False
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            self._plan = {
-                'name': self.name,
-                'health-check': self.healthcheck,
-                'member-list': [{
-                    'name': endpoint,
-                    'port': self.port_config['target_port']
-                } for endpoint in self.endpoints]
-            }
-        return self._plan
-
-    @property
+        return {
+            'name': self.name,
+            'health-check': self.healthcheck,
+            'member-list': [{
+                'name': endpoint,
+                'port': self.port_config['target_port']
+            } for endpoint in self.endpoints]
+        }
+
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.service_group
-        return self._state
+        return self.service_group
+
+    def _prepare_siblings(self, name: str):
+        """Missing servers are created with one request, their own patch has nothing left to do"""
+        if name != 'patch':
+            return
+        missing = [server for server in self.siblings.values() if server.validate_plan() and not server.state]
+        if len(missing) > 1:
+            create_servers(self.lbr, missing)
 
     @property
     def siblings(self):
         if not self._siblings:
             for endpoint, value in self.endpoints.items():
-                self._siblings[endpoint] = ServerA10(
-                    name=endpoint, ip=value['ip'],
+                self._siblings[endpoint] = shared(
+                    ServerA10, name=endpoint, ip=value['ip'],
                     location=self.location
                 )
         return self._siblings
@@ -0,0 +1,107 @@
+"""Run-scoped registry of balancer sessions"""
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+from api_libs.helper import get_ff
+
+from conf.static import balancers
+from libs.token_cache import TokenCache
+
+if TYPE_CHECKING:
+    from libs.a10_wrapper import A10Manager
+    from libs.f5_wrapper import F5Manager
+
+
+class SessionRegistry:
+    """Keeps one authenticated manager per (location, vendor, partition)
+
+    LBR and every model object of the run get the same F5Manager / A10Manager
+    for a device instead of opening and authenticating their own session.
+    A vendor module and its SDK are imported with the first manager of the vendor, so a run
+    which only works on A10 never loads f5-sdk and the other way round. Callers catch device
+    errors through the manager (F5Manager.Exists, A10Manager.AddressSpecifiedIsInUse, ...).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._managers = dict()
+
+    @staticmethod
+    def get_key(location: str, vendor: str) -> tuple:
+        location = location.upper()
+        vendor = vendor.upper()
+        return location, vendor, balancers[location][vendor].get("partition")
+
+    def get(self, location: str, vendor: str):
+        key = self.get_key(location, vendor)
+        with self._lock:
+            if key not in self._managers:
+                self._managers[key] = self._create_manager(*key)
+            return self._managers[key]
+
+    def a10(self, location: str) -> A10Manager:
+        return self.get(location=location, vendor="A10")
+
+    def f5(self, location: str) -> F5Manager:
+        return self.get(location=location, vendor="F5")
+
+    @staticmethod
+    def _create_manager(location: str, vendor: str, partition: str):
+        credentials = get_ff("BALANCERS")[location][vendor]
+        token_cache = TokenCache(get_ff("TOKEN_CACHE_FILE")) if get_ff("TOKEN_CACHE") else None
+        if vendor == "A10":
+            from libs.a10_wrapper import A10Manager
+
+            return A10Manager(
+                address=balancers[location]["A10"]["address"],
+                user=credentials["user"],
+                password=credentials["password"],
+                partition=partition,
+                async_client=get_ff("A10_ASYNC_CLIENT"),
+                concurrency=get_ff("A10_CONCURRENCY"),
+                token_cache=token_cache,
+            )
+        elif vendor == "F5":
+            from libs.f5_wrapper import F5Manager
+
+            return F5Manager(
+                address=balancers[location]["F5"]["address"],
+                user=credentials["user"],
+                password=credentials["password"],
+                partition=partition,
+                lean_client=get_ff("F5_LEAN_CLIENT"),
+                concurrency=get_ff("F5_CONCURRENCY"),
+                # f5-sdk logs in while discovering the device, only the lean client can reuse a token
+                token_cache=token_cache if get_ff("F5_LEAN_CLIENT") else None,
+            )
+        raise ValueError(f"Unknown balancer vendor: {vendor}")
+
+    def stats(self) -> dict:
+        """Returns:
+        {
+            'sessions': 2,
+            'logins': 2,
+            'devices': {'AMS02/F5/ams-up': {'sessions': 1, 'logins': 1}, ...}
+        }
+        """
+        with self._lock:
+            managers = dict(self._managers)
+        devices = {
+            "/".join(str(part) for part in key): {"sessions": manager.sessions, "logins": manager.logins}
+            for key, manager in managers.items()
+        }
+        return {
+            "sessions": sum(device["sessions"] for device in devices.values()),
+            "logins": sum(device["logins"] for device in devices.values()),
+            "devices": devices,
+        }
+
+    def reset(self) -> None:
+        """Forget all managers, the next run starts with fresh sessions"""
+        with self._lock:
+            self._managers = dict()
+
+
+registry = SessionRegistry()
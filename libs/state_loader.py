@@ -0,0 +1,61 @@
+"""Bulk state loading of a model tree"""
+import time
+
+from api_libs.helper import get_ff
+from api_libs.logger import Logger
+
+from libs import identity_map
+
+logger = Logger()
+
+# Last refresh of every balancer manager, see SNAPSHOT_MAX_AGE
+_refreshed_at = dict()
+
+
+class StateLoader:
+    """Reads the state of a whole model tree with one collection query per object type and balancer
+
+    Balancer objects of the tree take their state from the partition snapshot / catalog of their
+    manager (F5Manager.snapshot, A10Manager.catalog) instead of reading themselves with a GET each.
+    The collections are refreshed first, so the state is as fresh as a lazily read one.
+    Within identity_map.run_scope they are refreshed once per run: entrypoints and environments
+    processed later in the run reuse the snapshots, which are kept in sync by the writes of the run.
+    Snapshots younger than SNAPSHOT_MAX_AGE seconds are not refreshed at all, e.g. between daemon jobs.
+    throttle(device) is called before the collections of a balancer are read again, see Reconciler.
+    """
+
+    def __init__(self, root, throttle=None) -> None:
+        self.root = root
+        self.throttle = throttle
+
+    def objects(self) -> list:
+        """Every object of the tree, once"""
+        objects, seen, queue = [], set(), [self.root]
+        while queue:
+            obj = queue.pop(0)
+            if obj.key in seen:
+                continue
+            seen.add(obj.key)
+            objects.append(obj)
+            queue.extend((obj.siblings or {}).values())
+        return objects
+
+    @staticmethod
+    def is_outdated(manager) -> bool:
+        max_age = get_ff('SNAPSHOT_MAX_AGE')
+        return not max_age or id(manager) not in _refreshed_at or time.monotonic() - _refreshed_at[id(manager)] > max_age
+
+    def load(self) -> int:
+        """Returns number of hydrated objects"""
+        objects = [obj for obj in self.objects() if obj.vendor]
+        managers = {id(obj.lbr): (obj.lbr, obj.device) for obj in objects}
+        run = identity_map.current()
+        for manager, device in managers.values():
+            if (run is None or run.needs_refresh(manager)) and self.is_outdated(manager):
+                if self.throttle:
+                    self.throttle(device)
+                manager.refresh()
+                _refreshed_at[id(manager)] = time.monotonic()
+        hydrated = sum(obj.hydrate() for obj in objects)
+        logger.log.debug(f"StateLoader - {hydrated} objects hydrated from {len(managers)} balancers")
+        return hydrated
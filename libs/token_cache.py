@@ -0,0 +1,71 @@
+"""On-disk cache of device auth tokens shared between runs"""
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Tokens are not handed out this many seconds before they expire
+EXPIRY_MARGIN = 60
+# Lifetime of tokens the device reports no expiry for (aXAPI signatures live until 10 min of idle time)
+DEFAULT_TTL = 300
+
+
+class TokenCache:
+    """Auth tokens by device and user in a JSON file
+
+    The file is only readable by its owner (0600) and every access holds an exclusive flock,
+    so parallel happyvip runs never see a half written file or lose each other's tokens.
+    Expired tokens are never returned and are dropped on the next write.
+    """
+
+    def __init__(self, path: str, ttl: int = DEFAULT_TTL) -> None:
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+
+    @staticmethod
+    def get_key(device: str, user: str) -> str:
+        return f"{user}@{device}"
+
+    @contextmanager
+    def _locked(self):
+        """Yields the cached tokens and writes them back if they were changed"""
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            os.fchmod(file.fileno(), 0o600)
+            try:
+                tokens = json.loads(file.read() or "{}")
+            except ValueError:
+                tokens = dict()
+            before = dict(tokens)
+            yield tokens
+            if tokens != before:
+                now = time.time()
+                tokens = {key: item for key, item in tokens.items() if item["expires"] > now}
+                file.seek(0)
+                file.truncate()
+                json.dump(tokens, file)
+
+    def get(self, device: str, user: str) -> tuple[str, float]:
+        """Returns:
+        ('NJ4KY4ZRFXJ3M6J5', 1760000000.0) or None
+        """
+        with self._locked() as tokens:
+            item = tokens.get(self.get_key(device, user))
+        if item and item["expires"] - EXPIRY_MARGIN > time.time():
+            return item["token"], item["expires"]
+        return None
+
+    def set(self, device: str, user: str, token: str, expires: float = None) -> None:
+        expires = expires or time.time() + self.ttl
+        with self._locked() as tokens:
+            tokens[self.get_key(device, user)] = {"token": token, "expires": expires}
+
+    def discard(self, device: str, user: str, token: str = None) -> None:
+        """Forgets the token of device and user, only if it is still `token` when one is given"""
+        with self._locked() as tokens:
+            key = self.get_key(device, user)
+            if key in tokens and token in (None, tokens[key]["token"]):
+                tokens.pop(key)
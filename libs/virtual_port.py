@@ -1,8 +1,13 @@
 from api_libs.logger import log
 from api_libs.logger import Logger
 
+from libs import normalize
+from libs.identity_map import shared
+from libs.lazy import invalidate
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
+from libs.model_base import DERIVED_ATTRIBUTES
 from libs.service_group import ServiceGroupA10
 
 
@@ -21,7 +26,6 @@ class VirtualPort(Base):
         self.sg_healthcheck = sg_health
         self._lbr = None
         self._lbr_wrp = None
-        self._virtual_port = dict()
 
     @property
     def lbr_wrp(self):
@@ -31,6 +35,16 @@ class VirtualPort(Base):
 
 
 class VirtualPortA10(VirtualPort):
+    vendor = "A10"
+    state_attributes = VirtualPort.state_attributes + ('virtual_port',)
+    schema = {
+        'port-number': normalize.port,
+        'service-group': normalize.name,
+        'client-ssl': normalize.name,
+        'template-http': normalize.name
+    }
+    # Port number and protocol identify the port on the virtual server
+    mutable_fields = ('service-group', 'client-ssl', 'template-http')
 
     @property
     def lbr(self):
@@ -38,24 +52,40 @@ class VirtualPortA10(VirtualPort):
             self._lbr = self.lbr_wrp.a10
         return self._lbr
 
-    @property
+    @lazy
     @log(logger)
     def virtual_port(self):
-        if not self._virtual_port:
-            item = self.lbr.get_virtual_port(
-                virtual_server=self.virtual_server_name,
-                port=self.port_config['port'],
-                protocol=self.port_config['protocol']
-            )
-            if item:
-                self._virtual_port = {
-                    'port-number': item['port-number'],
-                    'protocol': item['protocol'],
-                    'service-group': item.get('service-group'),
-                    'client-ssl': item.get('template-client-ssl'),
-                    'template-http': item.get('template-http'),
-                }
-        return self._virtual_port
+        return self._parse_virtual_port(self.lbr.get_virtual_port(
+            virtual_server=self.virtual_server_name,
+            port=self.port_config['port'],
+            protocol=self.port_config['protocol']
+        ))
+
+    @staticmethod
+    def _parse_virtual_port(item: dict) -> dict:
+        if not item:
+            return dict()
+        return {
+            'port-number': item['port-number'],
+            'protocol': item['protocol'],
+            'service-group': item.get('service-group'),
+            'client-ssl': item.get('template-client-ssl'),
+            'template-http': item.get('template-http'),
+        }
+
+    def set_virtual_port(self, item: dict):
+        """Takes the port from an aXAPI response instead of reading it again"""
+        self.virtual_port = self._parse_virtual_port(item)
+        invalidate(self, *DERIVED_ATTRIBUTES)
+
+    def hydrate(self) -> bool:
+        virtual = self.lbr.catalog.get_virtual(name=self.virtual_server_name) or {}
+        port_key = (str(self.port_config['port']), self.port_config['protocol'])
+        self.virtual_port = self._parse_virtual_port(next((
+            port for port in virtual.get('port-list', [])
+            if (str(port.get('port-number')), port.get('protocol')) == port_key
+        ), None))
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['port-number']:
@@ -80,6 +110,17 @@ class VirtualPortA10(VirtualPort):
             template_http=self.plan['template-http']
         ))
 
+    def update(self) -> bool:
+        logger.log.info(f"Update virtual port: {self.plan}")
+        return bool(self.lbr.replace_virtual_port(
+            virtual_server=self.virtual_server_name,
+            port=self.plan['port-number'],
+            protocol=self.plan['protocol'],
+            group=self.plan['service-group'],
+            client_ssl=self.plan['client-ssl'],
+            template_http=self.plan['template-http']
+        ))
+
     def delete(self) -> bool:
         logger.log.info(f"Delete virtual port: {self.plan['port-number']}")
         response = self.lbr.delete_virtual_port(
@@ -89,32 +130,28 @@ class VirtualPortA10(VirtualPort):
         )
         return True if response['status'] == "OK" else False
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            self._plan = {
-                'port-number': self.port_config['port'],
-                'protocol': self.port_config['protocol'],
-                'service-group': self.lbr_wrp.get_pool_name_with_port(
-                    nodes=[{'name': name} for name in self.endpoints], port=self.port_config
-                )[0],
-                'client-ssl': self.client_ssl if self.port_config['protocol'] == "https" else None,
-                'template-http': self.port_config['template_http']
-            }
-        return self._plan
-
-    @property
+        return {
+            'port-number': self.port_config['port'],
+            'protocol': self.port_config['protocol'],
+            'service-group': self.lbr_wrp.get_pool_name_with_port(
+                nodes=[{'name': name} for name in self.endpoints], port=self.port_config
+            )[0],
+            'client-ssl': self.client_ssl if self.port_config['protocol'] == "https" else None,
+            'template-http': self.port_config['template_http']
+        }
+
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.virtual_port
-        return self._state
+        return self.virtual_port
 
     @property
     def siblings(self):
         if not self._siblings:
             service_group_name = self.plan['service-group']
-            self._siblings[service_group_name] = ServiceGroupA10(
-                name=service_group_name, port_config=self.port_config,
+            self._siblings[service_group_name] = shared(
+                ServiceGroupA10, name=service_group_name, port_config=self.port_config,
                 location=self.location, endpoints=self.endpoints, healthcheck=self.sg_healthcheck
             )
         return self._siblings
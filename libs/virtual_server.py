@@ -3,9 +3,17 @@ from api_libs.logger import log
 from api_libs.logger import Logger
 
 from conf.static import balancers
+from libs import normalize
+from libs.apply_engine import AFTER
+from libs.apply_engine import SELF_FIRST
+from libs.apply_engine import SIBLINGS_FIRST
+from libs.f5_snapshot import get_attrs
+from libs.identity_map import shared
+from libs.lazy import lazy
 from libs.lbr_wrapper import LBR
 from libs.model_base import Base
 from libs.pool import PoolF5
+from libs.service_group import create_servers
 from libs.virtual_port import VirtualPortA10
 
 
@@ -26,7 +34,6 @@ class VirtualServer(Base):
         self.endpoints = endpoints
         self._lbr = None
         self._lbr_wrp = None
-        self._virtual_server = dict()
 
     @property
     def lbr_wrp(self):
@@ -36,6 +43,17 @@ class VirtualServer(Base):
 
 
 class VirtualServerF5(VirtualServer):
+    vendor = "F5"
+    state_attributes = VirtualServer.state_attributes + ('virtual_server',)
+    schema = {
+        'name': normalize.name,
+        'destination': normalize.address,
+        'port': normalize.port,
+        'pool': normalize.name,
+        'profiles': normalize.names
+    }
+    # Name and partition identify the virtual server
+    mutable_fields = ('destination', 'port', 'pool', 'profiles')
 
     @property
     def lbr(self):
@@ -51,25 +69,35 @@ class VirtualServerF5(VirtualServer):
         else:
             return {}
 
-    @property
+    @lazy
     @log(logger)
     def virtual_server(self):
-        if not self._virtual_server:
-            item = self._get_f5_vs_dict(name=self.name)
-            if item:
-                partition, destination = item['destination'].replace('%2', '')[1:].split('/')
-                ip, port = item['destination'].replace('%2', '').split('/')[2].split(':')
-                # profiles_link = item['profilesReference']['link']
-                self._virtual_server = {
-                    'name': item['name'],
-                    'partition': partition,
-                    'destination': ip,
-                    'port': port,
-                    'pool': item['pool'].split('/')[2],
-                    'profiles': {profile['name'] for profile in item['profilesReference']['items']
-                                 if profile['name'] not in ['fastL4', 'tcp']}
-                }
-        return self._virtual_server
+        return self._parse_virtual_server(self._get_f5_vs_dict(name=self.name))
+
+    @staticmethod
+    def _parse_virtual_server(item: dict) -> dict:
+        if not item:
+            return dict()
+        # '/ams-up/10.62.6.194%2:443' from the device, a bare '10.62.6.194:443' is in the partition of the item
+        destination = item['destination'].replace('%2', '')
+        partition = item.get('partition')
+        if destination.startswith('/'):
+            partition, destination = destination[1:].split('/')
+        ip, port = destination.rsplit(':', 1)
+        return {
+            'name': item['name'],
+            'partition': partition,
+            'destination': ip,
+            'port': port,
+            'pool': item['pool'].split('/')[-1] if item.get('pool') else None,
+            'profiles': {profile['name'] for profile in item.get('profilesReference', {}).get('items', [])
+                         if profile['name'] not in ['fastL4', 'tcp']}
+        }
+
+    def hydrate(self) -> bool:
+        item = self.lbr.snapshot.get_virtual(name=self.name)
+        self.virtual_server = self._parse_virtual_server(get_attrs(item) if item else {})
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['port']:
@@ -93,32 +121,39 @@ class VirtualServerF5(VirtualServer):
                                                    http_profile_client=self.http_profile_client,
                                                    ssl_profile_client=self.ssl_profile_client))
 
+    def update(self) -> bool:
+        changes = {}
+        if 'destination' in self.diff or 'port' in self.diff:
+            changes.update(destination=self.plan['destination'], port=self.plan['port'])
+        if 'pool' in self.diff:
+            changes['pool'] = self.plan['pool']
+        if 'profiles' in self.diff:
+            changes['profiles'] = sorted(self.plan['profiles'])
+        logger.log.info(f"Update virtual server {self.name}: {changes}")
+        return self.lbr.modify_virtual_server(name=self.name, **changes)
+
     def delete(self) -> bool:
         logger.log.info(f"Delete virtual server: {self.name}")
         return bool(self.lbr.delete_virtual_server(name=self.name))
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            partition = balancers[self.location]["F5"]["partition"]
-            ports = self.lbr_wrp.get_ports_config(entrypoint=self.entrypoint)
-            nodes = [{'name': name} for name in self.endpoints]
-            pool_name = self.lbr_wrp.get_pool_name(nodes=nodes, ports=ports, port=self.port)
-            self._plan = {
-                'name': self.name,
-                'partition': partition,
-                'destination': self.ip,
-                'port': str(self.port),
-                'pool': pool_name,
-                'profiles': {profile for profile in [self.ssl_profile_client, self.http_profile_client] if profile}
-            }
-        return self._plan
+        partition = balancers[self.location]["F5"]["partition"]
+        ports = self.lbr_wrp.get_ports_config(entrypoint=self.entrypoint)
+        nodes = [{'name': name} for name in self.endpoints]
+        pool_name = self.lbr_wrp.get_pool_name(nodes=nodes, ports=ports, port=self.port)
+        return {
+            'name': self.name,
+            'partition': partition,
+            'destination': self.ip,
+            'port': str(self.port),
+            'pool': pool_name,
+            'profiles': {profile for profile in [self.ssl_profile_client, self.http_profile_client] if profile}
+        }
 
-    @property
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.virtual_server
-        return self._state
+        return self.virtual_server
 
     @property
     def siblings(self):
@@ -126,12 +161,20 @@ class VirtualServerF5(VirtualServer):
             pool_name = self.plan['pool']
             port_config = self.lbr_wrp.get_port_config(entrypoint=self.entrypoint, port=self.port)
             monitor = self.lbr_wrp.get_healthcheck_by_entrypoint(entrypoint=self.entrypoint)
-            self._siblings[pool_name] = PoolF5(name=pool_name, location=self.location, endpoints=self.endpoints,
+            self._siblings[pool_name] = shared(PoolF5, name=pool_name, location=self.location, endpoints=self.endpoints,
                                                monitor=monitor, port_config=port_config)
         return self._siblings
 
 
 class VirtualServerA10(VirtualServer):
+    vendor = "A10"
+    state_attributes = VirtualServer.state_attributes + ('virtual_server',)
+    schema = {'name': normalize.name, 'ip': normalize.address, 'ports': normalize.ports}
+    # Added ports are created by the siblings, see update()
+    mutable_fields = ('ports',)
+    # Ports are patched once the virtual server exists, and deleted before it, whatever the result
+    patch_dependency = (SELF_FIRST, AFTER)
+    delete_dependency = (SIBLINGS_FIRST, AFTER)
 
     @property
     def lbr(self):
@@ -139,18 +182,24 @@ class VirtualServerA10(VirtualServer):
             self._lbr = self.lbr_wrp.a10
         return self._lbr
 
-    @property
+    @lazy
     @log(logger)
     def virtual_server(self):
-        if not self._virtual_server:
-            item = self.lbr.get_virtual_server(name=self.name)
-            if item:
-                self._virtual_server = {
-                    'name': item['name'],
-                    'ip': item['ip-address'],
-                    'ports': sorted([port['port-number'] for port in item.get('port-list', [])])
-                }
-        return self._virtual_server
+        return self._parse_virtual_server(self.lbr.get_virtual_server(name=self.name))
+
+    @staticmethod
+    def _parse_virtual_server(item: dict) -> dict:
+        if not item:
+            return dict()
+        return {
+            'name': item['name'],
+            'ip': item['ip-address'],
+            'ports': sorted([port['port-number'] for port in item.get('port-list', [])])
+        }
+
+    def hydrate(self) -> bool:
+        self.virtual_server = self._parse_virtual_server(self.lbr.catalog.get_virtual(name=self.name))
+        return self._hydrated_state()
 
     def validate_plan(self):
         if not self.plan['ports']:
@@ -167,50 +216,78 @@ class VirtualServerA10(VirtualServer):
     def validate_state(self):
         return True
 
-    def global_patch(self):
-        return {
-            self.__class__.__name__: {
-                'patched': self.patch(),
-                'siblings': self._get_siblings_data('patch')
-            }
-        }
-
-    def global_delete(self):
-        siblings_data = self._get_siblings_data('delete')
-        self_deleted = self.delete()
-
-        return {
-            self.__class__.__name__: {
-                'deleted': self_deleted,
-                'siblings': siblings_data
-            }
-        }
-
     def create(self) -> bool:
         logger.log.info(f"Create virtual server: {{'name': {self.plan['name']}, 'ip': {self.plan['ip']}}}")
         return bool(self.lbr.create_virtual_server(name=self.plan['name'], ip=self.plan['ip']))
 
+    def update(self) -> bool:
+        """Ports which are not planned anymore are deleted, the rest of the virtual server is kept"""
+        removed = {str(port) for port in self.diff['ports'].removed}
+        ports = [port for port in (self.lbr.get_virtual_server(name=self.name) or {}).get('port-list', [])
+                 if str(port['port-number']) in removed]
+        logger.log.info(f"Delete virtual server {self.name} ports: {[port['port-number'] for port in ports]}")
+        for port in ports:
+            self.lbr.delete_virtual_port(virtual_server=self.name, port=port['port-number'], protocol=port['protocol'])
+        return True
+
     def delete(self) -> bool:
         logger.log.info(f"Delete virtual server: {self.name}")
         response = self.lbr.delete_virtual_server(name=self.name)
         return True if response['status'] == "OK" else False
 
-    @property
+    @lazy
     def plan(self):
-        if not self._plan:
-            ports = self.lbr_wrp.get_ports_config(entrypoint=self.entrypoint)
-            self._plan = {
-                'name': self.name,
-                'ip': self.ip,
-                'ports': sorted([item['port'] for item in ports])
-            }
-        return self._plan
+        ports = self.lbr_wrp.get_ports_config(entrypoint=self.entrypoint)
+        return {
+            'name': self.name,
+            'ip': self.ip,
+            'ports': sorted([item['port'] for item in ports])
+        }
 
-    @property
+    @lazy
     def state(self):
-        if not self._state:
-            self._state = self.virtual_server
-        return self._state
+        return self.virtual_server
+
+    def _prepare_siblings(self, name: str):
+        """Missing ports are created with one port-list request, together with their missing service groups
+        and servers. Whatever fails here is left to the own patch of the object.
+        """
+        if name != 'patch' or not self.state:
+            return
+        ports = [port for port in self.siblings.values() if port.validate_plan() and not port.state]
+        if len(ports) < 2:
+            return
+        # Ports may share a group and groups a server, every copy takes the state of the created one
+        groups = [group for port in ports for group in port.siblings.values() if group.validate_plan() and not group.state]
+        servers = [server for group in groups for server in group.siblings.values()
+                   if server.validate_plan() and not server.state]
+        if servers:
+            create_servers(self.lbr, list({server.name: server for server in servers}.values()), copies=servers)
+        if groups:
+            unique = list({group.name: group for group in groups}.values())
+            logger.log.info(f"Create service groups: {[group.plan for group in unique]}")
+            results = self.lbr.create_groups([
+                {'name': group.plan['name'], 'members': group.plan['member-list'],
+                 'health_check': group.plan['health-check']}
+                for group in unique
+            ])
+            for group in groups:
+                result = results.get(group.name)
+                if result and not isinstance(result, Exception):
+                    group.set_service_group(result)
+        ports = [port for port in ports if all(group.state for group in port.siblings.values())]
+        if not ports:
+            return
+        logger.log.info(f"Create virtual server {self.name} ports: {[port.plan for port in ports]}")
+        results = self.lbr.create_virtual_ports(self.name, [
+            {'port': port.plan['port-number'], 'protocol': port.plan['protocol'], 'group': port.plan['service-group'],
+             'template_http': port.plan['template-http'], 'client_ssl': port.plan['client-ssl']}
+            for port in ports
+        ])
+        for port in ports:
+            result = results.get(f"{port.plan['port-number']}+{port.plan['protocol']}")
+            if result and not isinstance(result, Exception):
+                port.set_virtual_port(result)
 
     @property
     def siblings(self):
@@ -0,0 +1,52 @@
+"""Micro-benchmark of differ.diff against jsondiff on plan / state shapes
+
+Run: python -m tests.bench_differ
+"""
+import timeit
+
+from jsondiff import diff as jsondiff
+
+from libs.differ import diff
+
+SIZES = [10, 100, 250]
+
+
+def get_pool(size: int, first: int = 0) -> dict:
+    return {
+        'name': 'lem01-t01-pwr_8082',
+        'monitor': 'tcp',
+        'members': [f'lem01-t01-pwr{i:03}:8082' for i in range(first, first + size)]
+    }
+
+
+def get_service_group(size: int, first: int = 0) -> dict:
+    return {
+        'name': 'lem01-t01-pwr_8082',
+        'health-check': 'http_pwr',
+        'member-list': [{'name': f'lem01-t01-pwr{i:03}', 'port': 8082} for i in range(first, first + size)]
+    }
+
+
+def get_cases() -> list[tuple[str, dict, dict]]:
+    cases = [(
+        'virtual unchanged',
+        {'name': 'api-lab_443', 'destination': '10.62.9.123', 'port': '443', 'profiles': {'http', 'star.lab'}},
+        {'name': 'api-lab_443', 'destination': '10.62.9.123', 'port': '443', 'profiles': {'http', 'star.lab'}},
+    )]
+    for size in SIZES:
+        cases.append((f'pool {size} unchanged', get_pool(size), get_pool(size)))
+        cases.append((f'pool {size} scale-out', get_pool(size), get_pool(size + 1)))
+        cases.append((f'group {size} replaced', get_service_group(size), get_service_group(size, first=1)))
+    return cases
+
+
+def main(number: int = 200) -> None:
+    print(f"{'case':<24} {'jsondiff, ms':>14} {'differ, ms':>12} {'speedup':>9}")
+    for name, state, plan in get_cases():
+        reference = timeit.timeit(lambda: jsondiff(state, plan, syntax='symmetric'), number=number) / number * 1000
+        ours = timeit.timeit(lambda: diff(state, plan), number=number) / number * 1000
+        print(f"{name:<24} {reference:>14.4f} {ours:>12.4f} {reference / ours:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,84 @@
+import asyncio
+import copy
+
+import httpx
 import pytest
 
+from libs.model_base import Base
+
+
+class Item(Base):
+    """Model object with fixed siblings, records the methods run on it"""
+    vendor = 'F5'
+
+    def __init__(self, name: str, location: str = 'AMS02', children: tuple = ()) -> None:
+        super().__init__()
+        self.name = name
+        self.location = location.upper()
+        self.children = children
+        self.calls = []
+
+    @property
+    def siblings(self):
+        if not self._siblings:
+            self._siblings = {child.name: child for child in self.children}
+        return self._siblings
+
+    def _apply(self, method: str) -> bool:
+        self.calls.append(method)
+        return True
+
+    def patch(self):
+        return self._apply('patch')
+
+    def delete(self):
+        return self._apply('delete')
+
+
+class Fetcher:
+    """Collection fetch function of a snapshot / catalog, counts the reads"""
+
+    def __init__(self, items: list) -> None:
+        self.items = items
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.items
+
+
+@pytest.fixture
+def fetchers(request):
+    """fetch_<name> functions over a copy of the `collections` dict of the test module"""
+    return {f'fetch_{name}': Fetcher(copy.deepcopy(items)) for name, items in request.module.collections.items()}
+
+
+class Device:
+    """Balancer REST API for httpx.MockTransport, counts the requests in flight.
+    Subclasses answer logins and rejected tokens in authenticate(), other requests in respond().
+    """
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if (response := self.authenticate(request)) is not None:
+            return response
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return self.respond(request)
+
+    def authenticate(self, request: httpx.Request) -> httpx.Response:
+        return None
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        raise NotImplementedError
+
 
 @pytest.fixture(scope="module")
 def dns_data() -> dict:
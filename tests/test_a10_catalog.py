@@ -0,0 +1,98 @@
+import pytest
+
+from libs.a10_catalog import A10Catalog
+
+
+collections = {
+    'servers': [
+        {'name': 'lem01-t01-psr01', 'host': '10.61.101.133'},
+        {'name': 'lem01-t01-psr02', 'host': '10.61.101.134'},
+    ],
+    'groups': [
+        {'name': 'lem01-t01-psr_8082', 'member-list': [
+            {'name': 'lem01-t01-psr01', 'port': 8082},
+            {'name': 'lem01-t01-psr02', 'port': 8082},
+        ]},
+        {'name': 'lem01-t01-psr_8083', 'member-list': [
+            {'name': 'lem01-t01-psr01', 'port': 8083},
+        ]},
+    ],
+    'virtuals': [
+        {'name': 'api-lablemams', 'ip-address': '10.62.9.123', 'port-list': [
+            {'port-number': 443, 'protocol': 'https', 'service-group': 'lem01-t01-psr_8082'},
+            {'port-number': 80, 'protocol': 'http', 'service-group': 'lem01-t01-psr_8082'},
+        ]},
+    ],
+}
+
+
+@pytest.fixture
+def catalog(fetchers):
+    return A10Catalog(**fetchers)
+
+
+def test_lazy_loading(catalog, fetchers):
+    assert catalog.get_server('lem01-t01-psr01')['host'] == '10.61.101.133'
+    catalog.get_server_by_ip('10.61.101.134')
+    catalog.servers
+
+    assert fetchers['fetch_servers'].calls == 1
+    assert fetchers['fetch_groups'].calls == 0
+
+    catalog.refresh()
+    catalog.get_server('lem01-t01-psr01')
+    assert fetchers['fetch_servers'].calls == 2
+
+
+def test_indexes(catalog):
+    assert catalog.get_server_by_ip('10.61.101.134')['name'] == 'lem01-t01-psr02'
+    assert catalog.get_server_by_ip('10.61.101.200') is None
+    assert catalog.get_server_references('lem01-t01-psr01') == {'lem01-t01-psr_8082', 'lem01-t01-psr_8083'}
+    assert catalog.get_group_ports('lem01-t01-psr_8082') == {('api-lablemams', 443, 'https'), ('api-lablemams', 80, 'http')}
+    assert catalog.get_group_references('lem01-t01-psr_8082') == {'api-lablemams'}
+    assert catalog.get_group_references('lem01-t01-psr_8083') == set()
+    assert catalog.get_virtual_by_ip('10.62.9.123')['name'] == 'api-lablemams'
+
+
+def test_server_updates(catalog):
+    catalog.servers
+    catalog.add_server({'name': 'lem01-t01-psr01', 'host': '10.61.101.135'})
+    assert catalog.get_server_by_ip('10.61.101.133') is None
+    assert catalog.get_server_by_ip('10.61.101.135')['name'] == 'lem01-t01-psr01'
+
+    catalog.remove_server('lem01-t01-psr01')
+    assert catalog.get_server('lem01-t01-psr01') is None
+
+
+def test_group_updates(catalog):
+    catalog.groups
+    catalog.add_group({'name': 'lem01-t01-psr_8084', 'member-list': [{'name': 'lem01-t01-psr02', 'port': 8084}]})
+    assert catalog.get_server_references('lem01-t01-psr02') == {'lem01-t01-psr_8082', 'lem01-t01-psr_8084'}
+
+    catalog.remove_group('lem01-t01-psr_8082')
+    assert catalog.get_server_references('lem01-t01-psr01') == {'lem01-t01-psr_8083'}
+    assert catalog.get_server_references('lem01-t01-psr02') == {'lem01-t01-psr_8084'}
+
+
+def test_virtual_port_updates(catalog):
+    catalog.virtuals
+    catalog.add_virtual_port('api-lablemams', {'port-number': 8443, 'protocol': 'https', 'service-group': 'lem01-t01-psr_8083'})
+    assert catalog.get_group_references('lem01-t01-psr_8083') == {'api-lablemams'}
+
+    catalog.remove_virtual_port('api-lablemams', '443', 'https')
+    catalog.remove_virtual_port('api-lablemams', 80, 'http')
+    assert catalog.get_group_references('lem01-t01-psr_8082') == set()
+    assert len(catalog.get_virtual('api-lablemams')['port-list']) == 1
+
+    catalog.remove_virtual('api-lablemams')
+    assert catalog.get_group_references('lem01-t01-psr_8083') == set()
+    assert catalog.get_virtual_by_ip('10.62.9.123') is None
+
+
+def test_updates_before_loading(catalog):
+    catalog.add_server({'name': 'lem01-t01-psr03', 'host': '10.61.101.135'})
+    catalog.remove_group('lem01-t01-psr_8082')
+
+    assert not catalog.is_loaded('server')
+    assert catalog.get_server('lem01-t01-psr03') is None
+    assert catalog.get_group('lem01-t01-psr_8082')
@@ -0,0 +1,151 @@
+"""A10Manager behaviour which does not need a live device, see test_a10_wrapper.py for the rest"""
+import pytest
+from acos_client.errors import ACOSException
+from acos_client.errors import AddressSpecifiedIsInUse
+from acos_client.errors import Exists
+from acos_client.errors import InvalidSessionID
+
+from libs.a10_wrapper import A10Manager
+from libs.token_cache import TokenCache
+
+
+@pytest.fixture
+def a10(mocker):
+    mocker.patch('libs.a10_wrapper.acos.Client')
+    return A10Manager(address='a10.mydomain', user='user', password='password')
+
+
+def test_create_servers(a10):
+    a10.mgmt.session.session_id = 'signature'
+    a10.mgmt.session.http.request.return_value = {'server-list': [
+        {'name': 'lem01-t01-psr01', 'host': '10.61.101.133', 'action': 'enable'},
+        {'name': 'lem01-t01-psr02', 'host': '10.61.101.134', 'action': 'enable'},
+    ]}
+    results = a10.create_servers([{'name': 'lem01-t01-psr01', 'ip': '10.61.101.133'},
+                                  {'name': 'lem01-t01-psr02', 'ip': '10.61.101.134'}])
+
+    assert results['lem01-t01-psr02']['host'] == '10.61.101.134'
+    a10.mgmt.session.http.request.assert_called_once_with('POST', '/axapi/v3/slb/server/', {'server-list': [
+        {'name': 'lem01-t01-psr01', 'host': '10.61.101.133', 'action': 'enable'},
+        {'name': 'lem01-t01-psr02', 'host': '10.61.101.134', 'action': 'enable'},
+    ]}, {'Authorization': 'A10 signature'})
+    a10.mgmt.slb.server.create.assert_not_called()
+
+
+def test_create_servers_errors(a10):
+    a10.mgmt.session.http.request.side_effect = ACOSException()
+    a10.mgmt.slb.server.create.side_effect = [
+        {'server': {'name': 'lem01-t01-psr01', 'host': '10.61.101.133'}},
+        Exists(),
+        AddressSpecifiedIsInUse(),
+    ]
+    results = a10.create_servers([{'name': 'lem01-t01-psr01', 'ip': '10.61.101.133'},
+                                  {'name': 'lem01-t01-psr02', 'ip': '10.61.101.134'},
+                                  {'name': 'lem01-t01-psr03', 'ip': '10.61.101.135'}])
+
+    assert results['lem01-t01-psr01'] == {'name': 'lem01-t01-psr01', 'host': '10.61.101.133'}
+    assert isinstance(results['lem01-t01-psr02'], Exists)
+    assert isinstance(results['lem01-t01-psr03'], AddressSpecifiedIsInUse)
+
+
+def test_delete_servers(a10):
+    a10.mgmt.slb.server.delete.side_effect = [{'response': {'status': 'OK'}}, ACOSException()]
+    results = a10.delete_servers(['lem01-t01-psr01', 'lem01-t01-psr02'])
+
+    assert results['lem01-t01-psr01'] == {'status': 'OK'}
+    assert isinstance(results['lem01-t01-psr02'], ACOSException)
+    assert a10.mgmt.slb.server.delete.call_count == 2
+
+
+def test_create_groups(a10):
+    a10.mgmt.session.session_id = 'signature'
+    a10.mgmt.session.http.request.return_value = {}
+    results = a10.create_groups([{'name': 'lem01-t01-psr_80', 'members': [{'name': 'lem01-t01-psr01', 'port': 80}]},
+                                 {'name': 'lem01-t01-psr_443', 'health_check': 'http_psr'}])
+
+    assert results['lem01-t01-psr_443'] == {'name': 'lem01-t01-psr_443', 'protocol': 'tcp', 'health-check': 'http_psr'}
+    a10.mgmt.session.http.request.assert_called_once_with('POST', '/axapi/v3/slb/service-group/', {
+        'service-group-list': [
+            {'name': 'lem01-t01-psr_80', 'protocol': 'tcp', 'health-check': 'tcp',
+             'member-list': [{'name': 'lem01-t01-psr01', 'port': 80}]},
+            {'name': 'lem01-t01-psr_443', 'protocol': 'tcp', 'health-check': 'http_psr'},
+        ]}, {'Authorization': 'A10 signature'})
+
+
+def test_create_virtual_ports(a10):
+    a10.mgmt.session.session_id = 'signature'
+    a10.mgmt.session.http.request.return_value = {}
+    results = a10.create_virtual_ports('api-lablemams', [
+        {'port': 443, 'protocol': 'https', 'group': 'lem01-t01-psr_80',
+         'template_http': 'rc-xffxfp-https', 'client_ssl': 'star.mydomain'},
+        {'port': '80', 'protocol': 'http', 'group': 'lem01-t01-psr_80', 'template_http': 'rc-xffxfp-http'},
+    ])
+
+    assert list(results) == ['443+https', '80+http']
+    assert results['80+http'] == {
+        'name': 'api-lablemams:80@lem01-t01-psr_80', 'port-number': 80, 'protocol': 'http',
+        'service-group': 'lem01-t01-psr_80', 'auto': 1, 'use-rcv-hop-for-resp': 1, 'template-http': 'rc-xffxfp-http'
+    }
+    assert a10.mgmt.session.http.request.call_count == 1
+    assert a10.mgmt.session.http.request.call_args[0][1] == '/axapi/v3/slb/virtual-server/api-lablemams/port/'
+
+
+def test_add_group_members_async_fallback(a10, mocker):
+    a10.async_client, a10._axapi = True, mocker.Mock()
+    a10.axapi.run.side_effect = [ACOSException(), {'name': 'lem01-t01-psr01', 'port': 80}]
+    results = a10.add_group_members('lem01-t01-psr_80', [{'name': 'lem01-t01-psr01', 'port': '80'}])
+
+    assert results == {'lem01-t01-psr01:80': {'name': 'lem01-t01-psr01', 'port': 80}}
+    a10.axapi.create_group_member.assert_called_once_with(name='lem01-t01-psr_80', member='lem01-t01-psr01', port=80)
+    a10.mgmt.slb.service_group.member.create.assert_not_called()
+
+
+def test_session_request_invalid_session(a10):
+    session = a10.mgmt.session
+    session.session_id = 'expired'
+    session.http.post.return_value = {'authresponse': {'signature': 'signature'}}
+    session.http.request.side_effect = [InvalidSessionID(), {'server-list': []}]
+
+    assert session.request('POST', '/slb/server/', {'server-list': []}) == {'server-list': []}
+    assert session.http.request.call_args[0][3] == {'Authorization': 'A10 signature'}
+
+
+def test_session_token_cache(mocker, tmp_path):
+    mocker.patch('libs.a10_wrapper.acos.Client')
+    token_cache = TokenCache(str(tmp_path / 'tokens.json'))
+    signatures = iter(['signature1', 'signature2'])
+    for _ in range(2):
+        a10 = A10Manager(address='a10.mydomain', user='user', password='password', token_cache=token_cache)
+        a10.mgmt.session.http.post.side_effect = (
+            lambda url, *args, **kwargs: {'authresponse': {'signature': next(signatures)}} if url.endswith('/auth') else {}
+        )
+        assert a10.mgmt.session.id == 'signature1'
+    assert a10.logins == 0
+
+    # acos_client closes a session the device rejected before it authenticates again
+    a10.mgmt.session.close()
+    assert a10.mgmt.session.id == 'signature2'
+    assert a10.logins == 1
+    assert token_cache.get('a10.mydomain', 'user')[0] == 'signature2'
+
+
+def test_delete_group_members(a10):
+    a10.mgmt.slb.service_group.member.delete.side_effect = [{'response': {'status': 'OK'}}, ACOSException()]
+    results = a10.delete_group_members('lem01-t01-psr_80', [{'name': 'lem01-t01-psr01', 'port': '80'},
+                                                            {'name': 'lem01-t01-psr02', 'port': 80}])
+
+    assert results['lem01-t01-psr01:80'] == {'status': 'OK'}
+    assert isinstance(results['lem01-t01-psr02:80'], ACOSException)
+    a10.mgmt.slb.service_group.member.delete.assert_any_call('lem01-t01-psr_80', 'lem01-t01-psr01', 80)
+
+
+def test_replace_virtual_port(a10):
+    a10.mgmt.slb.virtual_server.vport.replace.return_value = {'port': {'port-number': 443, 'protocol': 'https'}}
+    port = a10.replace_virtual_port('api-lablemams', 443, 'https', 'lem01-t01-psr_80', client_ssl='star.mydomain')
+
+    assert port == {'port-number': 443, 'protocol': 'https'}
+    kwargs = a10.mgmt.slb.virtual_server.vport.replace.call_args.kwargs
+    assert kwargs['name'] == 'api-lablemams:443@lem01-t01-psr_80'
+    assert kwargs['service_group_name'] == 'lem01-t01-psr_80'
+    assert kwargs['template_client_ssl'] == 'star.mydomain'
+    a10.mgmt.slb.virtual_server.vport.delete.assert_not_called()
@@ -0,0 +1,182 @@
+import time
+
+import pytest
+
+from libs.apply_engine import AFTER
+from libs.apply_engine import ApplyEngine
+from libs.apply_engine import REQUIRES
+from libs.apply_engine import SELF_FIRST
+from libs.apply_engine import SIBLINGS_FIRST
+from libs.device_limiter import limiter
+from tests import conftest
+
+
+class Item(conftest.Item):
+    def __init__(self, name: str, children: list = (), fail: bool = False, error: Exception = None) -> None:
+        super().__init__(name, children=children)
+        self.fail = fail
+        self.error = error
+
+    def _apply(self, method: str):
+        time.sleep(0.02)
+        super()._apply(method)
+        events.append((method, self.name))
+        if self.error:
+            raise self.error
+        return not self.fail
+
+
+class Pool(Item):
+    pass
+
+
+class Virtual(Item):
+    pass
+
+
+class ReferencedPool(Pool):
+    """Can not be deleted while one of its virtuals still exists"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.virtuals = []
+
+    def delete(self):
+        if any('delete' not in virtual.calls for virtual in self.virtuals):
+            return False
+        return super().delete()
+
+
+class Entry(Item):
+    vendor = None
+    patch_dependency = (SELF_FIRST, REQUIRES)
+    delete_dependency = (SIBLINGS_FIRST, AFTER)
+
+
+events = []
+
+
+@pytest.fixture(autouse=True)
+def settings(mocker):
+    settings = {'SIBLINGS_CONCURRENCY': 1, 'DEVICE_CONCURRENCY': 4}
+    mocker.patch('libs.apply_engine.get_ff', side_effect=settings.get)
+    limiter.reset()
+    events.clear()
+    return settings
+
+
+def tree(**kwargs):
+    nodes = [Item(f'node{i}', **kwargs.get(f'node{i}', {})) for i in range(3)]
+    pool = Pool('pool', children=nodes, **kwargs.get('pool', {}))
+    virtuals = [Virtual(f'virtual_{port}', children=[pool], **kwargs.get(f'virtual_{port}', {})) for port in (80, 443)]
+    return Entry('entry', children=virtuals, **kwargs.get('entry', {}))
+
+
+def test_patch_order():
+    entry = tree()
+    result = ApplyEngine(entry, 'patch').run()
+
+    assert events == [('patch', 'entry'), ('patch', 'node0'), ('patch', 'node1'), ('patch', 'node2'),
+                      ('patch', 'pool'), ('patch', 'virtual_80'), ('patch', 'virtual_443')]
+    pool = {'Pool': {'patched': True, 'siblings': {f'node{i}': {'Item': {'patched': True, 'siblings': {}}} for i in range(3)}}}
+    assert result == {'Entry': {'patched': True, 'siblings': {
+        'virtual_80': {'Virtual': {'patched': True, 'siblings': {'pool': pool}}},
+        'virtual_443': {'Virtual': {'patched': True, 'siblings': {'pool': pool}}},
+    }}}
+
+
+def test_delete_order():
+    ApplyEngine(tree(), 'delete').run()
+
+    assert events == [('delete', 'virtual_80'), ('delete', 'virtual_443'), ('delete', 'pool'), ('delete', 'node0'),
+                      ('delete', 'node1'), ('delete', 'node2'), ('delete', 'entry')]
+
+
+def test_patch_failure():
+    entry = tree(node1={'fail': True})
+    result = ApplyEngine(entry, 'patch').run()
+
+    assert ('patch', 'pool') not in events and ('patch', 'virtual_80') not in events
+    virtual = result['Entry']['siblings']['virtual_80']['Virtual']
+    assert virtual['patched'] is False
+    assert virtual['siblings']['pool']['Pool']['siblings']['node1']['Item']['patched'] is False
+    assert virtual['siblings']['pool']['Pool']['siblings']['node2']['Item']['patched'] is True
+
+
+def test_self_first_failure():
+    result = ApplyEngine(tree(entry={'fail': True}), 'patch').run()
+
+    assert events == [('patch', 'entry')]
+    assert result == {'Entry': {'patched': False, 'siblings': {}}}
+
+
+def test_delete_failure():
+    result = ApplyEngine(tree(pool={'fail': True}), 'delete').run()
+
+    # Nodes are not deleted while the pool still exists, the entry goes anyway
+    assert [name for _, name in events] == ['virtual_80', 'virtual_443', 'pool', 'entry']
+    assert result['Entry']['deleted'] is True
+    assert result['Entry']['siblings']['virtual_80']['Virtual']['siblings']['pool'] == {
+        'Pool': {'deleted': False, 'siblings': {}}
+    }
+
+
+def test_error():
+    entry = tree(virtual_80={'error': ValueError('boom')})
+
+    with pytest.raises(ValueError):
+        ApplyEngine(entry, 'delete').run()
+    assert ('delete', 'virtual_443') in events
+    assert ('delete', 'entry') not in events
+
+
+def test_shared_object_applied_once():
+    entry = tree()
+    ApplyEngine(entry, 'patch').run()
+
+    pool = entry.siblings['virtual_80'].siblings['pool']
+    assert pool.calls == ['patch']
+    assert [name for _, name in events].count('node0') == 1
+
+
+def test_shared_delete_concurrency(settings, mocker):
+    settings['SIBLINGS_CONCURRENCY'] = 8
+    pool = ReferencedPool('pool', children=[Item(f'node{i}') for i in range(3)])
+    virtual_80, virtual_443 = pool.virtuals = [Virtual(f'virtual_{port}', children=[pool]) for port in (80, 443)]
+    # The pool is compiled once virtual_80 is done, while virtual_443 still uses it
+    delete = virtual_443.delete
+    mocker.patch.object(virtual_443, 'delete', side_effect=lambda: time.sleep(0.1) or delete())
+    result = ApplyEngine(Entry('entry', children=[virtual_80, virtual_443]), 'delete').run()
+
+    names = [name for _, name in events]
+    assert pool.calls == ['delete']
+    assert names.index('virtual_443') < names.index('pool') < min(names.index(f'node{i}') for i in range(3))
+    assert names[-1] == 'entry'
+    assert result['Entry']['siblings']['virtual_80']['Virtual']['siblings']['pool']['ReferencedPool']['deleted'] is True
+
+
+def test_concurrency(settings):
+    settings['SIBLINGS_CONCURRENCY'] = 8
+    nodes = [Item(f'node{i}') for i in range(8)]
+    started = time.time()
+    engine = ApplyEngine(Pool('pool', children=nodes), 'patch')
+    result = engine.run()
+
+    assert time.time() - started < 8 * 0.02
+    assert list(result['Pool']['siblings']) == [f'node{i}' for i in range(8)]
+    assert events[-1] == ('patch', 'pool')
+    assert {operation.status for operation in engine.operations.values()} == {'done'}
+
+
+def test_select_and_reset():
+    entry = tree()
+    engine = ApplyEngine(entry, 'patch')
+    engine.run(select=lambda operation: operation.obj is entry)
+    assert events == [('patch', 'entry')]
+    assert engine.succeeded(entry)
+
+    engine.run()
+    engine.reset(select=lambda operation: operation.obj is not entry)
+    engine.run()
+    assert [name for _, name in events].count('entry') == 1
+    assert [name for _, name in events].count('pool') == 2
@@ -0,0 +1,103 @@
+import httpx
+import pytest
+from acos_client.errors import Exists
+
+from libs.a10_wrapper import A10Manager
+from libs.axapi_client import AxapiClient
+from libs.token_cache import TokenCache
+from tests import conftest
+
+
+class Device(conftest.Device):
+    """aXAPI handler for httpx.MockTransport"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.signatures = 0
+
+    @property
+    def calls(self) -> list:
+        return [(request.method, request.url.path.removeprefix('/axapi/v3')) for request in self.requests]
+
+    def authenticate(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/axapi/v3/auth':
+            self.signatures += 1
+            return httpx.Response(200, json={'authresponse': {'signature': f'signature{self.signatures}'}})
+        if request.headers['Authorization'] != f'A10 signature{self.signatures}':
+            return httpx.Response(401, json={'response': {'status': 'fail', 'err': {'code': 419495936, 'msg': 'Invalid'}}})
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix('/axapi/v3')
+        if path == '/slb/server/lem01-t01-psr01':
+            return httpx.Response(200, json={'server': {'name': 'lem01-t01-psr01', 'host': '10.61.101.133'}})
+        if path == '/slb/server/' and request.method == 'POST':
+            return httpx.Response(400, json={'response': {'status': 'fail', 'err': {'code': 67371011, 'msg': 'Exists'}}})
+        if path.endswith('/oper'):
+            return httpx.Response(200, json={'virtual-server': {'oper': {'state': 'All Up'}}})
+        return httpx.Response(404, json={'response': {'status': 'fail', 'err': {'code': 520749062, 'msg': 'Not found'}}})
+
+
+@pytest.fixture
+def device():
+    return Device()
+
+
+@pytest.fixture
+def client(device):
+    return AxapiClient('a10.mydomain', 'user', 'password', concurrency=2, transport=httpx.MockTransport(device))
+
+
+def test_get(client, device):
+    assert client.run(client.get_server('lem01-t01-psr01')) == {'name': 'lem01-t01-psr01', 'host': '10.61.101.133'}
+    assert client.run(client.get_server('lem01-t01-psr02')) == {}
+    assert device.calls.count(('POST', '/auth')) == 1
+
+
+def test_errors(client):
+    with pytest.raises(Exists):
+        client.run(client.create_server('lem01-t01-psr01', '10.61.101.133'))
+
+
+def test_reauthenticate(client, device):
+    client.run(client.get_server('lem01-t01-psr01'))
+    device.signatures += 1
+
+    assert client.run(client.get_server('lem01-t01-psr01'))
+    assert device.calls.count(('POST', '/auth')) == 2
+
+
+def test_token_cache(device, tmp_path):
+    token_cache = TokenCache(str(tmp_path / 'tokens.json'))
+    for _ in range(3):
+        client = AxapiClient('a10.mydomain', 'user', 'password', transport=httpx.MockTransport(device), token_cache=token_cache)
+        client.run(client.get_server('lem01-t01-psr01'))
+        client.run(client.close())
+    assert device.calls.count(('POST', '/auth')) == 1
+    assert ('POST', '/logoff') not in device.calls
+
+    # Cached session expired on the device
+    device.signatures += 1
+    client = AxapiClient('a10.mydomain', 'user', 'password', transport=httpx.MockTransport(device), token_cache=token_cache)
+    assert client.run(client.get_server('lem01-t01-psr01'))
+    assert device.calls.count(('POST', '/auth')) == 2
+    assert token_cache.get('a10.mydomain', 'user')[0] == 'signature3'
+
+
+def test_concurrency(client, device):
+    names = [f'api-lablemams{i}' for i in range(6)]
+    states = client.run(client.gather(client.get_virtual_server_oper(name) for name in names))
+
+    assert len(states) == 6
+    assert device.max_in_flight == 2
+
+
+def test_a10_manager_delegation(device, mocker):
+    acos = mocker.patch('libs.a10_wrapper.acos.Client')
+    a10 = A10Manager(address='a10.mydomain', user='user', password='password', async_client=True)
+    a10.axapi.transport = httpx.MockTransport(device)
+
+    assert a10.get_server(name='lem01-t01-psr01')['host'] == '10.61.101.133'
+    assert a10.get_virtual_server_state(name='api-lablemams') == 'All Up'
+    assert a10.get_virtual_server_state(name='intapi-lablemams') == 'All Up'
+    assert a10.logins == 1
+    acos.assert_not_called()
@@ -0,0 +1,80 @@
+import pytest
+
+from libs.differ import ADDED
+from libs.differ import CHANGED
+from libs.differ import Change
+from libs.differ import diff
+from libs.differ import REMOVED
+from tests import conftest
+
+pool_state = {'name': 'lem01-t01-pwr_8082', 'monitor': 'tcp', 'members': ['lem01-t01-pwr01:8082', 'lem01-t01-pwr02:8082']}
+
+
+def test_equal():
+    result = diff(pool_state, dict(pool_state))
+    assert result == {}
+    assert not result
+
+
+@pytest.mark.parametrize(
+    ("state", "plan", "expected"),
+    [
+        ({}, {'name': 'node'}, {'name': Change(kind=ADDED, new='node')}),
+        (None, {'name': 'node'}, {'name': Change(kind=ADDED, new='node')}),
+        ({'name': 'node'}, {}, {'name': Change(kind=REMOVED, old='node')}),
+        ({'ip': '1.1.1.1'}, {'ip': '1.1.1.2'}, {'ip': Change(kind=CHANGED, old='1.1.1.1', new='1.1.1.2')}),
+        ({'port': 443}, {'port': '443'}, {'port': Change(kind=CHANGED, old=443, new='443')}),
+    ]
+)
+def test_fields(state, plan, expected):
+    assert diff(state, plan) == expected
+
+
+def test_members():
+    plan = dict(pool_state, members=['lem01-t01-pwr02:8082', 'lem01-t01-pwr03:8082'])
+    result = diff(pool_state, plan)
+    assert list(result) == ['members']
+    assert result['members'].added == ('lem01-t01-pwr03:8082',)
+    assert result['members'].removed == ('lem01-t01-pwr01:8082',)
+
+
+def test_members_order():
+    plan = dict(pool_state, members=list(reversed(pool_state['members'])))
+    result = diff(pool_state, plan)
+    assert result['members'].added == result['members'].removed == ()
+
+
+def test_member_dicts():
+    state = {'member-list': [{'name': 'pwr01', 'port': 8082}, {'name': 'pwr02', 'port': 8082}]}
+    plan = {'member-list': [{'name': 'pwr01', 'port': 8082}, {'name': 'pwr03', 'port': 8082}]}
+    result = diff(state, plan)
+    assert result['member-list'].added == ({'name': 'pwr03', 'port': 8082},)
+    assert result['member-list'].removed == ({'name': 'pwr02', 'port': 8082},)
+
+
+def test_profiles():
+    result = diff({'profiles': {'http', 'star.lab'}}, {'profiles': {'http'}})
+    assert result['profiles'].removed == ('star.lab',)
+
+
+def test_nested():
+    state = {'dns': {'fqdn': 'api-lab.mydomain', 'ips': {'A': ['1.1.1.1'], 'CNAME': []}}}
+    plan = {'dns': {'fqdn': 'api-lab.mydomain', 'ips': {'A': ['1.1.1.2'], 'CNAME': []}}}
+    result = diff(state, plan)
+    assert list(result['dns'].fields) == ['ips']
+    assert result['dns'].fields['ips'].fields['A'].added == ('1.1.1.2',)
+    assert result.to_dict() == {
+        'dns': {'ips': {'A': {'old': ['1.1.1.1'], 'new': ['1.1.1.2'], 'added': ['1.1.1.2'], 'removed': ['1.1.1.1']}}}
+    }
+
+
+class Item(conftest.Item):
+    state = {'name': 'item', 'ip': '1.1.1.1'}
+    plan = {'name': 'item', 'ip': '1.1.1.2'}
+
+
+def test_global_diff(mocker):
+    mocker.patch('libs.model_base.get_ff', return_value=1)
+    assert Item('item').global_diff == {
+        'Item': {'diff': {'ip': {'old': '1.1.1.1', 'new': '1.1.1.2'}}, 'siblings': {}}
+    }
@@ -0,0 +1,268 @@
+"""F5Manager behaviour which does not need a live device, see test_f5_wrapper.py for the rest"""
+import pytest
+from icontrol.exceptions import iControlUnexpectedHTTPError
+
+from libs.f5_snapshot import F5Snapshot
+from libs.f5_wrapper import F5Manager
+
+
+class MockedResponse:
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+
+
+class MockedLoader:
+    def __init__(self, status_code: int = 200) -> None:
+        self.status_code = status_code
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.status_code != 200:
+            raise iControlUnexpectedHTTPError(response=MockedResponse(self.status_code))
+        return kwargs
+
+
+@pytest.fixture
+def f5(mocker):
+    mocker.patch('f5.bigip.ManagementRoot')
+    return F5Manager(address='f5.mydomain', user='user', password='password', partition='ams-up')
+
+
+def test_load_missing_object(f5):
+    loader = MockedLoader(status_code=404)
+
+    assert f5._load('node', loader, name='lem01-t01-pwr01') is None
+    assert loader.calls == 1
+
+
+def test_load_unexpected_error(f5):
+    with pytest.raises(iControlUnexpectedHTTPError):
+        f5._load('node', MockedLoader(status_code=401), name='lem01-t01-pwr01')
+
+
+def test_load_without_memo(f5):
+    loader = MockedLoader()
+    f5._load('node', loader, name='lem01-t01-pwr01')
+    f5._load('node', loader, name='lem01-t01-pwr01')
+
+    assert loader.calls == 2
+
+
+def test_memoized(f5):
+    loader = MockedLoader()
+    with f5.memoized():
+        assert f5._load('node', loader, name='lem01-t01-pwr01') == {'name': 'lem01-t01-pwr01'}
+        f5._load('node', loader, name='lem01-t01-pwr01')
+        f5._load('node', loader, name='lem01-t01-pwr02')
+        assert loader.calls == 2
+
+        F5Manager.forget_reads(lambda self: None)(f5)
+        f5._load('node', loader, name='lem01-t01-pwr01')
+        assert loader.calls == 3
+
+    f5._load('node', loader, name='lem01-t01-pwr01')
+    assert loader.calls == 4
+
+
+def test_virtual_profile_exists(f5, mocker):
+    virtual = mocker.Mock(attrs={'profilesReference': {'items': [
+        {'name': 'rc-xffxfp-https', 'partition': 'Common'},
+        {'name': 'star.mydomain', 'partition': 'ams-up'}
+    ]}})
+    mocker.patch('libs.f5_wrapper.F5Manager.get_virtual_server', return_value=virtual)
+
+    assert f5.virtual_profile_exists(virtual_name='api-lablemams_443', profile_name='rc-xffxfp-https')
+    assert f5.virtual_profile_exists(virtual_name='api-lablemams_443', profile_name='star.mydomain', partition='ams-up')
+    assert not f5.virtual_profile_exists(virtual_name='api-lablemams_443', profile_name='star.mydomain')
+
+
+def test_snapshot_updated_by_writes(f5):
+    f5.mgmt.tm.ltm.nodes.get_collection.return_value = [{'name': 'lem01-t01-pwr01', 'address': '10.61.101.133%1'}]
+    f5.mgmt.tm.ltm.nodes.node.create.return_value = {'name': 'lem01-t01-pwr02', 'address': '10.61.101.134'}
+
+    assert f5.get_node_by_address(address='10.61.101.133') == {'name': 'lem01-t01-pwr01', 'address': '10.61.101.133%1'}
+    f5.create_node(name='lem01-t01-pwr02', address='10.61.101.134')
+
+    assert f5.get_node_by_address(address='10.61.101.134') == {'name': 'lem01-t01-pwr02', 'address': '10.61.101.134'}
+    assert f5.mgmt.tm.ltm.nodes.get_collection.call_count == 1
+    f5.mgmt.tm.ltm.nodes.get_collection.assert_called_with(
+        requests_params={'params': '$filter=partition+eq+ams-up'}
+    )
+
+
+def test_transaction(f5):
+    transaction = f5.mgmt.tm.transactions.transaction.create.return_value
+    transaction.transId = 1700000000
+    with f5.transaction():
+        with f5.transaction():
+            f5.create_node(name='lem01-t01-pwr02', address='10.61.101.134')
+        assert f5.in_transaction
+
+    assert not f5.in_transaction
+    f5.mgmt.tm.transactions.transaction.create.assert_called_once()
+    f5.mgmt.tm.ltm.nodes.node.create.assert_called_with(
+        name='lem01-t01-pwr02', address='10.61.101.134', partition='ams-up', monitor='icmp',
+        requests_params={'headers': {'X-F5-REST-Coordination-Id': '1700000000'}}
+    )
+    transaction.modify.assert_called_once_with(state='VALIDATING', validateOnly=False)
+
+
+def test_transaction_failed(f5, mocker):
+    transaction = f5.mgmt.tm.transactions.transaction.create.return_value
+    refresh = mocker.patch.object(f5, 'refresh')
+    with pytest.raises(ValueError):
+        with f5.transaction():
+            raise ValueError
+
+    transaction.delete.assert_called_once()
+    transaction.modify.assert_not_called()
+    refresh.assert_called_once()
+
+    transaction.modify.side_effect = iControlUnexpectedHTTPError(response=MockedResponse(400))
+    with pytest.raises(iControlUnexpectedHTTPError):
+        with f5.transaction():
+            pass
+    assert refresh.call_count == 2
+    assert transaction.delete.call_count == 2
+
+    transaction.delete.side_effect = iControlUnexpectedHTTPError(response=MockedResponse(404))
+    with pytest.raises(iControlUnexpectedHTTPError) as e:
+        with f5.transaction():
+            pass
+    assert e.value.response.status_code == 400
+
+
+def test_transaction_disabled(f5):
+    with f5.transaction(enabled=False):
+        assert not f5.in_transaction
+        f5.create_node(name='lem01-t01-pwr02', address='10.61.101.134')
+
+    f5.mgmt.tm.transactions.transaction.create.assert_not_called()
+    f5.mgmt.tm.ltm.nodes.node.create.assert_called_with(
+        name='lem01-t01-pwr02', address='10.61.101.134', partition='ams-up', monitor='icmp'
+    )
+
+
+def test_set_pool_members(f5, mocker):
+    pool = mocker.Mock(attrs={'name': 'lem01-t01-pwr_8082', 'membersReference': {'items': [
+        {'name': 'lem01-t01-pwr01:8082'}, {'name': 'lem01-t01-pwr02:8082'}
+    ]}})
+    mocker.patch('libs.f5_wrapper.F5Manager.get_pool', return_value=pool)
+
+    changes = f5.set_pool_members(name='lem01-t01-pwr_8082', members=['lem01-t01-pwr02:8082', 'lem01-t01-pwr03:8082'])
+
+    assert changes == {'added': ['lem01-t01-pwr03:8082'], 'removed': ['lem01-t01-pwr01:8082']}
+    pool.modify.assert_called_once_with(members=[
+        {'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up'},
+        {'name': 'lem01-t01-pwr03:8082', 'partition': 'ams-up'},
+    ])
+    pool.members_s.members.create.assert_not_called()
+
+
+def test_modify_virtual_server(f5, mocker):
+    virtual = mocker.Mock(attrs={
+        'name': 'api-lablemams_443', 'destination': '/ams-up/10.62.9.123%2:443', 'pool': '/ams-up/lem01-t01-pwr_8082',
+        'profilesReference': {'items': [{'name': 'tcp', 'partition': 'Common'}, {'name': 'http', 'partition': 'Common'}]}
+    })
+    mocker.patch('libs.f5_wrapper.F5Manager.get_virtual_server', return_value=virtual)
+
+    assert f5.modify_virtual_server(name='api-lablemams_443', pool='lem01-t01-pwr_9000', profiles=['http', 'star.lab'])
+    virtual.modify.assert_called_once_with(pool='lem01-t01-pwr_9000', profiles=[
+        {'name': 'tcp', 'partition': 'Common'}, {'name': 'http'}, {'name': 'star.lab'}
+    ])
+    virtual.delete.assert_not_called()
+
+
+def test_modify_missing_virtual_server(f5, mocker):
+    mocker.patch('libs.f5_wrapper.F5Manager.get_virtual_server', return_value=None)
+
+    assert not f5.modify_virtual_server(name='api-lablemams_443', pool='lem01-t01-pwr_9000')
+
+
+def memberships_snapshot() -> F5Snapshot:
+    return F5Snapshot(
+        fetch_nodes=lambda: [{'name': 'lem01-t01-pwr01', 'address': '10.61.101.133%2'}],
+        fetch_pools=lambda: [
+            {'name': 'api_8082', 'membersReference': {'items': [
+                {'name': 'lem01-t01-pwr01:8082', 'address': '10.61.101.133%2'},
+                {'name': 'lem01-t01-pwr02:8082', 'address': '10.61.101.134%2'},
+            ]}},
+            {'name': 'api_8083', 'membersReference': {'items': [
+                {'name': 'lem01-t01-pwr02:8083', 'address': '10.61.101.134%2'},
+            ]}},
+        ],
+        fetch_virtuals=lambda: [],
+    )
+
+
+def test_readdress_node(f5, mocker):
+    f5._snapshot = memberships_snapshot()
+    pool = mocker.Mock()
+    get_pool = mocker.patch('libs.f5_wrapper.F5Manager.get_pool', return_value=pool)
+    node = mocker.Mock(attrs={'name': 'lem01-t01-pwr01', 'address': '10.61.101.133%2'})
+    mocker.patch('libs.f5_wrapper.F5Manager.get_node', return_value=node)
+    transaction = f5.mgmt.tm.transactions.transaction.create.return_value
+    transaction.transId = 1700000000
+    params = {'requests_params': {'headers': {'X-F5-REST-Coordination-Id': '1700000000'}}}
+
+    assert f5.readdress_node(name='lem01-t01-pwr01', address='10.61.101.200') == {'api_8082': ['lem01-t01-pwr01:8082']}
+    get_pool.assert_called_once_with(name='api_8082')
+    assert pool.modify.call_args_list == [
+        mocker.call(members=[{'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up'}], **params),
+        mocker.call(members=[{'name': 'lem01-t01-pwr01:8082', 'partition': 'ams-up'},
+                             {'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up'}], **params),
+    ]
+    node.delete.assert_called_once_with(**params)
+    f5.mgmt.tm.ltm.nodes.node.create.assert_called_once_with(
+        name='lem01-t01-pwr01', address='10.61.101.200', partition='ams-up', monitor='icmp', **params
+    )
+    f5.mgmt.tm.transactions.transaction.create.assert_called_once()
+    transaction.modify.assert_called_once_with(state='VALIDATING', validateOnly=False)
+    assert f5.snapshot.get_node_references('lem01-t01-pwr01') == {'api_8082'}
+
+
+def test_readdress_node_keeps_members(f5, mocker):
+    pools = [{'name': 'api_8082', 'membersReference': {'items': [
+        {'name': 'lem01-t01-pwr01:8082', 'address': '10.61.101.133%2'},
+    ]}}]
+    f5._snapshot = F5Snapshot(fetch_nodes=lambda: [], fetch_pools=lambda: pools, fetch_virtuals=lambda: [])
+    f5.snapshot.pools
+    # Changed on the device after the snapshot was read
+    pools[0]['membersReference']['items'] += [
+        {'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up', 'address': '10.61.101.134%2', 'ratio': 2,
+         'priorityGroup': 1, 'session': 'user-disabled', 'state': 'user-down', 'fullPath': '/ams-up/lem01-t01-pwr02:8082'},
+        {'name': 'lem01-t01-pwr03:8082', 'partition': 'ams-up', 'address': '10.61.101.135%2', 'ratio': 1,
+         'session': 'monitor-enabled', 'state': 'up'},
+    ]
+    pool = mocker.Mock()
+    mocker.patch('libs.f5_wrapper.F5Manager.get_pool', return_value=pool)
+    mocker.patch('libs.f5_wrapper.F5Manager.get_node', return_value=mocker.Mock(attrs={'name': 'lem01-t01-pwr01'}))
+
+    f5.readdress_node(name='lem01-t01-pwr01', address='10.61.101.200')
+    kept = [
+        {'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up', 'ratio': 2, 'priorityGroup': 1,
+         'session': 'user-disabled', 'state': 'user-down'},
+        {'name': 'lem01-t01-pwr03:8082', 'partition': 'ams-up', 'ratio': 1},
+    ]
+    assert [call.kwargs['members'] for call in pool.modify.call_args_list] == [
+        kept, [{'name': 'lem01-t01-pwr01:8082', 'partition': 'ams-up'}] + kept
+    ]
+
+
+def test_readdress_node_lean_client(mocker):
+    f5 = F5Manager(address='f5.mydomain', user='user', password='password', partition='ams-up', lean_client=True)
+    f5._snapshot = memberships_snapshot()
+    f5._icr = mocker.Mock()
+    f5._icr.create.return_value.transId = 1700000000
+    get_pool = mocker.patch('libs.f5_wrapper.F5Manager.get_pool')
+    mocker.patch('libs.f5_wrapper.F5Manager.get_node', return_value={'name': 'lem01-t01-pwr01'})
+    headers = {'X-F5-REST-Coordination-Id': '1700000000'}
+
+    assert f5.readdress_node(name='lem01-t01-pwr01', address='10.61.101.200') == {'api_8082': ['lem01-t01-pwr01:8082']}
+    # Pools are PATCHed by path, nothing is read for them
+    get_pool.assert_not_called()
+    assert f5._icr.modify.call_args_list[0] == mocker.call(
+        '/mgmt/tm/ltm/pool/~ams-up~api_8082', {'members': [{'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up'}]},
+        headers=headers
+    )
@@ -0,0 +1,103 @@
+import pytest
+
+from libs.f5_snapshot import F5Snapshot
+
+
+collections = {
+    'nodes': [
+        {'name': 'lem01-t01-pwr01', 'address': '10.61.101.133%1'},
+        {'name': 'lem01-t01-pwr02', 'address': '10.61.101.134%1'},
+    ],
+    'pools': [
+        {'name': 'api-lablemams_8082', 'membersReference': {'items': [
+            {'name': 'lem01-t01-pwr01:8082', 'address': '10.61.101.133%1'},
+            {'name': 'lem01-t01-pwr02:8082', 'address': '10.61.101.134%1'},
+        ]}},
+        {'name': 'api-lablemams_8083', 'membersReference': {'items': [
+            {'name': 'lem01-t01-pwr01:8083', 'address': '10.61.101.133%1'},
+        ]}},
+    ],
+    'virtuals': [
+        {'name': 'api-lablemams_443', 'destination': '/ams-up/10.61.100.10%1:443', 'pool': '/ams-up/api-lablemams_8082'},
+        {'name': 'api-lablemams_80', 'destination': '/ams-up/10.61.100.10%1:80', 'pool': '/ams-up/api-lablemams_8082'},
+    ],
+}
+
+
+@pytest.fixture
+def snapshot(fetchers):
+    return F5Snapshot(**fetchers)
+
+
+def test_lazy_loading(snapshot, fetchers):
+    assert not snapshot.is_loaded('node')
+    assert snapshot.get_node('lem01-t01-pwr01')['address'] == '10.61.101.133%1'
+    snapshot.get_node('lem01-t01-pwr02')
+    snapshot.nodes
+
+    assert fetchers['fetch_nodes'].calls == 1
+    assert fetchers['fetch_pools'].calls == 0
+
+    snapshot.refresh('node')
+    snapshot.get_node('lem01-t01-pwr01')
+    assert fetchers['fetch_nodes'].calls == 2
+
+
+def test_indexes(snapshot):
+    assert snapshot.get_node_by_address('10.61.101.134')['name'] == 'lem01-t01-pwr02'
+    assert snapshot.get_node_by_address('10.61.101.200') is None
+    assert snapshot.get_node_references('lem01-t01-pwr01') == {'api-lablemams_8082', 'api-lablemams_8083'}
+    assert snapshot.get_node_members('lem01-t01-pwr01') == {
+        'api-lablemams_8082': ['lem01-t01-pwr01:8082'], 'api-lablemams_8083': ['lem01-t01-pwr01:8083']
+    }
+    assert snapshot.get_node_members('lem01-t01-pwr03') == {}
+    assert snapshot.get_pool_members('api-lablemams_8083') == {'lem01-t01-pwr01:8083': '10.61.101.133'}
+    assert snapshot.get_pool_references('api-lablemams_8082') == {'api-lablemams_443', 'api-lablemams_80'}
+    assert [v['name'] for v in snapshot.get_virtual_servers_by_ip('10.61.100.10')] == ['api-lablemams_443', 'api-lablemams_80']
+
+
+def test_node_updates(snapshot):
+    snapshot.get_node('lem01-t01-pwr01')
+    snapshot.add_node('lem01-t01-pwr03', '10.61.101.135')
+    assert snapshot.get_node_by_address('10.61.101.135') == {'name': 'lem01-t01-pwr03', 'address': '10.61.101.135'}
+
+    snapshot.remove_node('lem01-t01-pwr01')
+    assert snapshot.get_node('lem01-t01-pwr01') is None
+    assert snapshot.get_node_by_address('10.61.101.133') is None
+
+
+def test_pool_updates(snapshot):
+    snapshot.nodes
+    snapshot.pools
+    snapshot.add_pool('api-lablemams_8084', ['lem01-t01-pwr02:8084'])
+    assert snapshot.get_pool_members('api-lablemams_8084') == {'lem01-t01-pwr02:8084': '10.61.101.134'}
+    assert 'api-lablemams_8084' in snapshot.get_node_references('lem01-t01-pwr02')
+
+    snapshot.remove_pool_members('api-lablemams_8083', ['lem01-t01-pwr01:8083'])
+    assert snapshot.get_node_references('lem01-t01-pwr01') == {'api-lablemams_8082'}
+
+    snapshot.remove_pool('api-lablemams_8082')
+    assert snapshot.get_pool('api-lablemams_8082') is None
+    assert snapshot.get_node_references('lem01-t01-pwr01') == set()
+
+
+def test_virtual_updates(snapshot):
+    snapshot.virtuals
+    snapshot.add_virtual('api-lablemams_8443', '10.61.100.10', pool='api-lablemams_8083')
+    assert [v['name'] for v in snapshot.get_virtual_servers_by_ip('10.61.100.10')] == [
+        'api-lablemams_443', 'api-lablemams_80', 'api-lablemams_8443'
+    ]
+    assert snapshot.get_pool_references('api-lablemams_8083') == {'api-lablemams_8443'}
+
+    snapshot.remove_virtual('api-lablemams_443')
+    assert snapshot.get_pool_references('api-lablemams_8082') == {'api-lablemams_80'}
+
+
+def test_updates_before_loading(snapshot, fetchers):
+    snapshot.add_node('lem01-t01-pwr03', '10.61.101.135')
+    snapshot.remove_virtual('api-lablemams_443')
+
+    assert not snapshot.is_loaded('node')
+    assert not snapshot.is_loaded('virtual')
+    assert snapshot.get_node('lem01-t01-pwr03') is None
+    assert snapshot.get_virtual('api-lablemams_443') is not None
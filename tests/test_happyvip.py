@@ -108,3 +108,64 @@ def test_cli_delete_without_entrypoints(cli, mocker, em):
     mocker.patch('libs.entrypoint_group.EntrypointGroup.validate_state', return_value=True)
     with pytest.raises(Exception, match='No entrypoints provided'):
         cli.delete(name='test_env', entrypoints='', services='')
+
+
+def test_cli_create_parallel(mocker, em, cli):
+    def create_entrypoint(entrypoint):
+        if entrypoint == 'api':
+            raise Exception('No hosts for api service found')
+        return {'Entrypoint': {'patched': True}}
+
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.get_entrypoints', return_value=['intapi', 'api', 'scp'])
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.prepare_groups')
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.create_entrypoint', side_effect=create_entrypoint)
+    status = cli.create(name='test_env', all=True, parallel=3)
+    assert list(status) == ['intapi', 'api', 'scp']
+    assert status == {'intapi': True, 'api': False, 'scp': True}
+
+
+def test_cli_create_serial_error(mocker, em, cli):
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.get_entrypoints', return_value=['intapi', 'api'])
+    create_entrypoint = mocker.patch('libs.entrypoint_manager.EntrypointManager.create_entrypoint',
+                                     side_effect=Exception('No hosts for api service found'))
+    with pytest.raises(Exception, match='No hosts'):
+        cli.create(name='test_env', all=True)
+    create_entrypoint.assert_called_once_with('intapi')
+
+
+def test_read_env_names(tmp_path):
+    envs_file = tmp_path / 'envs.txt'
+    envs_file.write_text('# rollout\nlablemams\n\nlabsomeenv  # second\nlablemams\n')
+    assert CLI._read_env_names('labfirst,lablemams', str(envs_file)) == ['labfirst', 'lablemams', 'labsomeenv']
+    with pytest.raises(ValueError, match='No env names given'):
+        CLI._read_env_names('', '')
+
+
+def test_cli_create_many(mocker, em, cli):
+    def create_entrypoint(manager, entrypoint):
+        if manager.env_name == 'labbroken':
+            raise Exception('No hosts for pwr service found')
+        return {'Entrypoint': {'patched': True}}
+
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.get_entrypoints', return_value=['intapi', 'api'])
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.create_entrypoint', autospec=True, side_effect=create_entrypoint)
+    status = cli.create_many(names='test_env,labbroken', all=True, envs=2)
+    assert status == {'test_env': {'intapi': True, 'api': True}, 'labbroken': {}}
+
+
+def test_cli_run_job(mocker, em, cli):
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.get_entrypoints', return_value=['intapi'])
+    create_entrypoint = mocker.patch('libs.entrypoint_manager.EntrypointManager.create_entrypoint',
+                                     return_value={'Entrypoint': {'patched': True}})
+    assert cli._run_job('create', {'name': 'test_env', 'entrypoints': 'intapi'}) == {'intapi': True}
+    assert cli._run_job('create', {'name': 'test_env', 'entrypoints': 'intapi'}) == {'intapi': True}
+    assert create_entrypoint.call_count == 2
+    assert list(cli._managers) == ['test_env']
+
+
+def test_cli_reconcile(mocker, em, cli):
+    reconcile_entrypoint = mocker.patch('libs.reconciler.Reconciler.reconcile_entrypoint', return_value={})
+    mocker.patch('libs.entrypoint_manager.EntrypointManager.get_entrypoints', return_value=['intapi'])
+    status = cli.reconcile(names='test_env', interval=1, cycles=1, dry_run=True)
+    assert status == {'test_env': {'intapi': {}}}
+    reconcile_entrypoint.assert_called_once()
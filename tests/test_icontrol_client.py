@@ -0,0 +1,124 @@
+import httpx
+import pytest
+from icontrol.exceptions import iControlUnexpectedHTTPError
+
+from libs.f5_wrapper import AddressSpecifiedIsInUse
+from libs.f5_wrapper import F5Manager
+from libs.icontrol_client import IControlClient
+from libs.token_cache import TokenCache
+from tests import conftest
+
+
+class Device(conftest.Device):
+    """iControl REST handler for httpx.MockTransport"""
+
+    def __init__(self, token_timeout: int = 1200) -> None:
+        super().__init__()
+        self.token_timeout = token_timeout
+        self.tokens = 0
+
+    def authenticate(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/mgmt/shared/authn/login':
+            self.tokens += 1
+            return httpx.Response(200, json={'token': {'token': f'token{self.tokens}', 'timeout': self.token_timeout}})
+        if request.headers['X-F5-Auth-Token'] != f'token{self.tokens}':
+            return httpx.Response(401, json={'code': 401, 'message': 'Authorization failed'})
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        if request.method == 'POST' and request.url.path == '/mgmt/tm/ltm/node':
+            return httpx.Response(400, json={'code': 400, 'message': '01070734:3: Configuration error: 0107176c:3: in use'})
+        if request.url.path.startswith('/mgmt/tm/ltm/virtual/~ams-up~api'):
+            name = request.url.path.rsplit('~', 1)[-1]
+            return httpx.Response(200, json={'name': name, 'destination': '/ams-up/10.62.9.123:443'})
+        if request.url.path == '/mgmt/tm/ltm/node':
+            return httpx.Response(200, json={'items': [{'name': 'lem01-t01-pwr01', 'address': '10.61.101.133'}]})
+        return httpx.Response(404, json={'code': 404, 'message': 'Object not found'})
+
+
+@pytest.fixture
+def device():
+    return Device()
+
+
+@pytest.fixture
+def icr(device):
+    return IControlClient('f5.mydomain', 'user', 'password', concurrency=2, transport=httpx.MockTransport(device))
+
+
+def test_get(icr, device):
+    virtual = icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443', select=['name', 'destination'])
+
+    assert virtual.name == 'api-lablemams_443'
+    assert virtual.attrs['destination'] == '/ams-up/10.62.9.123:443'
+    assert device.requests[-1].url.params['$select'] == 'name,destination'
+
+
+def test_collection(icr, device):
+    nodes = icr.collection('/mgmt/tm/ltm/node', filter='partition eq ams-up')
+
+    assert nodes[0].address == '10.61.101.133'
+    assert device.requests[-1].url.params['$filter'] == 'partition eq ams-up'
+
+
+def test_errors(icr):
+    with pytest.raises(iControlUnexpectedHTTPError) as e:
+        icr.get('/mgmt/tm/ltm/pool/~ams-up~lem01-t01-pwr_8082')
+    assert e.value.response.status_code == 404
+
+
+def test_concurrency(icr, device):
+    paths = [f'/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_{port}' for port in (80, 443, 8080, 8443)]
+    virtuals = icr.run(icr.aio.gather(icr.aio.get(path) for path in paths))
+
+    assert [virtual.name for virtual in virtuals] == ['api-lablemams_80', 'api-lablemams_443',
+                                                      'api-lablemams_8080', 'api-lablemams_8443']
+    assert device.max_in_flight == 2
+
+
+def test_token_refresh(icr, device):
+    icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443')
+    icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_80')
+    assert device.tokens == 1
+
+    # Token revoked on the device
+    device.tokens += 1
+    icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443')
+    assert device.tokens == 3
+
+
+def test_token_expiry(device):
+    device.token_timeout = 30
+    icr = IControlClient('f5.mydomain', 'user', 'password', transport=httpx.MockTransport(device))
+    icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443')
+    icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443')
+
+    assert device.tokens == 2
+
+
+def test_token_cache(device, tmp_path):
+    token_cache = TokenCache(str(tmp_path / 'tokens.json'))
+    for _ in range(3):
+        icr = IControlClient('f5.mydomain', 'user', 'password', transport=httpx.MockTransport(device), token_cache=token_cache)
+        icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443')
+    assert device.tokens == 1
+
+    # Cached token revoked on the device
+    device.tokens += 1
+    icr = IControlClient('f5.mydomain', 'user', 'password', transport=httpx.MockTransport(device), token_cache=token_cache)
+    icr.get('/mgmt/tm/ltm/virtual/~ams-up~api-lablemams_443')
+    assert device.tokens == 3
+    assert token_cache.get('f5.mydomain', 'user')[0] == 'token3'
+
+
+@pytest.fixture
+def f5(device):
+    f5 = F5Manager(address='f5.mydomain', user='user', password='password', partition='ams-up', lean_client=True, concurrency=2)
+    f5.icr.aio.transport = httpx.MockTransport(device)
+    return f5
+
+
+def test_f5_manager_errors(f5):
+    with pytest.raises(AddressSpecifiedIsInUse):
+        f5.create_node(name='lem01-t01-pwr02', address='10.61.101.133')
+    assert f5.get_node(name='lem01-t01-pwr02') is None
+    assert f5.get_node_by_address(address='10.61.101.133').name == 'lem01-t01-pwr01'
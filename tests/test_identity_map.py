@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+import pytest
+
+from libs import identity_map
+from libs.apply_engine import ApplyEngine
+from libs.identity_map import run_scope
+from libs.identity_map import shared
+from tests.conftest import Item
+
+
+@pytest.fixture(autouse=True)
+def settings(mocker):
+    mocker.patch('libs.apply_engine.get_ff', return_value=1)
+
+
+def test_outside_scope():
+    assert identity_map.current() is None
+    assert shared(Item, name='pool', location='ams02') is not shared(Item, name='pool', location='ams02')
+
+
+def test_shared():
+    with run_scope() as run:
+        pool = shared(Item, name='pool', location='ams02')
+        assert shared(Item, name='pool', location='AMS02', children=('ignored',)) is pool
+        assert shared(Item, name='pool', location='ams03') is not pool
+        with run_scope() as nested:
+            assert nested is run
+            assert shared(Item, name='pool', location='ams02') is pool
+    assert run.stats() == {'objects': 2, 'hits': 2, 'applied': 0}
+    assert identity_map.current() is None
+
+
+def test_applied_once_per_run():
+    with run_scope() as run:
+        node = shared(Item, name='node', location='ams02')
+        pools = [Item(name=f'pool_{port}', location='ams02', children=(node,)) for port in (80, 443)]
+        first, second = (Item(name=f'virtual_{pool.name}', location='ams02', children=(pool,)) for pool in pools)
+
+        ApplyEngine(first, 'patch').run()
+        result = ApplyEngine(second, 'patch').run()
+
+        assert node.calls == ['patch']
+        assert result['Item']['siblings']['pool_443']['Item']['siblings']['node']['Item']['patched']
+        assert run.was_applied(node, 'patch')
+        assert not run.was_applied(node, 'delete')
+
+
+def test_reset_forgets_applied():
+    with run_scope():
+        node = shared(Item, name='node', location='ams02')
+        engine = ApplyEngine(Item(name='pool', location='ams02', children=(node,)), 'patch')
+        engine.run()
+        engine.reset(select=lambda operation: True)
+        engine.run()
+
+        assert node.calls == ['patch', 'patch']
+
+
+def test_parallel_parents():
+    with run_scope():
+        node = shared(Item, name='node', location='ams02')
+        pools = [Item(name=f'pool_{port}', location='ams02', children=(node,)) for port in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for pool in pools:
+                executor.submit(copy_context().run, ApplyEngine(pool, 'patch').run)
+
+        assert node.calls == ['patch']
+        assert all(pool.calls == ['patch'] for pool in pools)
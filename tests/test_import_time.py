@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Microseconds 'import happyvip' may take, fire and beartype (the CLI itself) take most of it
+BUDGET = 400_000
+# Vendor SDKs, loaded with the first balancer manager of the vendor only
+F5_MODULES = ('f5', 'icontrol')
+A10_MODULES = ('acos_client',)
+
+
+def import_times(code: str) -> dict:
+    """Cumulative import time in microseconds of every module imported by code, from python -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    times = dict()
+    for line in result.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        fields = line.split('|')
+        if line.startswith('import time:') and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1])
+    return times
+
+
+def loaded(times: dict, packages: tuple) -> list:
+    return sorted(module for module in times if module.split('.')[0] in packages)
+
+
+def test_cli_startup():
+    times = import_times('import happyvip')
+    assert not loaded(times, F5_MODULES + A10_MODULES + ('httpx', 'requests'))
+    assert times['happyvip'] < BUDGET
+
+
+@pytest.mark.parametrize(
+    ('module', 'vendor', 'other'),
+    [
+        ('libs.a10_wrapper', A10_MODULES, F5_MODULES),
+        # f5-sdk itself is loaded by F5Manager.mgmt, lean client runs never need it
+        ('libs.f5_wrapper', ('icontrol',), ('f5',) + A10_MODULES),
+    ]
+)
+def test_vendor_imports(module, vendor, other):
+    times = import_times(f'import libs.entrypoint_manager, {module}')
+    assert loaded(times, vendor)
+    assert not loaded(times, other)
@@ -0,0 +1,137 @@
+import http.client
+import json
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from libs.job_server import DONE
+from libs.job_server import FAILED
+from libs.job_server import JobQueues
+from libs.job_server import load_token
+from libs.job_server import make_server
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str) -> None:
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def runner(action: str, params: dict) -> dict:
+    if params['name'] == 'labbroken':
+        raise ValueError('Incorrect env name given')
+    return {entrypoint: True for entrypoint in params.get('entrypoints', '').split(',')}
+
+
+def resolve(params: dict) -> str:
+    if not params.get('name'):
+        raise ValueError('Incorrect env name given')
+    return 'AMS02'
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = make_server(JobQueues(runner=runner), resolve=resolve, socket_path=str(tmp_path / 'happyvip.sock'))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method: str, path: str, data: dict = None, headers: dict = None) -> tuple[int, dict]:
+    if isinstance(server.server_address, str):
+        connection = UnixConnection(server.server_address)
+    else:
+        connection = http.client.HTTPConnection(*server.server_address)
+    connection.request(method, path, body=json.dumps(data) if data is not None else None, headers=headers or {})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_queues():
+    calls = []
+    queues = JobQueues(runner=lambda action, params: calls.append(params['name']) or runner(action, params))
+    jobs = [queues.submit('create', {'name': name, 'entrypoints': 'intapi'}, 'AMS02')
+            for name in ('lablemams', 'labbroken', 'labsomeenv')]
+    for job in jobs:
+        assert job.finished.wait(5)
+
+    assert calls == ['lablemams', 'labbroken', 'labsomeenv']
+    assert [job.status for job in jobs] == [DONE, FAILED, DONE]
+    assert jobs[0].result == {'intapi': True}
+    assert 'Incorrect env name given' in jobs[1].error
+    assert queues.get(jobs[2].id) is jobs[2]
+    assert queues.stats() == {'queues': {'AMS02': 0}, 'jobs': {DONE: 2, FAILED: 1}}
+    with pytest.raises(ValueError, match='Unknown action'):
+        queues.submit('patch', {'name': 'lablemams'}, 'AMS02')
+
+
+def test_history():
+    queues = JobQueues(runner=runner, history=2)
+    jobs = [queues.submit('plan', {'name': 'lablemams'}, 'AMS02') for _ in range(3)]
+    jobs[-1].finished.wait(5)
+    assert queues.get(jobs[0].id) is None
+    assert queues.get(jobs[2].id) is jobs[2]
+
+
+def test_api(server):
+    data = {'action': 'create', 'name': 'lablemams', 'entrypoints': 'intapi,api'}
+    status, job = request(server, 'POST', '/jobs?wait=1', data)
+    assert status == 202
+    assert job['status'] == DONE
+    assert job['queue'] == 'AMS02'
+    assert job['result'] == {'intapi': True, 'api': True}
+
+    status, same = request(server, 'GET', f"/jobs/{job['id']}")
+    assert (status, same) == (200, job)
+
+    status, health = request(server, 'GET', '/health')
+    assert health == {'queues': {'AMS02': 0}, 'jobs': {DONE: 1}}
+
+
+def test_api_errors(server):
+    assert request(server, 'POST', '/jobs', {'action': 'create'})[0] == 400
+    assert request(server, 'POST', '/jobs', {'action': 'patch', 'name': 'lablemams'})[0] == 400
+    assert request(server, 'GET', '/jobs/unknown')[0] == 404
+    assert request(server, 'POST', '/other', {})[0] == 404
+
+
+def test_socket_permissions(server):
+    assert stat.S_IMODE(os.stat(server.server_address).st_mode) == 0o600
+
+
+def test_load_token(tmp_path):
+    path = str(tmp_path / 'happyvip' / 'daemon.token')
+    token = load_token(path)
+
+    assert len(token) > 32
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert load_token(path) == token
+
+
+def test_tcp_token():
+    with pytest.raises(ValueError, match='requires a token'):
+        make_server(JobQueues(runner=runner), resolve=resolve, port=8321)
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = make_server(JobQueues(runner=runner), resolve=resolve, port=port, token='secret')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert request(server, 'GET', '/health')[0] == 401
+        assert request(server, 'POST', '/jobs', {'action': 'plan', 'name': 'lablemams'},
+                       headers={'Authorization': 'Bearer other'})[0] == 401
+        assert request(server, 'GET', '/health', headers={'Authorization': 'Bearer secret'}) == (
+            200, {'queues': {}, 'jobs': {}}
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
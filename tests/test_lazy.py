@@ -0,0 +1,96 @@
+import pytest
+
+from libs import lazy as lazy_module
+from libs.apply_engine import ApplyEngine
+from libs.lazy import invalidate
+from libs.lazy import is_computed
+from libs.lazy import lazy
+from libs.node import NodeF5
+
+
+class Item:
+    def __init__(self, value) -> None:
+        self.value = value
+        self.calls = 0
+
+    @lazy
+    def state(self):
+        """State of the item"""
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture(autouse=True)
+def stats():
+    lazy_module.reset_stats()
+    yield
+    lazy_module.reset_stats()
+
+
+@pytest.mark.parametrize("value", [{}, None, False, [], {'name': 'item'}])
+def test_computed_once(value):
+    item = Item(value)
+    assert item.state == value
+    assert item.state == value
+    assert item.calls == 1
+    assert lazy_module.stats() == {'Item.state': {'hits': 1, 'misses': 1}}
+
+
+def test_per_object():
+    first, second = Item(1), Item(2)
+    assert (first.state, second.state) == (1, 2)
+    assert first.calls == second.calls == 1
+
+
+def test_assign():
+    item = Item({})
+    item.state = {'name': 'item'}
+    assert item.state == {'name': 'item'}
+    assert item.calls == 0
+
+
+def test_invalidate():
+    item = Item({})
+    item.state
+    assert is_computed(item, 'state')
+    invalidate(item, 'state')
+    assert not is_computed(item, 'state')
+    item.state
+    del item.state
+    item.state
+    invalidate(item)
+    item.state
+    assert item.calls == 4
+
+
+def test_descriptor():
+    assert isinstance(Item.state, lazy)
+    assert Item.state.__doc__ == 'State of the item'
+
+
+def test_absent_object_read_once(mocker):
+    get_node = mocker.patch('libs.f5_wrapper.F5Manager.get_node', return_value=None)
+    node = NodeF5(name='lem01-t01-pwr08', ip='1.1.1.1', location='ams02')
+    assert node.state == {}
+    assert node.diff
+    assert node.are_we_good()
+    assert node.state == {}
+    assert node.are_we_good()
+    get_node.assert_called_once()
+    assert lazy_module.stats()['NodeF5.is_good'] == {'hits': 1, 'misses': 1}
+
+
+def test_invalidated_after_write(mocker):
+    get_node = mocker.patch('libs.f5_wrapper.F5Manager.get_node', return_value=None)
+    mocker.patch('libs.f5_wrapper.F5Manager.create_node', return_value=True)
+    mocker.patch('libs.apply_engine.get_ff', return_value=1)
+    node = NodeF5(name='lem01-t01-pwr08', ip='1.1.1.1', location='ams02')
+    node.state
+
+    ApplyEngine(node, 'patch').run()
+
+    assert not is_computed(node, 'node')
+    assert not is_computed(node, 'state')
+    assert is_computed(node, 'plan')
+    node.state
+    assert get_node.call_count == 2
@@ -0,0 +1,112 @@
+"""LBR behaviour which does not need a live device, see test_lbr_wrapper.py for the rest"""
+import pytest
+from acos_client.errors import ACOSException
+from acos_client.errors import Exists
+
+from libs.a10_catalog import A10Catalog
+from libs.f5_snapshot import F5Snapshot
+from libs.lbr_wrapper import LBR
+
+
+@pytest.fixture
+def lbr(mocker):
+    lbr = LBR(location='AMS02')
+    lbr._a10 = mocker.Mock(catalog=A10Catalog(
+        fetch_servers=lambda: [{'name': 'lem01-t01-pwr01', 'host': '10.61.101.133'}],
+        fetch_groups=lambda: [{'name': 'lem01-t01-pwr_8082', 'member-list': [{'name': 'lem01-t01-pwr01', 'port': 8082}]}],
+        fetch_virtuals=lambda: [{'name': 'intapi-lablemams', 'ip-address': '10.62.9.123', 'port-list': [
+            {'port-number': 443, 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082'},
+            {'port-number': 80, 'protocol': 'http', 'service-group': 'lem01-t01-pwr_8082'},
+        ]}],
+    ))
+    lbr._f5 = mocker.Mock(clean_value=mocker.Mock(side_effect=lambda v: v and v.rsplit('/', 1)[-1].rsplit(':', 1)[0]))
+    lbr._f5.snapshot = F5Snapshot(
+        fetch_nodes=lambda: [],
+        fetch_pools=lambda: [{'name': 'lem01-t01-pwr_8082', 'membersReference': {'items': [
+            {'name': 'lem01-t01-pwr01:8082', 'address': '10.61.101.133'}
+        ]}}],
+        fetch_virtuals=lambda: [{'name': 'intapi-lablemams_443', 'destination': '/ams-up/10.62.9.124:443',
+                                 'pool': '/ams-up/lem01-t01-pwr_8082'}],
+    )
+    return lbr
+
+
+def test_get_vip_a10(lbr):
+    vips = lbr.get_vip('intapi', 'lablemams')
+
+    assert vips == [{
+        'name': 'intapi-lablemams',
+        'address': '10.62.9.123',
+        'ports': [
+            {'port_number': 443, 'pool': {'name': 'lem01-t01-pwr_8082', 'members': [
+                {'name': 'lem01-t01-pwr01', 'address': '10.61.101.133', 'port': 8082}
+            ]}},
+            {'port_number': 80, 'pool': {'name': 'lem01-t01-pwr_8082', 'members': [
+                {'name': 'lem01-t01-pwr01', 'address': '10.61.101.133', 'port': 8082}
+            ]}},
+        ]
+    }]
+
+
+def test_get_vip_f5(lbr, mocker):
+    mocker.patch.object(lbr, 'get_lbr_type', return_value='F5')
+
+    assert lbr.get_vip('intapi', 'lablemams') == [{
+        'name': 'intapi-lablemams_443',
+        'address': '10.62.9.124',
+        'ports': [{'port_number': 443, 'pool': {'name': 'lem01-t01-pwr_8082', 'members': [
+            {'name': 'lem01-t01-pwr01', 'address': '10.61.101.133', 'port': 8082}
+        ]}}]
+    }]
+
+
+def test_get_vips(lbr):
+    vips = lbr.get_vips(['api', 'intapi'], 'lablemams', refresh=True)
+
+    assert vips['api'] == []
+    assert vips['intapi'][0]['name'] == 'intapi-lablemams'
+    lbr.a10.refresh.assert_called_once()
+    lbr.f5.refresh.assert_not_called()
+
+
+def test_get_new_f5_nodes(lbr):
+    lbr.f5.snapshot = F5Snapshot(
+        fetch_nodes=lambda: [{'name': 'lem01-t01-pwr01', 'address': '10.61.101.133'}],
+        fetch_pools=lambda: [],
+        fetch_virtuals=lambda: [],
+    )
+    nodes = [{'name': 'lem01-t01-pwr01', 'ip': '10.61.101.133'}, {'name': 'lem01-t01-pwr02', 'ip': '10.61.101.134'}]
+
+    assert lbr.get_new_f5_nodes(nodes) == [{'name': 'lem01-t01-pwr02', 'ip': '10.61.101.134'}]
+    assert lbr.get_new_f5_nodes([{'name': 'lem01-t01-pwr03', 'ip': '10.61.101.133'}]) is None
+    assert lbr.get_new_f5_nodes([{'name': 'lem01-t01-pwr01', 'ip': '10.61.101.135'}]) is None
+
+
+def test_create_vip_a10(lbr):
+    lbr.a10.Exists = Exists
+    lbr.a10.create_groups.return_value = {'lem01-t01-pwr_8082': Exists()}
+    lbr.a10.create_virtual_ports.return_value = {'443+https': {}, '80+http': {}}
+    nodes = [{'name': 'lem01-t01-pwr01', 'ip': '10.61.101.133'}]
+
+    assert lbr._create_vip('A10', 'intapi', '10.62.9.123', nodes, 'lablemams', 'mydomain', [])
+    lbr.a10.create_groups.assert_called_once_with([
+        {'name': 'lem01-t01-pwr_8082', 'members': [{'name': 'lem01-t01-pwr01', 'port': 8082}]}
+    ])
+    lbr.a10.create_virtual_server.assert_called_once_with(name='intapi-lablemams', ip='10.62.9.123')
+    lbr.a10.create_virtual_ports.assert_called_once_with('intapi-lablemams', [
+        {'port': 443, 'protocol': 'https', 'group': 'lem01-t01-pwr_8082',
+         'template_http': 'rc-xffxfp-https', 'client_ssl': 'star.mydomain'},
+        {'port': 80, 'protocol': 'http', 'group': 'lem01-t01-pwr_8082',
+         'template_http': 'rc-xffxfp-http', 'client_ssl': None},
+    ])
+    lbr.a10.create_virtual_port.assert_not_called()
+
+
+def test_delete_nodes_a10(lbr):
+    lbr.a10.get_server_references.side_effect = lambda name: ['lem01-t01-pwr_8082'] if name == 'lem01-t01-pwr01' else []
+    lbr.a10.delete_servers.return_value = {'lem01-t01-pwr02': {'status': 'OK'}, 'lem01-t01-pwr03': ACOSException()}
+
+    with pytest.raises(ACOSException):
+        lbr.delete_nodes('A10', ['lem01-t01-pwr01', 'lem01-t01-pwr02', 'lem01-t01-pwr03'])
+    lbr.a10.delete_servers.assert_called_once_with(['lem01-t01-pwr02', 'lem01-t01-pwr03'])
+    lbr.a10.delete_server.assert_not_called()
@@ -1,19 +1,155 @@
+import threading
+import time
+
 import pytest
 
+from libs.device_limiter import limiter
 from libs.model_base import Base
 
-base = Base()
+
+class Leaf(Base):
+    vendor = 'F5'
+    events = []
+
+    def __init__(self, name: str, location: str = 'AMS02') -> None:
+        super().__init__()
+        self.name = name
+        self.location = location
+
+    def are_we_good(self):
+        return True
+
+    @property
+    def diff(self):
+        return {}
+
+    @property
+    def state(self):
+        time.sleep(0.05)
+        self.events.append(('state', self.name))
+        return {'name': self.name}
+
+    def patch(self):
+        self.events.append(('patch', self.name))
+        return True
+
+
+class Branch(Leaf):
+
+    @property
+    def siblings(self):
+        if not self._siblings:
+            self._siblings = {f'{self.name}-{i}': Leaf(f'{self.name}-{i}', self.location) for i in range(4)}
+        return self._siblings
+
+
+class Chain(Leaf):
+    """depth objects of one device, every one with a single sibling"""
+
+    def __init__(self, name: str, location: str = 'AMS02', vendor: str = 'F5', depth: int = 2) -> None:
+        super().__init__(name, location)
+        self.vendor = vendor
+        self.depth = depth
+
+    @property
+    def siblings(self):
+        if not self._siblings and self.depth > 1:
+            self._siblings = {f'{self.name}-0': Chain(f'{self.name}-0', self.location, self.vendor, self.depth - 1)}
+        return self._siblings
+
+
+class Fork(Leaf):
+    vendor = None
+
+    def __init__(self, name: str, siblings: list) -> None:
+        super().__init__(name)
+        self._siblings = {sibling.name: sibling for sibling in siblings}
+
+
+class Root(Leaf):
+    vendor = None
+
+    @property
+    def siblings(self):
+        if not self._siblings:
+            self._siblings = {'f5': Branch('f5', 'AMS02'), 'a10': Branch('a10', 'AMS03')}
+        return self._siblings
+
+
+@pytest.fixture
+def settings(mocker):
+    settings = {'SIBLINGS_CONCURRENCY': 8, 'DEVICE_CONCURRENCY': 8}
+    mocker.patch('libs.model_base.get_ff', side_effect=settings.get)
+    limiter.reset()
+    Leaf.events = []
+    return settings
+
+
+def test_concurrent_siblings(settings):
+    settings['SIBLINGS_CONCURRENCY'] = 1
+    started = time.time()
+    serial = Root('root').global_state
+    serial_time = time.time() - started
+
+    settings['SIBLINGS_CONCURRENCY'] = 8
+    started = time.time()
+    concurrent = Root('root').global_state
+
+    assert concurrent == serial
+    assert list(concurrent['Root']['siblings']['f5']['Branch']['siblings']) == [f'f5-{i}' for i in range(4)]
+    assert time.time() - started < serial_time / 2
+
+
+def test_concurrent_patch_order(settings):
+    Root('root').global_patch()
+    patched = [name for event, name in Leaf.events if event == 'patch']
+
+    assert patched[-1] == 'root'
+    for branch in ('f5', 'a10'):
+        assert all(patched.index(f'{branch}-{i}') < patched.index(branch) for i in range(4))
+
+
+def test_device_concurrency(settings, mocker):
+    settings['DEVICE_CONCURRENCY'] = 1
+    in_flight = {}
+    max_in_flight = {}
+    lock = threading.Lock()
+    state = Leaf.state.fget
+
+    def counted_state(self):
+        with lock:
+            in_flight[self.location] = in_flight.get(self.location, 0) + 1
+            max_in_flight[self.location] = max(max_in_flight.get(self.location, 0), in_flight[self.location])
+        try:
+            return state(self)
+        finally:
+            with lock:
+                in_flight[self.location] -= 1
+
+    mocker.patch.object(Leaf, 'state', property(counted_state))
+    Root('root').global_state
+
+    assert max_in_flight == {'AMS02': 1, 'AMS03': 1}
 
 
 @pytest.mark.parametrize(
-    ("input_dict", "expected_bool"),
+    ('siblings_concurrency', 'device_concurrency', 'vendor', 'chains', 'depth'),
     [
-        ({'Entrypoint': {'patched': True, 'siblings': {}}}, True),
-        ({'ServerA10': {'siblings': {}, 'patched': False}}, False),
-        ({'ServerA10': {'siblings': {}, 'patched': True}}, True),
-        ({'Entry': {'patched': True, 'siblings': {'scp': {'F5': {'patched': True, 'siblings': {}}}, 'patched': True}}}, True),
-        ({'Entry': {'patched': True, 'siblings': {'scp': {'F5': {'patched': False, 'siblings': {}}}, 'patched': True}}}, False)
+        # Two virtuals with one pool each
+        (8, 1, 'F5', 2, 2),
+        (8, 4, 'F5', 4, 2),
+        (1, 3, 'A10', 1, 4),
+        (8, 3, 'A10', 2, 4),
     ]
 )
-def test_is_siblings_data_success(input_dict, expected_bool):
-    assert base._is_siblings_data_success(data=input_dict, method='patched') == expected_bool
+def test_device_slot_reentrant(settings, siblings_concurrency, device_concurrency, vendor, chains, depth):
+    """Single siblings are read on the thread which holds the slot of their device already"""
+    settings.update(SIBLINGS_CONCURRENCY=siblings_concurrency, DEVICE_CONCURRENCY=device_concurrency)
+    root = Fork('root', [Chain(f'virtual{i}', vendor=vendor, depth=depth) for i in range(chains)])
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(state=root.global_state), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive(), 'deadlock on device slots'
+    assert len([event for event in Leaf.events if event[0] == 'state']) == chains * depth + 1
@@ -38,3 +38,12 @@ def test_state(node):
 
 def test_plan(node):
     assert node.plan == {'name': host, 'ip': '192.168.253.2'}
+
+
+def test_patch_ip(node, mocker):
+    readdress_node = mocker.patch('libs.f5_wrapper.F5Manager.readdress_node', return_value={})
+    delete_pool_members_by_nodes = mocker.patch('libs.f5_wrapper.F5Manager.delete_pool_members_by_nodes')
+
+    assert node.patch()
+    readdress_node.assert_called_once_with(name=host, address='192.168.253.2')
+    delete_pool_members_by_nodes.assert_not_called()
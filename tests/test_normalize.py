@@ -0,0 +1,152 @@
+import pytest
+
+from libs import normalize
+from libs.lazy import invalidate
+from libs.node import NodeF5
+from libs.pool import PoolF5
+from libs.server import ServerA10
+from libs.service_group import ServiceGroupA10
+from libs.virtual_port import VirtualPortA10
+from libs.virtual_server import VirtualServerA10
+from libs.virtual_server import VirtualServerF5
+
+port_config = {
+    "port": 443,
+    "target_port": "8082",
+    "protocol": "https",
+    "template_http": "rc-xffxfp-https"
+}
+
+endpoints = {
+    'lem01-t01-pwr01': {'interfaces': [('nic0', '10.61.16.26'), ('intapi', '10.62.9.123')], 'ip': '10.61.16.26'},
+    'lem01-t01-pwr02': {'interfaces': [('nic0', '10.61.16.27'), ('intapi', '10.62.9.123')], 'ip': '10.61.16.27'},
+}
+
+# Device answers as the balancers send them
+f5_node = {
+    'kind': 'tm:ltm:node:nodestate', 'name': 'lem01-t01-pwr01', 'partition': 'ams-up',
+    'fullPath': '/ams-up/lem01-t01-pwr01', 'address': '10.61.16.26%2', 'monitor': 'default', 'state': 'up'
+}
+
+f5_pool = {
+    'kind': 'tm:ltm:pool:poolstate', 'name': 'lem01-t01-pwr_8082', 'partition': 'ams-up',
+    'fullPath': '/ams-up/lem01-t01-pwr_8082', 'monitor': '/Common/tcp', 'loadBalancingMode': 'round-robin',
+    'membersReference': {'isSubcollection': True, 'items': [
+        {'name': 'lem01-t01-pwr02:8082', 'partition': 'ams-up', 'address': '10.61.16.27%2', 'state': 'up'},
+        {'name': 'lem01-t01-pwr01:8082', 'partition': 'ams-up', 'address': '10.61.16.26%2', 'state': 'up'},
+    ]}
+}
+
+f5_virtual = {
+    'kind': 'tm:ltm:virtual:virtualstate', 'name': 'intapi-lablemams_443', 'partition': 'ams-up',
+    'fullPath': '/ams-up/intapi-lablemams_443', 'destination': '/ams-up/10.62.9.123%2:443',
+    'pool': '/ams-up/lem01-t01-pwr_8082', 'ipProtocol': 'tcp',
+    'profilesReference': {'isSubcollection': True, 'items': [
+        {'name': 'tcp', 'partition': 'Common', 'context': 'all'},
+        {'name': 'star.lablemams.mydomain', 'partition': 'ams-up', 'context': 'clientside'},
+        {'name': 'http', 'partition': 'Common', 'context': 'all'},
+    ]}
+}
+
+a10_server = {'name': 'lem01-t01-pwr01', 'host': '10.61.16.26', 'action': 'enable', 'port-list': [{'port-number': 8082}]}
+
+a10_group = {
+    'name': 'lem01-t01-pwr_8082', 'protocol': 'tcp', 'health-check': 'http_pwr', 'member-list': [
+        {'name': 'lem01-t01-pwr02', 'port': 8082, 'member-state': 'enable'},
+        {'name': 'lem01-t01-pwr01', 'port': 8082, 'member-state': 'enable'},
+    ]
+}
+
+a10_virtual = {
+    'name': 'intapi-lablemams', 'ip-address': '10.62.9.123', 'enable-disable-action': 'enable', 'port-list': [
+        {'port-number': 443, 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082',
+         'template-client-ssl': 'star.lablemams.mydomain', 'template-http': 'rc-xffxfp-https'},
+        {'port-number': 80, 'protocol': 'http', 'service-group': 'lem01-t01-pwr_8082'},
+    ]
+}
+
+
+@pytest.mark.parametrize(
+    ("normalizer", "value", "expected"),
+    [
+        (normalize.name, '/Common/tcp', 'tcp'),
+        (normalize.name, 'tcp', 'tcp'),
+        (normalize.name, None, None),
+        (normalize.address, '10.62.9.123%2', '10.62.9.123'),
+        (normalize.port, '8082', 8082),
+        (normalize.port, 8082, 8082),
+        (normalize.port, 'any', 'any'),
+        (normalize.ports, ['443', 80, 443], [443, 80]),
+        (normalize.names, {'/Common/http', 'star.lab'}, ['http', 'star.lab']),
+        (normalize.members, ['pwr02:8082', '/ams-up/pwr01:8082'], ['pwr01:8082', 'pwr02:8082']),
+        (normalize.member_list, [{'name': 'pwr02', 'port': '8082'}, {'name': 'pwr01', 'port': 8082}],
+         [{'name': 'pwr01', 'port': 8082}, {'name': 'pwr02', 'port': 8082}]),
+    ]
+)
+def test_normalizers(normalizer, value, expected):
+    assert normalizer(value) == expected
+
+
+def test_normalize():
+    assert normalize.normalize({}, {'name': normalize.name}) == {}
+    assert normalize.normalize({'name': '/Common/tcp', 'port': '80'}, {'name': normalize.name}) == {'name': 'tcp', 'port': '80'}
+
+
+def test_node():
+    node = NodeF5(name='lem01-t01-pwr01', ip='10.61.16.26', location='ams02')
+    node.state = node._parse_node(f5_node)
+    assert not node.diff
+
+
+def test_pool():
+    pool = PoolF5(name='lem01-t01-pwr_8082', location='ams02', endpoints=endpoints, monitor='tcp', port_config=port_config)
+    pool.state = pool._parse_pool(f5_pool)
+    assert pool.state['members'] != pool.plan['members']
+    assert not pool.diff
+
+
+def test_virtual_server_f5():
+    virtual = VirtualServerF5(name='intapi-lablemams_443', entrypoint='intapi', location='ams02', ip='10.62.9.123',
+                              endpoints=endpoints, port=443, http_profile_client='/Common/http',
+                              ssl_profile_client='star.lablemams.mydomain')
+    virtual.state = virtual._parse_virtual_server(f5_virtual)
+    virtual.plan = {
+        'name': 'intapi-lablemams_443', 'partition': 'ams-up', 'destination': '10.62.9.123', 'port': '443',
+        'pool': 'lem01-t01-pwr_8082', 'profiles': {'/Common/http', 'star.lablemams.mydomain'}
+    }
+    assert not virtual.diff
+
+
+def test_server():
+    server = ServerA10(name='lem01-t01-pwr01', ip='10.61.16.26', location='ams02')
+    server.state = server._parse_server(a10_server)
+    assert not server.diff
+
+
+def test_service_group():
+    group = ServiceGroupA10(name='lem01-t01-pwr_8082', port_config=port_config, location='ams02', endpoints=endpoints,
+                            healthcheck='http_pwr')
+    group.state = group._parse_service_group(a10_group)
+    assert not group.diff
+    group.state = group._parse_service_group(dict(a10_group, **{'member-list': a10_group['member-list'][:1]}))
+    invalidate(group, 'diff')
+    assert group.diff['member-list'].added == ({'name': 'lem01-t01-pwr01', 'port': 8082},)
+
+
+def test_virtual_server_a10():
+    virtual = VirtualServerA10(name='intapi-lablemams', entrypoint='intapi', location='ams02', ip='10.62.9.123',
+                               endpoints=endpoints)
+    virtual.state = virtual._parse_virtual_server(a10_virtual)
+    virtual.plan = {'name': 'intapi-lablemams', 'ip': '10.62.9.123', 'ports': ['443', '80']}
+    assert not virtual.diff
+
+
+def test_virtual_port():
+    port = VirtualPortA10(virtual_server_name='intapi-lablemams', port_config=dict(port_config, port='443'),
+                          location='ams02', endpoints=endpoints, sg_health='http_pwr', client_ssl='star.lablemams.mydomain')
+    port.state = port._parse_virtual_port(a10_virtual['port-list'][0])
+    port.plan = {
+        'port-number': '443', 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082',
+        'client-ssl': 'star.lablemams.mydomain', 'template-http': 'rc-xffxfp-https'
+    }
+    assert not port.diff
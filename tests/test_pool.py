@@ -1,5 +1,6 @@
 import pytest
 
+from libs.f5_snapshot import F5Snapshot
 from libs.pool import PoolF5
 
 
@@ -57,3 +58,36 @@ def test_state(pool):
 def test_plan(pool):
     assert pool.plan == {'name': 'lem01-t01-rap_11443', 'monitor': 'tcp',
                          'members': ['lem01-t01-rap01:11443', 'lem01-t01-rap02:11443']}
+
+
+def test_patch_members(pool, mocker):
+    set_pool_members = mocker.patch('libs.f5_wrapper.F5Manager.set_pool_members')
+    delete_all_pool_members = mocker.patch('libs.f5_wrapper.F5Manager.delete_all_pool_members')
+
+    assert pool.patch()
+    set_pool_members.assert_called_once_with(name='lem01-t01-rap_11443',
+                                             members=['lem01-t01-rap01:11443', 'lem01-t01-rap02:11443'])
+    delete_all_pool_members.assert_not_called()
+
+
+def test_hydrate_after_writes(mocker):
+    snapshot = F5Snapshot(
+        fetch_nodes=lambda: [],
+        fetch_pools=lambda: [MockedF5Pool(name='lem01-t01-rap_11443', monitor='tcp', members=['lem01-t01-rap01:11443'])],
+        fetch_virtuals=lambda: [],
+    )
+    pools = {name: PoolF5(name=name, location='ams02', endpoints=endpoints_f5, monitor='tcp', port_config=port_config)
+             for name in ('lem01-t01-rap_11443', 'lem01-t01-rap_12443')}
+    for pool in pools.values():
+        pool._lbr = mocker.Mock(snapshot=snapshot)
+
+    snapshot.pools
+    snapshot.add_pool_members('lem01-t01-rap_11443', ['lem01-t01-rap02:11443'])
+    # Placeholder item of a pool created within a transaction
+    snapshot.add_pool('lem01-t01-rap_12443', ['lem01-t01-rap01:12443'], item={'name': 'lem01-t01-rap_12443', 'monitor': 'tcp'})
+
+    for pool in pools.values():
+        assert pool.hydrate()
+    assert pools['lem01-t01-rap_11443'].state['members'] == ['lem01-t01-rap01:11443', 'lem01-t01-rap02:11443']
+    assert pools['lem01-t01-rap_12443'].state == {'name': 'lem01-t01-rap_12443', 'monitor': 'tcp',
+                                                  'members': ['lem01-t01-rap01:12443']}
@@ -0,0 +1,123 @@
+import pytest
+
+from libs.reconciler import Reconciler
+from libs.reconciler import REFRESH_COST
+from libs.reconciler import TokenBucket
+from tests import conftest
+
+
+class Manager:
+    def __init__(self) -> None:
+        self.refreshes = 0
+
+    def refresh(self) -> None:
+        self.refreshes += 1
+
+
+class Item(conftest.Item):
+    def __init__(self, name: str, state: dict, plan: dict, vendor: str = 'F5', children: tuple = (), lbr=None) -> None:
+        super().__init__(name, children=children)
+        self.vendor = vendor
+        self.state = state
+        self.plan = plan
+        self.lbr = lbr
+        self.ip = '10.62.9.123'
+
+    def hydrate(self) -> bool:
+        return True
+
+    def are_we_good(self):
+        return True
+
+
+@pytest.fixture
+def settings(mocker):
+    values = {'RECONCILE_RATE': 0, 'RECONCILE_BURST': 20, 'SNAPSHOT_MAX_AGE': 0, 'SIBLINGS_CONCURRENCY': 1,
+              'DEVICE_CONCURRENCY': 1}
+    for module in ('reconciler', 'state_loader', 'apply_engine'):
+        mocker.patch(f'libs.{module}.get_ff', side_effect=values.get)
+    return values
+
+
+@pytest.fixture
+def tree():
+    """Entrypoint -> two virtuals sharing a pool, the pool and the node of the second virtual drifted"""
+    lbr = Manager()
+    node = Item('node', {'ip': '1.1.1.1'}, {'ip': '1.1.1.2'}, lbr=lbr)
+    pool = Item('pool', {'members': ['a']}, {'members': ['a', 'b']}, children=(node,), lbr=lbr)
+    same = Item('virtual_80', {'port': 80}, {'port': 80}, children=(pool,), lbr=lbr)
+    drifted = Item('virtual_443', {'port': 443}, {'port': 443}, children=(pool,), lbr=lbr)
+    entrypoint = Item('intapi-lablemams', {}, {}, vendor=None, children=(same, drifted))
+    return entrypoint, pool, node, lbr
+
+
+def test_token_bucket(mocker):
+    now = mocker.patch('libs.reconciler.time.monotonic', return_value=100.0)
+    sleep = mocker.patch('libs.reconciler.time.sleep')
+    bucket = TokenBucket(rate=2, burst=4)
+
+    assert bucket.take(3) == 0.0
+    assert bucket.take(3) == 1.0
+    sleep.assert_called_once_with(1.0)
+    now.return_value = 103.0
+    # Refilled up to burst only, more than burst is paid back in full
+    assert bucket.take(10) == 3.0
+    assert bucket.take() == 3.5
+    assert TokenBucket(rate=0, burst=1).take(100) == 0.0
+
+
+def test_drifted(settings, tree):
+    entrypoint, pool, node, _ = tree
+    assert Reconciler.drifted(entrypoint) == [pool]
+    pool.plan = {'members': ['a']}
+    pool.invalidate()
+    assert Reconciler.drifted(entrypoint) == [node]
+
+
+def test_reconcile_entrypoint(settings, tree, mocker):
+    entrypoint, pool, node, lbr = tree
+    reconciler = Reconciler(get_em=None)
+    throttle = mocker.spy(reconciler, 'throttle')
+
+    report = reconciler.reconcile_entrypoint(entrypoint)
+
+    assert report == {'Item pool': {'diff': {'members': {'old': ['a'], 'new': ['a', 'b'], 'added': ['b']}}, 'patched': True}}
+    assert (pool.calls, node.calls) == (['patch'], ['patch'])
+    assert lbr.refreshes == 1
+    assert throttle.call_args_list == [mocker.call(('AMS02', 'F5'), REFRESH_COST), mocker.call(('AMS02', 'F5'), 2)]
+
+
+def test_reconcile_dry_run(settings, tree):
+    entrypoint, pool, node, _ = tree
+    report = Reconciler(get_em=None, dry_run=True).reconcile_entrypoint(entrypoint)
+
+    assert report['Item pool']['patched'] is None
+    assert (pool.calls, node.calls) == ([], [])
+
+
+def test_reconcile_not_created(settings, tree):
+    entrypoint, _, _, lbr = tree
+    entrypoint.ip = None
+    assert Reconciler(get_em=None).reconcile_entrypoint(entrypoint) == {}
+    assert lbr.refreshes == 0
+
+
+def test_cycle(settings, tree, mocker):
+    entrypoint = tree[0]
+    em = mocker.Mock()
+    em.env.get_all_services.return_value = ['pwr']
+
+    def get_em(name):
+        if name != 'lablemams':
+            raise ValueError('Incorrect env name given')
+        return em
+
+    mocker.patch('libs.reconciler.EntrypointManager.get_entrypoints', return_value=['intapi'])
+    mocker.patch('libs.reconciler.Entrypoint', return_value=entrypoint)
+    sleep = mocker.patch('libs.reconciler.time.sleep')
+
+    report = Reconciler(get_em=get_em, dry_run=True).run(['lablemams', 'labbroken'], interval=60, cycles=2)
+
+    assert report == {'lablemams': {'intapi': {'Item pool': mocker.ANY}}, 'labbroken': {}}
+    assert em.forget_groups.call_count == 2
+    sleep.assert_called_once()
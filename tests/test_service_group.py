@@ -41,3 +41,47 @@ def test_state(sg):
 def test_plan(sg):
     assert sg.plan == {'name': 'lem01-t01-pwr_7000', 'health-check': 'http_pwr',
                        'member-list': [{'name': 'lem01-t01-pwr01', 'port': 7000}]}
+
+
+def test_prepare_siblings(mocker):
+    endpoints = {
+        'lem01-t01-pwr01': {'interfaces': [('api', '1.1.1.1')], 'ip': '1.1.1.1'},
+        'lem01-t01-pwr02': {'interfaces': [('api', '1.1.1.2')], 'ip': '1.1.1.2'},
+    }
+    mocker.patch('libs.a10_wrapper.A10Manager.get_server', return_value={})
+    create_servers = mocker.patch('libs.a10_wrapper.A10Manager.create_servers', return_value={
+        'lem01-t01-pwr01': {'name': 'lem01-t01-pwr01', 'host': '1.1.1.1'},
+        'lem01-t01-pwr02': Exception('Exists'),
+    })
+    sg = ServiceGroupA10(name='lem01-t01-pwr_7000', port_config=port_config,
+                         location='ams02', endpoints=endpoints, healthcheck="http_pwr")
+    sg._prepare_siblings('patch')
+
+    create_servers.assert_called_once_with([{'name': 'lem01-t01-pwr01', 'ip': '1.1.1.1'},
+                                            {'name': 'lem01-t01-pwr02', 'ip': '1.1.1.2'}])
+    assert sg.siblings['lem01-t01-pwr01'].state == {'name': 'lem01-t01-pwr01', 'ip': '1.1.1.1'}
+    assert not sg.siblings['lem01-t01-pwr01'].diff
+    assert sg.siblings['lem01-t01-pwr02'].state == {}
+
+
+def test_patch_members(mocker):
+    endpoints = {
+        'lem01-t01-pwr01': {'interfaces': [('api', '1.1.1.1')], 'ip': '1.1.1.1'},
+        'lem01-t01-pwr03': {'interfaces': [('api', '1.1.1.3')], 'ip': '1.1.1.3'},
+    }
+    mocker.patch('libs.a10_wrapper.A10Manager.get_group', return_value=dict(a10_sg, **{'member-list': [
+        {'name': 'lem01-t01-pwr01', 'port': 7000}, {'name': 'lem01-t01-pwr02', 'port': 7000}
+    ]}))
+    add_group_members = mocker.patch('libs.a10_wrapper.A10Manager.add_group_members', return_value={})
+    delete_group_members = mocker.patch('libs.a10_wrapper.A10Manager.delete_group_members', return_value={})
+    delete_group = mocker.patch('libs.a10_wrapper.A10Manager.delete_group')
+    sg = ServiceGroupA10(name='lem01-t01-pwr_9000', port_config=port_config,
+                         location='ams02', endpoints=endpoints, healthcheck="http_pwr")
+
+    assert sg.patch()
+    add_group_members.assert_called_once_with(name='lem01-t01-pwr_9000', members=[{'name': 'lem01-t01-pwr03', 'port': 7000}])
+    delete_group_members.assert_called_once_with(name='lem01-t01-pwr_9000', members=[{'name': 'lem01-t01-pwr02', 'port': 7000}])
+    delete_group.assert_not_called()
+
+    delete_group_members.return_value = {'lem01-t01-pwr02:7000': Exception('NotFound')}
+    assert not sg.patch()
@@ -0,0 +1,62 @@
+import pytest
+
+from libs.a10_wrapper import A10Manager
+from libs.f5_wrapper import F5Manager
+from libs.session_registry import SessionRegistry
+
+
+credentials = {
+    'AMS02': {
+        'A10': {'user': 'a10_user', 'password': 'a10_password'},
+        'F5': {'user': 'f5_user', 'password': 'f5_password'}
+    }
+}
+
+
+@pytest.fixture
+def registry(mocker):
+    settings = {'BALANCERS': credentials, 'A10_ASYNC_CLIENT': False, 'A10_CONCURRENCY': 8,
+                'F5_LEAN_CLIENT': False, 'F5_CONCURRENCY': 8, 'TOKEN_CACHE': False}
+    mocker.patch('libs.session_registry.get_ff', side_effect=settings.get)
+    mocker.patch('f5.bigip.ManagementRoot')
+    return SessionRegistry()
+
+
+def test_one_manager_per_device(registry):
+    f5 = registry.f5(location='AMS02')
+
+    assert isinstance(f5, F5Manager)
+    assert isinstance(registry.a10(location='AMS02'), A10Manager)
+    assert registry.f5(location='ams02') is f5
+    assert registry.get(location='AMS02', vendor='f5') is f5
+    assert f5.partition == 'ams-up'
+
+
+def test_stats(registry):
+    f5 = registry.f5(location='AMS02')
+    assert f5.mgmt is f5.mgmt
+    registry.a10(location='AMS02')
+
+    stats = registry.stats()
+    assert stats['sessions'] == 1
+    assert stats['logins'] == 1
+    assert stats['devices']['AMS02/F5/ams-up'] == {'sessions': 1, 'logins': 1}
+    assert stats['devices']['AMS02/A10/None'] == {'sessions': 0, 'logins': 0}
+
+
+def test_reset(registry):
+    f5 = registry.f5(location='AMS02')
+    registry.reset()
+
+    assert registry.f5(location='AMS02') is not f5
+    assert registry.stats()['sessions'] == 0
+
+
+def test_token_cache(mocker, tmp_path):
+    settings = {'BALANCERS': credentials, 'A10_ASYNC_CLIENT': False, 'A10_CONCURRENCY': 8, 'F5_LEAN_CLIENT': False,
+                'F5_CONCURRENCY': 8, 'TOKEN_CACHE': True, 'TOKEN_CACHE_FILE': str(tmp_path / 'tokens.json')}
+    mocker.patch('libs.session_registry.get_ff', side_effect=settings.get)
+    registry = SessionRegistry()
+
+    assert registry.a10(location='AMS02').token_cache
+    assert registry.f5(location='AMS02').token_cache is None
@@ -0,0 +1,93 @@
+import pytest
+
+from libs.identity_map import run_scope
+from libs.pool import PoolF5
+from libs.session_registry import registry
+from libs.state_loader import StateLoader
+from libs.virtual_port import VirtualPortA10
+
+port_config = {
+    "port": 443,
+    "target_port": 8082,
+    "protocol": "https",
+    "template_http": "rc-xffxfp-https"
+}
+
+endpoints = {
+    'lem01-t01-pwr01': {'interfaces': [('nic0', '1.1.1.1')], 'ip': '1.1.1.1'},
+    'lem01-t01-pwr02': {'interfaces': [('nic0', '1.1.1.2')], 'ip': '1.1.1.2'},
+}
+
+
+@pytest.fixture(autouse=True)
+def managers(mocker):
+    registry.reset()
+    mocker.patch('libs.a10_wrapper.acos.Client')
+    yield
+    registry.reset()
+
+
+def test_load_f5(mocker):
+    fetch_nodes = mocker.patch('libs.f5_wrapper.F5Manager._fetch_nodes', return_value=[
+        {'name': 'lem01-t01-pwr01', 'address': '1.1.1.1%2'},
+    ])
+    fetch_pools = mocker.patch('libs.f5_wrapper.F5Manager._fetch_pools', return_value=[
+        {'name': 'lem01-t01-pwr_8082', 'monitor': '/Common/tcp',
+         'membersReference': {'items': [{'name': 'lem01-t01-pwr01:8082', 'address': '1.1.1.1%2'}]}},
+    ])
+    get_node = mocker.patch('libs.f5_wrapper.F5Manager.get_node')
+    get_pool = mocker.patch('libs.f5_wrapper.F5Manager.get_pool')
+    pool = PoolF5(name='lem01-t01-pwr_8082', location='ams02', endpoints=endpoints, monitor='tcp', port_config=port_config)
+
+    assert StateLoader(pool).load() == 3
+    assert pool.state == {'name': 'lem01-t01-pwr_8082', 'monitor': 'tcp', 'members': ['lem01-t01-pwr01:8082']}
+    assert pool.siblings['lem01-t01-pwr01'].state == {'name': 'lem01-t01-pwr01', 'ip': '1.1.1.1'}
+    assert pool.siblings['lem01-t01-pwr02'].state == {}
+    assert pool.siblings['lem01-t01-pwr02'].diff
+    fetch_nodes.assert_called_once()
+    fetch_pools.assert_called_once()
+    get_node.assert_not_called()
+    get_pool.assert_not_called()
+
+
+def test_refresh_once_per_run(mocker):
+    fetch_pools = mocker.patch('libs.f5_wrapper.F5Manager._fetch_pools', return_value=[])
+    mocker.patch('libs.f5_wrapper.F5Manager._fetch_nodes', return_value=[])
+    with run_scope():
+        for port in (8082, 8083):
+            pool = PoolF5(name=f'lem01-t01-pwr_{port}', location='ams02', endpoints=endpoints, monitor='tcp',
+                          port_config=dict(port_config, target_port=port))
+            StateLoader(pool).load()
+    fetch_pools.assert_called_once()
+
+    StateLoader(pool).load()
+    assert fetch_pools.call_count == 2
+
+
+def test_load_a10():
+    a10 = registry.a10(location='AMS02')
+    a10.mgmt.slb.server.get_all.return_value = {'server-list': [{'name': 'lem01-t01-pwr01', 'host': '1.1.1.1'}]}
+    a10.mgmt.slb.service_group.all.return_value = {'service-group-list': [
+        {'name': 'lem01-t01-pwr_8082', 'health-check': 'http_pwr', 'member-list': [{'name': 'lem01-t01-pwr01', 'port': 8082}]}
+    ]}
+    a10.mgmt.slb.virtual_server.all.return_value = {'virtual-server-list': [
+        {'name': 'intapi-lablemams', 'ip-address': '10.62.9.123', 'port-list': [
+            {'port-number': 443, 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082',
+             'template-http': 'rc-xffxfp-https', 'template-client-ssl': 'star.mydomain'}
+        ]}
+    ]}
+    vp = VirtualPortA10(virtual_server_name='intapi-lablemams', port_config=port_config,
+                        location='ams02', endpoints=endpoints, sg_health='http_pwr', client_ssl='star.mydomain')
+
+    assert StateLoader(vp).load() == 4
+    group = vp.siblings[vp.plan['service-group']]
+    assert vp.state == {'port-number': 443, 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082',
+                        'client-ssl': 'star.mydomain', 'template-http': 'rc-xffxfp-https'}
+    assert group.state == {'name': 'lem01-t01-pwr_8082', 'health-check': 'http_pwr',
+                           'member-list': [{'name': 'lem01-t01-pwr01', 'port': 8082}]}
+    assert group.siblings['lem01-t01-pwr01'].state == {'name': 'lem01-t01-pwr01', 'ip': '1.1.1.1'}
+    assert group.siblings['lem01-t01-pwr02'].state == {}
+    a10.mgmt.slb.server.get.assert_not_called()
+    a10.mgmt.slb.service_group.get.assert_not_called()
+    a10.mgmt.slb.virtual_server.get.assert_not_called()
+    a10.mgmt.slb.server.get_all.assert_called_once()
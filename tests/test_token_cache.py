@@ -0,0 +1,62 @@
+import os
+import stat
+import time
+
+import pytest
+
+from libs.token_cache import TokenCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TokenCache(str(tmp_path / 'happyvip' / 'tokens.json'))
+
+
+def test_get_set(cache):
+    assert cache.get('f5.mydomain', 'user') is None
+
+    expires = time.time() + 1200
+    cache.set('f5.mydomain', 'user', 'token1', expires)
+
+    assert cache.get('f5.mydomain', 'user') == ('token1', expires)
+    assert cache.get('f5.mydomain', 'other') is None
+    assert TokenCache(cache.path).get('f5.mydomain', 'user') == ('token1', expires)
+
+
+def test_permissions(cache):
+    cache.set('f5.mydomain', 'user', 'token1')
+
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+
+
+def test_expiry(cache):
+    cache.set('f5.mydomain', 'user', 'token1', time.time() + 30)
+    cache.set('a10.mydomain', 'user', 'signature1', time.time() - 1)
+
+    assert cache.get('f5.mydomain', 'user') is None
+    assert cache.get('a10.mydomain', 'user') is None
+
+    # Expired tokens are dropped on the next write
+    cache.set('f5.mydomain', 'user', 'token2')
+    with open(cache.path) as file:
+        assert 'signature1' not in file.read()
+
+
+def test_discard(cache):
+    cache.set('f5.mydomain', 'user', 'token1')
+
+    cache.discard('f5.mydomain', 'user', 'token0')
+    assert cache.get('f5.mydomain', 'user')[0] == 'token1'
+
+    cache.discard('f5.mydomain', 'user', 'token1')
+    assert cache.get('f5.mydomain', 'user') is None
+
+
+def test_broken_file(cache):
+    cache.set('f5.mydomain', 'user', 'token1')
+    with open(cache.path, 'w') as file:
+        file.write('{"user@f5.mydom')
+
+    assert cache.get('f5.mydomain', 'user') is None
+    cache.set('f5.mydomain', 'user', 'token2')
+    assert cache.get('f5.mydomain', 'user')[0] == 'token2'
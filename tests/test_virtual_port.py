@@ -43,3 +43,16 @@ def test_state(vp):
 def test_plan(vp):
     assert vp.plan == {'port-number': 777, 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082',
                        'client-ssl': 'star.domain', 'template-http': 'rc-xffxfp-https'}
+
+
+def test_patch_in_place(vp, mocker):
+    replace_virtual_port = mocker.patch('libs.a10_wrapper.A10Manager.replace_virtual_port', return_value=a10_vp)
+    delete_virtual_port = mocker.patch('libs.a10_wrapper.A10Manager.delete_virtual_port')
+    vp.plan = dict(vp.state, **{'service-group': 'lem01-t01-pwr_8082', 'client-ssl': None})
+
+    assert vp.patch()
+    replace_virtual_port.assert_called_once_with(
+        virtual_server='intapi-lablemams', port=443, protocol='https', group='lem01-t01-pwr_8082',
+        client_ssl=None, template_http='rc-xffxfp-https'
+    )
+    delete_virtual_port.assert_not_called()
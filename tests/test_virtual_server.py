@@ -3,6 +3,7 @@ from api_libs.logger import log
 from api_libs.logger import Logger
 
 from libs.a10_wrapper import A10Manager
+from libs.f5_snapshot import F5Snapshot
 from libs.f5_wrapper import F5Manager
 from libs.virtual_server import VirtualServerA10
 from libs.virtual_server import VirtualServerF5
@@ -123,3 +124,91 @@ def test_f5_state(vs_f5):
 
 def test_f5_validate_state(vs_f5):
     assert vs_f5.validate_state()
+
+
+def test_f5_parse_written_virtual_server():
+    assert VirtualServerF5._parse_virtual_server({'name': 'cp-lablemams_443', 'destination': '10.62.6.194:443'}) == {
+        'name': 'cp-lablemams_443', 'destination': '10.62.6.194', 'partition': None, 'pool': None, 'port': '443',
+        'profiles': set()
+    }
+
+
+def test_f5_hydrate_after_create(vs_f5, mocker):
+    vs_f5.lbr._snapshot = F5Snapshot(fetch_nodes=lambda: [], fetch_pools=lambda: [], fetch_virtuals=lambda: [])
+    vs_f5.lbr.snapshot.virtuals
+    # POST response, profiles are a link only
+    mocker.patch('libs.f5_wrapper.F5Manager._create', return_value={
+        'name': 'cp-lablemams_443', 'destination': '/ams-up/10.62.6.194:443', 'pool': '/ams-up/lem01-t01-rap_11443',
+        'profilesReference': {'link': 'https://localhost/mgmt/tm/ltm/virtual/~ams-up~cp-lablemams_443/profiles'}
+    })
+    vs_f5.lbr.create_virtual_server(name='cp-lablemams_443', destination='10.62.6.194', port='443',
+                                    pool='lem01-t01-rap_11443', http_profile_client='xfp')
+
+    assert vs_f5.hydrate()
+    assert vs_f5.state == {'name': 'cp-lablemams_443', 'destination': '10.62.6.194',
+                           'partition': 'ams-up', 'pool': 'lem01-t01-rap_11443', 'port': '443', 'profiles': {'xfp'}}
+
+
+def test_f5_patch_in_place(vs_f5, mocker):
+    modify_virtual_server = mocker.patch('libs.f5_wrapper.F5Manager.modify_virtual_server', return_value=True)
+    delete_virtual_server = mocker.patch('libs.f5_wrapper.F5Manager.delete_virtual_server')
+    vs_f5.plan = dict(vs_f5.state, pool='lem01-t01-rap_12443', profiles={'xfp', 'http'})
+
+    assert vs_f5.patch()
+    modify_virtual_server.assert_called_once_with(name='cp-lablemams_443', pool='lem01-t01-rap_12443',
+                                                  profiles=['http', 'xfp'])
+    delete_virtual_server.assert_not_called()
+
+
+def test_f5_patch_recreate(vs_f5, mocker):
+    modify_virtual_server = mocker.patch('libs.f5_wrapper.F5Manager.modify_virtual_server')
+    delete_virtual_server = mocker.patch('libs.f5_wrapper.F5Manager.delete_virtual_server')
+    create_virtual_server = mocker.patch('libs.f5_wrapper.F5Manager.create_virtual_server')
+    vs_f5.plan = dict(vs_f5.state, partition='ams-dn')
+
+    assert vs_f5.patch()
+    modify_virtual_server.assert_not_called()
+    delete_virtual_server.assert_called_once()
+    create_virtual_server.assert_called_once()
+
+
+def test_a10_patch_ports(vs_a10, mocker):
+    delete_virtual_port = mocker.patch('libs.a10_wrapper.A10Manager.delete_virtual_port')
+    delete_virtual_server = mocker.patch('libs.a10_wrapper.A10Manager.delete_virtual_server')
+    vs_a10.plan = dict(vs_a10.state, ports=[80])
+
+    assert vs_a10.patch()
+    delete_virtual_port.assert_called_once_with(virtual_server='testapi-lablemams', port=443, protocol='https')
+    delete_virtual_server.assert_not_called()
+
+
+def test_a10_prepare_siblings(vs_a10, mocker):
+    mocker.patch('libs.a10_wrapper.A10Manager.get_virtual_port', return_value={})
+    mocker.patch('libs.a10_wrapper.A10Manager.get_group', return_value={})
+    mocker.patch('libs.a10_wrapper.A10Manager.get_server', return_value={})
+    create_servers = mocker.patch('libs.a10_wrapper.A10Manager.create_servers', return_value={
+        'lem01-t01-pwr01': {'name': 'lem01-t01-pwr01', 'host': '1.1.1.1'},
+    })
+    create_groups = mocker.patch('libs.a10_wrapper.A10Manager.create_groups', return_value={
+        'lem01-t01-pwr_8082': {'name': 'lem01-t01-pwr_8082', 'health-check': 'tcp',
+                               'member-list': [{'name': 'lem01-t01-pwr01', 'port': 8082}]},
+    })
+    create_virtual_ports = mocker.patch('libs.a10_wrapper.A10Manager.create_virtual_ports', return_value={
+        '443+https': {'port-number': 443, 'protocol': 'https', 'service-group': 'lem01-t01-pwr_8082',
+                      'template-http': 'rc-xffxfp-https'},
+        '80+http': Exception('Exists'),
+    })
+    vs_a10._prepare_siblings('patch')
+
+    create_servers.assert_called_once_with([{'name': 'lem01-t01-pwr01', 'ip': '1.1.1.1'}])
+    create_groups.assert_called_once_with([{'name': 'lem01-t01-pwr_8082', 'health_check': 'tcp',
+                                            'members': [{'name': 'lem01-t01-pwr01', 'port': 8082}]}])
+    create_virtual_ports.assert_called_once_with('testapi-lablemams', [
+        {'port': 443, 'protocol': 'https', 'group': 'lem01-t01-pwr_8082',
+         'template_http': 'rc-xffxfp-https', 'client_ssl': None},
+        {'port': 80, 'protocol': 'http', 'group': 'lem01-t01-pwr_8082',
+         'template_http': 'rc-xffxfp-http', 'client_ssl': None},
+    ])
+    assert not vs_a10.siblings['443_https'].diff
+    assert all(not group.diff for group in vs_a10.siblings['80_http'].siblings.values())
+    assert vs_a10.siblings['80_http'].state == {}